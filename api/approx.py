@@ -0,0 +1,163 @@
+"""
+Approximate analytics over the full tick history.
+
+Three ways to answer the same questions (distinct seq_ids, trade count and volume,
+price and trade-size quantiles):
+  - exact:   full scan of 'ticks_all' with uniqExact / quantilesExact.
+  - sampled: 'ticks_all SAMPLE <rate>' (ticks_local is SAMPLE BY cityHash64(seq_id)),
+             scaled back up by 1 / rate.
+  - sketch:  merge the uniq / t-digest states of both shards through 'ticks_sketch_1m_all'.
+
+The sketches are kept per minute, so every mode rounds both bounds down to whole
+minutes and the three modes answer over the same ticks. Every answer comes with
+error bounds, so dashboards can show the precision they paid for.
+"""
+import math
+
+# Must match the levels in sql_schema/14_ticks_sketch_1m_agg.sql
+QUANTILE_LEVELS = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+LEVELS_SQL = ", ".join(str(q) for q in QUANTILE_LEVELS)
+
+ACCURACY_MODES = ("exact", "sampled", "sketch")
+
+# 95% two-sided normal quantile, used for all reported bounds
+Z_95 = 1.96
+
+# 'uniq' keeps every hash up to 65536 entries, then samples hashes.
+UNIQ_EXACT_UP_TO = 65536
+# ClickHouse documents quantileTDigest as within ~1% rank error.
+TDIGEST_RANK_ERROR = 0.01
+
+
+def raw_filters(start, end) -> str:
+    """WHERE clause for raw tick queries. Only the set bounds are added, rounded to whole minutes."""
+    filters = ["symbol = {symbol:String}"]
+    if start is not None:
+        filters.append("event_time >= toStartOfMinute({start:DateTime64(6, 'UTC')})")
+    if end is not None:
+        filters.append("event_time < toStartOfMinute({end:DateTime64(6, 'UTC')})")
+    return " AND ".join(filters)
+
+
+def sketch_filters(start, end) -> str:
+    """WHERE clause for the sketch rollup, with the same minute bounds as raw_filters()."""
+    filters = ["symbol = {symbol:String}"]
+    if start is not None:
+        filters.append("minute >= toStartOfMinute({start:DateTime64(6, 'UTC')})")
+    if end is not None:
+        filters.append("minute < toStartOfMinute({end:DateTime64(6, 'UTC')})")
+    return " AND ".join(filters)
+
+
+def build_query(accuracy: str, start=None, end=None, sample_rate: float = 0.1) -> str:
+    """Returns the SQL for the requested accuracy mode."""
+    if accuracy == "exact":
+        return f"""
+        SELECT
+            uniqExact(seq_id) AS distinct_seq_ids,
+            countIf(event_type = 'trade') AS trades,
+            sumIf(size, event_type = 'trade') AS volume,
+            quantilesExactIf({LEVELS_SQL})(price, event_type = 'trade') AS price_quantiles,
+            quantilesExactIf({LEVELS_SQL})(size, event_type = 'trade') AS size_quantiles
+        FROM default.ticks_all
+        WHERE {raw_filters(start, end)}
+        """
+
+    if accuracy == "sampled":
+        # SAMPLE only accepts a literal; the rate is validated as a float before formatting.
+        return f"""
+        SELECT
+            uniqExact(seq_id) AS distinct_seq_ids,
+            countIf(event_type = 'trade') AS trades,
+            sumIf(size, event_type = 'trade') AS volume,
+            sumIf(toUInt64(size) * size, event_type = 'trade') AS volume_sq,
+            quantilesExactIf({LEVELS_SQL})(price, event_type = 'trade') AS price_quantiles,
+            quantilesExactIf({LEVELS_SQL})(size, event_type = 'trade') AS size_quantiles
+        FROM default.ticks_all SAMPLE {float(sample_rate)}
+        WHERE {raw_filters(start, end)}
+        """
+
+    if accuracy == "sketch":
+        return f"""
+        SELECT
+            uniqMerge(ticks_sketch_1m_all.seq_ids) AS distinct_seq_ids,
+            countIfMerge(ticks_sketch_1m_all.trades) AS trades,
+            sumIfMerge(ticks_sketch_1m_all.volume) AS volume,
+            quantilesTDigestIfMerge({LEVELS_SQL})(ticks_sketch_1m_all.price_quantiles) AS price_quantiles,
+            quantilesTDigestIfMerge({LEVELS_SQL})(ticks_sketch_1m_all.size_quantiles) AS size_quantiles
+        FROM default.ticks_sketch_1m_all
+        WHERE {sketch_filters(start, end)}
+        """
+
+    raise ValueError(f"accuracy must be one of {ACCURACY_MODES}")
+
+
+def _quantile_dict(values) -> dict:
+    """Quantiles of an empty window come back as NaN, which JSON cannot carry."""
+    return {
+        f"p{int(q * 100):02d}": (None if math.isnan(v) else float(v))
+        for q, v in zip(QUANTILE_LEVELS, values)
+    }
+
+
+def dkw_rank_error(n: int) -> float:
+    """
+    Dvoretzky-Kiefer-Wolfowitz bound: with 95% confidence the empirical CDF of
+    n samples is within this distance of the true CDF, so sampled quantiles
+    are off by at most this much in rank.
+    """
+    if n <= 0:
+        return 1.0
+    return math.sqrt(math.log(2 / 0.05) / (2 * n))
+
+
+def summarise(accuracy: str, row: dict, sample_rate: float = 1.0) -> dict:
+    """
+    Turns one result row into estimates plus 95% error bounds.
+    Count bounds are absolute (+/-), quantile bounds are rank errors.
+    """
+    estimates = {
+        "distinct_seq_ids": int(row["distinct_seq_ids"]),
+        "trades": int(row["trades"]),
+        "volume": int(row["volume"] or 0),
+        "price_quantiles": _quantile_dict(row["price_quantiles"]),
+        "size_quantiles": _quantile_dict(row["size_quantiles"]),
+    }
+
+    if accuracy == "exact":
+        bounds = {"distinct_seq_ids": 0, "trades": 0, "volume": 0, "quantile_rank_error": 0.0}
+
+    elif accuracy == "sampled":
+        p = sample_rate
+        sampled_ids = estimates["distinct_seq_ids"]
+        sampled_trades = estimates["trades"]
+
+        # Each seq_id is in the sample with probability p (Bernoulli on its hash):
+        # X / p is unbiased with variance X * (1 - p) / p^2.
+        estimates["distinct_seq_ids"] = round(sampled_ids / p)
+        estimates["trades"] = round(sampled_trades / p)
+        estimates["volume"] = round(estimates["volume"] / p)
+        bounds = {
+            "distinct_seq_ids": round(Z_95 * math.sqrt(sampled_ids * (1 - p)) / p),
+            "trades": round(Z_95 * math.sqrt(sampled_trades * (1 - p)) / p),
+            # Horvitz-Thompson variance estimate: (1 - p) / p^2 * sum(y^2)
+            "volume": round(Z_95 * math.sqrt((1 - p) * float(row["volume_sq"] or 0)) / p),
+            "quantile_rank_error": dkw_rank_error(sampled_trades),
+        }
+
+    elif accuracy == "sketch":
+        distinct = estimates["distinct_seq_ids"]
+        # Below the threshold uniq stores every hash; above it, it keeps ~65536 of them.
+        relative = 0.0 if distinct <= UNIQ_EXACT_UP_TO else Z_95 / math.sqrt(UNIQ_EXACT_UP_TO)
+        bounds = {
+            "distinct_seq_ids": round(distinct * relative),
+            "trades": 0,
+            "volume": 0,
+            "quantile_rank_error": TDIGEST_RANK_ERROR,
+        }
+
+    else:
+        raise ValueError(f"accuracy must be one of {ACCURACY_MODES}")
+
+    bounds["confidence"] = 0.95
+    return {"estimates": estimates, "error_bounds": bounds}
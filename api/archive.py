@@ -0,0 +1,83 @@
+"""
+Transparent access to archived tick partitions.
+
+'archive_partitions.py' exports closed 'ticks_local' partitions to Parquet
+(MinIO via s3(), or the server's user_files via file()) and records them in
+'ticks_archive_manifest'. Once a partition is dropped from ClickHouse, raw
+tick queries over that range read it back from the archive instead.
+"""
+import os
+import re
+
+# --- Configuration ---
+# Shared with archive_partitions.py and replay_ticks.py. ClickHouse (not the API) reaches
+# the archive: the bucket URL and credentials live in the servers' 'ticks_archive' named
+# collection (config/clickhouse/archive.xml), so they never appear in SQL or query_log.
+ARCHIVE_BACKEND = os.environ.get("ARCHIVE_BACKEND", "s3")  # 's3' or 'file'
+ARCHIVE_S3_COLLECTION = os.environ.get("ARCHIVE_S3_COLLECTION", "ticks_archive")
+# Relative to the server's user_files_path
+ARCHIVE_FILE_ROOT = os.environ.get("ARCHIVE_FILE_ROOT", "archive")
+
+# Archived files store the enums as strings; these casts restore the 'ticks_local' types
+ARCHIVE_SELECT = """
+    SELECT
+        exchange,
+        symbol,
+        toDateTime64(event_time, 6, 'UTC') AS event_time,
+        seq_id,
+        CAST(event_type AS Enum8('trade' = 1, 'quote' = 2, 'book' = 3)) AS event_type,
+        price,
+        size,
+        CAST(side AS Enum8('buy' = 1, 'sell' = 2)) AS side,
+        source_version
+    FROM {table_function}
+"""
+
+MANIFEST_QUERY = """
+SELECT path
+FROM default.ticks_archive_manifest FINAL
+WHERE table = 'ticks_local'
+    AND dropped = 1
+    AND max_time >= {start:DateTime64(6, 'UTC')}
+    AND min_time < {end:DateTime64(6, 'UTC')}
+ORDER BY partition_id, shard
+"""
+
+# Paths come from our own manifest and shard macros, but they are formatted into SQL,
+# so keep them boring
+SAFE_PATH = re.compile(r"^[A-Za-z0-9_./-]+$")
+COLLECTION_NAME = re.compile(r"^\w+$")
+
+
+def table_function(path: str) -> str:
+    """The s3() / file() table function reading or writing one archived Parquet file."""
+    if not SAFE_PATH.match(path):
+        raise ValueError(f"Refusing unsafe archive path: {path!r}")
+    if ARCHIVE_BACKEND == "s3":
+        if not COLLECTION_NAME.match(ARCHIVE_S3_COLLECTION):
+            raise ValueError(f"Invalid ARCHIVE_S3_COLLECTION: {ARCHIVE_S3_COLLECTION!r}")
+        # The collection's url is the bucket; 'filename' is appended to it
+        return f"s3({ARCHIVE_S3_COLLECTION}, filename = '{path}', format = 'Parquet')"
+    return f"file('{ARCHIVE_FILE_ROOT}/{path}', 'Parquet')"
+
+
+def archived_paths(client, start, end) -> list:
+    """Archived (and dropped) partitions overlapping [start, end)."""
+    rows = client.execute(MANIFEST_QUERY, {'start': start, 'end': end})
+    return [path for (path,) in rows]
+
+
+def tick_source(client, start, end) -> str:
+    """
+    FROM-clause source for raw tick queries over [start, end).
+    Plain 'default.ticks_all' unless part of the range now lives only in the archive,
+    in which case those Parquet files are unioned in with the same schema.
+    """
+    paths = archived_paths(client, start, end)
+    if not paths:
+        return "default.ticks_all"
+
+    archives = " UNION ALL ".join(
+        ARCHIVE_SELECT.format(table_function=table_function(path)) for path in paths
+    )
+    return f"(SELECT * FROM default.ticks_all UNION ALL {archives})"
@@ -0,0 +1,252 @@
+"""
+As-of join helpers for aligning trades with the prevailing quote.
+
+Quotes live next to trades in 'ticks_local' (event_type = 'quote').
+Each quote row is one-sided: side = 'buy' is the bid, side = 'sell' is the ask.
+For every trade we want the last bid and the last ask at or before the trade time.
+
+There are two ways to do this:
+  - Server side: ClickHouse 'ASOF JOIN' on (symbol, event_time). Both sides
+    filter on symbol + time range, which is a prefix of the ORDER BY key,
+    so only the matching granules are read.
+  - Client side: NumPy 'searchsorted' over cached, time-sorted quote arrays.
+    One vectorised call aligns every trade in the window.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# --- Server-side ASOF JOIN ---
+
+# Both modes return rows with these fields. Times are Int64 microseconds; a bid or ask
+# more than 'max_staleness_us' older than the trade does not count as prevailing, so
+# it is null together with its time (and mid/spread).
+ASOF_COLUMNS = (
+    "trade_time_us", "price", "size", "side",
+    "bid", "bid_time_us", "ask", "ask_time_us", "mid", "spread",
+)
+
+# The quote subqueries start 'max staleness' before the trade window ('quote_start'),
+# so the first trades of the window still find a prevailing quote and no older quote
+# is read.
+ASOF_JOIN_QUERY = """
+SELECT
+    trade_time_us,
+    price,
+    size,
+    side,
+    bid,
+    if(bid IS NULL, NULL, quote_bid_time_us) AS bid_time_us,
+    ask,
+    if(ask IS NULL, NULL, quote_ask_time_us) AS ask_time_us,
+    (bid + ask) / 2 AS mid,
+    ask - bid AS spread
+FROM
+(
+    SELECT
+        toUnixTimestamp64Micro(t.event_time) AS trade_time_us,
+        t.price AS price,
+        t.size AS size,
+        toString(t.side) AS side,
+        toUnixTimestamp64Micro(b.event_time) AS quote_bid_time_us,
+        toUnixTimestamp64Micro(a.event_time) AS quote_ask_time_us,
+        if(trade_time_us - quote_bid_time_us <= {max_staleness_us:UInt64}, b.price, NULL) AS bid,
+        if(trade_time_us - quote_ask_time_us <= {max_staleness_us:UInt64}, a.price, NULL) AS ask
+    FROM
+    (
+        SELECT symbol, event_time, price, size, side
+        FROM default.ticks_all
+        WHERE symbol = {symbol:String}
+            AND event_type = 'trade'
+            AND event_time >= {start:DateTime64(6, 'UTC')}
+            AND event_time < {end:DateTime64(6, 'UTC')}
+    ) AS t
+    ASOF LEFT JOIN
+    (
+        SELECT symbol, event_time, price
+        FROM default.ticks_all
+        WHERE symbol = {symbol:String}
+            AND event_type = 'quote'
+            AND side = 'buy'
+            AND event_time >= {quote_start:DateTime64(6, 'UTC')}
+            AND event_time < {end:DateTime64(6, 'UTC')}
+    ) AS b
+    ON t.symbol = b.symbol AND t.event_time >= b.event_time
+    ASOF LEFT JOIN
+    (
+        SELECT symbol, event_time, price
+        FROM default.ticks_all
+        WHERE symbol = {symbol:String}
+            AND event_type = 'quote'
+            AND side = 'sell'
+            AND event_time >= {quote_start:DateTime64(6, 'UTC')}
+            AND event_time < {end:DateTime64(6, 'UTC')}
+    ) AS a
+    ON t.symbol = a.symbol AND t.event_time >= a.event_time
+)
+ORDER BY trade_time_us
+LIMIT {limit:UInt32}
+SETTINGS join_use_nulls = 1
+"""
+
+# --- Client-side fallback ---
+
+# Timestamps are fetched as Int64 microseconds so they map straight onto NumPy arrays.
+TRADES_WINDOW_QUERY = """
+SELECT
+    toUnixTimestamp64Micro(event_time) AS ts,
+    price,
+    size,
+    side = 'buy' AS is_buy
+FROM default.ticks_all
+WHERE symbol = {symbol:String}
+    AND event_type = 'trade'
+    AND event_time >= {start:DateTime64(6, 'UTC')}
+    AND event_time < {end:DateTime64(6, 'UTC')}
+ORDER BY event_time
+LIMIT {limit:UInt32}
+"""
+
+QUOTES_WINDOW_QUERY = """
+SELECT
+    toUnixTimestamp64Micro(event_time) AS ts,
+    price,
+    side = 'buy' AS is_bid
+FROM default.ticks_all
+WHERE symbol = {symbol:String}
+    AND event_type = 'quote'
+    AND event_time >= {quote_start:DateTime64(6, 'UTC')}
+    AND event_time < {end:DateTime64(6, 'UTC')}
+ORDER BY event_time
+"""
+
+
+def asof_align(left_ts: np.ndarray, right_ts: np.ndarray, right_values: np.ndarray, max_staleness: int = None):
+    """
+    For each left timestamp, pick the last right value with right_ts <= left_ts, and
+    with 'max_staleness' at most that much older. 'right_ts' must be sorted ascending.
+    Unmatched rows get NaN / -1.
+
+    Returns (values, matched_ts).
+    """
+    idx = np.searchsorted(right_ts, left_ts, side="right") - 1
+    matched = idx >= 0
+    if max_staleness is not None:
+        matched[matched] = left_ts[matched] - right_ts[idx[matched]] <= max_staleness
+
+    values = np.full(len(left_ts), np.nan)
+    values[matched] = right_values[idx[matched]]
+
+    matched_ts = np.full(len(left_ts), -1, dtype=np.int64)
+    matched_ts[matched] = right_ts[idx[matched]]
+    return values, matched_ts
+
+
+class QuoteWindowCache:
+    """
+    Small LRU cache of sorted bid/ask arrays per (symbol, quote_start, end) window.
+    Only closed windows (end in the past) should be cached, since live windows still grow.
+    """
+
+    def __init__(self, max_windows: int = 32):
+        self.max_windows = max_windows
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None:
+                self._windows.move_to_end(key)
+            return window
+
+    def put(self, key, window):
+        with self._lock:
+            self._windows[key] = window
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+
+
+def split_quotes(ts, price, is_bid):
+    """Split a columnar quote result into sorted bid and ask arrays."""
+    ts = np.asarray(ts, dtype=np.int64)
+    price = np.asarray(price, dtype=np.float64)
+    is_bid = np.asarray(is_bid, dtype=bool)
+    return {
+        "bid_ts": ts[is_bid],
+        "bid": price[is_bid],
+        "ask_ts": ts[~is_bid],
+        "ask": price[~is_bid],
+    }
+
+
+def align_trades(trade_ts, quotes: dict, max_staleness_us: int = None):
+    """Align trade timestamps with the prevailing bid and ask in one vectorised pass."""
+    trade_ts = np.asarray(trade_ts, dtype=np.int64)
+    bid, bid_ts = asof_align(trade_ts, quotes["bid_ts"], quotes["bid"], max_staleness_us)
+    ask, ask_ts = asof_align(trade_ts, quotes["ask_ts"], quotes["ask"], max_staleness_us)
+    return {
+        "bid": bid,
+        "bid_ts": bid_ts,
+        "ask": ask,
+        "ask_ts": ask_ts,
+        "mid": (bid + ask) / 2,
+        "spread": ask - bid,
+    }
+
+
+def _nan_to_none(value):
+    """JSON has no NaN, so unmatched values are returned as null."""
+    value = float(value)
+    return None if value != value else value
+
+
+def _ts_or_none(value):
+    value = int(value)
+    return None if value < 0 else value
+
+
+def aligned_rows(trade_ts, price, size, is_buy, aligned: dict) -> list:
+    """Client-mode result as ASOF_COLUMNS row dicts, like the server-mode query returns."""
+    return [
+        dict(zip(ASOF_COLUMNS, (
+            int(trade_ts[i]),
+            price[i],
+            size[i],
+            "buy" if is_buy[i] else "sell",
+            _nan_to_none(aligned["bid"][i]),
+            _ts_or_none(aligned["bid_ts"][i]),
+            _nan_to_none(aligned["ask"][i]),
+            _ts_or_none(aligned["ask_ts"][i]),
+            _nan_to_none(aligned["mid"][i]),
+            _nan_to_none(aligned["spread"][i]),
+        )))
+        for i in range(len(trade_ts))
+    ]
+
+
+def tca_summary(price, is_buy, mid, spread):
+    """
+    Transaction-cost summary over aligned trades.
+    Effective spread is 2 * |price - mid|; signed cost is positive when the trade paid up.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    is_buy = np.asarray(is_buy, dtype=bool)
+    mid = np.asarray(mid, dtype=np.float64)
+    spread = np.asarray(spread, dtype=np.float64)
+
+    matched = ~np.isnan(mid)
+    if not matched.any():
+        return {"trades": int(len(price)), "matched_trades": 0}
+
+    p, m = price[matched], mid[matched]
+    sign = np.where(is_buy[matched], 1.0, -1.0)
+    return {
+        "trades": int(len(price)),
+        "matched_trades": int(matched.sum()),
+        "avg_quoted_spread": float(np.mean(spread[matched])),
+        "avg_effective_spread_bps": float(np.mean(2 * np.abs(p - m) / m) * 10000),
+        "avg_signed_cost_bps": float(np.mean(sign * (p - m) / m) * 10000),
+    }
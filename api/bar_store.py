@@ -0,0 +1,311 @@
+"""
+Local store of finalised 1-minute bars, persisted as memory-mapped NumPy files.
+
+Bars older than a short finalisation lag never change, so re-fetching months of
+them from ClickHouse for every backtest is wasted work. This store keeps them on
+the API host as one structured array per symbol and UTC day:
+
+    {BAR_STORE_DIR}/{symbol}/{YYYYMMDD}.npy    1440 rows, row = minute of day
+    {BAR_STORE_DIR}/{symbol}/watermark         "floor watermark": stored minutes are in (floor, watermark]
+    {BAR_STORE_DIR}/rewrites                   newest 'rollup_rewrites' entry already applied
+
+Reads copy the populated minutes of the requested range out of the memory maps
+(never views, since rewrites change days in place) and only ask ClickHouse for the
+tail after the watermark. Syncing fetches only minutes newer than the
+watermark.
+
+Finalised minutes can still be rewritten by repair_rollups.py and apply_corrections.py,
+which log the affected (symbol, day) in 'rollup_rewrites'. Every
+BAR_STORE_REWRITE_CHECK_SECONDS the store reads the new entries and re-fetches those
+days in place.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+# --- Configuration ---
+BAR_STORE_DIR = Path(os.environ.get("BAR_STORE_DIR", Path(__file__).parent / "bar_store"))
+# Minutes younger than this may still receive ticks (Buffer flushes within 60s)
+FINALIZE_LAG_SECONDS = int(os.environ.get("BAR_STORE_FINALIZE_LAG_SECONDS", 180))
+# How far back the first sync of a symbol reaches
+INITIAL_SYNC_DAYS = int(os.environ.get("BAR_STORE_INITIAL_SYNC_DAYS", 30))
+# How often syncs look for rewritten days in 'rollup_rewrites'
+REWRITE_CHECK_SECONDS = float(os.environ.get("BAR_STORE_REWRITE_CHECK_SECONDS", 15))
+# Entries are read again for this long, in case one committed with an older timestamp.
+# Re-fetching a day is idempotent, so after a restart these are simply applied again.
+REWRITE_OVERLAP = timedelta(seconds=60)
+
+MINUTES_PER_DAY = 1440
+SECONDS_PER_DAY = 86400
+
+# 'minute' is unix seconds; 0 marks a minute with no trades
+BAR_DTYPE = np.dtype([
+    ("minute", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<u8"),
+    ("vwap", "<f8"),
+])
+
+# Same states as /backtest/fast, bounded by unix-second minutes
+BARS_QUERY = """
+SELECT
+    toUnixTimestamp(minute) AS minute,
+    argMinMerge(trades_1m_agg.open) AS open,
+    maxMerge(trades_1m_agg.high) AS high,
+    minMerge(trades_1m_agg.low) AS low,
+    argMaxMerge(trades_1m_agg.close) AS close,
+    sumMerge(trades_1m_agg.volume) AS volume,
+    sumMerge(trades_1m_agg.vwap_pv) / sumMerge(trades_1m_agg.volume) AS vwap
+FROM default.trades_1m_agg
+WHERE symbol = {symbol:String}
+    AND minute > toDateTime({after:Int64}, 'UTC')
+    AND minute <= toDateTime({until:Int64}, 'UTC')
+GROUP BY symbol, minute
+ORDER BY minute
+"""
+
+
+REWRITES_QUERY = """
+SELECT symbol, day, rewritten_at
+FROM default.rollup_rewrites_all
+WHERE rewritten_at > {since:DateTime64(6, 'UTC')}
+ORDER BY rewritten_at
+"""
+
+EPOCH = date(1970, 1, 1)
+
+
+def bars_from_columns(columns) -> np.ndarray:
+    """Columnar query result -> structured bar array."""
+    if not columns:
+        return np.empty(0, dtype=BAR_DTYPE)
+    bars = np.empty(len(columns[0]), dtype=BAR_DTYPE)
+    for name, values in zip(BAR_DTYPE.names, columns):
+        bars[name] = values
+    return bars
+
+
+class BarStore:
+    """Memory-mapped bar files for all symbols, with incremental sync from trades_1m_agg."""
+
+    def __init__(self, root: Path = BAR_STORE_DIR):
+        self.root = Path(root)
+        self._maps = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        # Newest applied 'rollup_rewrites' entry; the ones within REWRITE_OVERLAP of it are in _rewrites_seen
+        self._rewrite_lock = threading.Lock()
+        self._rewrite_position = None
+        self._rewrites_seen = set()
+        self._rewrites_checked = None   # monotonic time of the last check
+
+    # --- Files ---
+
+    def _symbol_dir(self, symbol: str) -> Path:
+        if not symbol.isalnum():
+            raise ValueError(f"Invalid symbol: {symbol!r}")
+        return self.root / symbol
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _day(self, symbol: str, day: int, create: bool = False):
+        """Memory map for one UTC day (days since epoch), or None if it does not exist."""
+        key = (symbol, day)
+        if key in self._maps:
+            return self._maps[key]
+
+        path = self._symbol_dir(symbol) / (time.strftime("%Y%m%d", time.gmtime(day * SECONDS_PER_DAY)) + ".npy")
+        if path.exists():
+            day_map = np.load(path, mmap_mode="r+")
+        elif create:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            day_map = np.lib.format.open_memmap(path, mode="w+", dtype=BAR_DTYPE, shape=(MINUTES_PER_DAY,))
+        else:
+            return None
+
+        self._maps[key] = day_map
+        return day_map
+
+    def watermarks(self, symbol: str):
+        """(floor, watermark) in unix seconds; (0, 0) before the first sync."""
+        path = self._symbol_dir(symbol) / "watermark"
+        if not path.exists():
+            return 0, 0
+        floor, watermark = path.read_text().split()
+        return int(floor), int(watermark)
+
+    def _set_watermarks(self, symbol: str, floor: int, watermark: int):
+        path = self._symbol_dir(symbol) / "watermark"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(f"{floor} {watermark}")
+        tmp.replace(path)  # atomic, so a crash never leaves a watermark past unwritten bars
+
+    # --- Sync ---
+
+    def sync(self, client, symbol: str) -> int:
+        """Fetches finalised minutes newer than the watermark. Returns the number of bars written."""
+        self.apply_rewrites(client)
+        with self._lock(symbol):
+            until = int(time.time()) - FINALIZE_LAG_SECONDS
+            until -= until % 60
+            floor, after = self.watermarks(symbol)
+            if not after:
+                floor = after = until - INITIAL_SYNC_DAYS * SECONDS_PER_DAY
+            if after >= until:
+                return 0
+
+            columns = client.execute(
+                BARS_QUERY, {'symbol': symbol, 'after': after, 'until': until}, columnar=True
+            )
+            bars = bars_from_columns(columns)
+
+            days = bars["minute"] // SECONDS_PER_DAY
+            for day in np.unique(days):
+                day_bars = bars[days == day]
+                day_map = self._day(symbol, int(day), create=True)
+                day_map[(day_bars["minute"] % SECONDS_PER_DAY) // 60] = day_bars
+                day_map.flush()
+
+            self._set_watermarks(symbol, floor, until)
+            return len(bars)
+
+    # --- Rewrites ---
+
+    def _stored_symbols(self) -> list:
+        if not self.root.exists():
+            return []
+        return [p.name for p in self.root.iterdir() if p.is_dir() and p.name.isalnum()]
+
+    def _load_rewrite_position(self) -> datetime:
+        path = self.root / "rewrites"
+        if not path.exists():
+            return datetime.fromtimestamp(0, timezone.utc)
+        return datetime.fromisoformat(path.read_text())
+
+    def _save_rewrite_position(self, position: datetime):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / "rewrites"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(position.isoformat())
+        tmp.replace(path)
+
+    def apply_rewrites(self, client, force: bool = False) -> int:
+        """
+        Re-fetches the stored days logged in 'rollup_rewrites' since the last check.
+        Runs at most every REWRITE_CHECK_SECONDS unless forced; returns the days re-fetched.
+        """
+        if not self._rewrite_lock.acquire(blocking=force):
+            return 0  # another request is checking
+        try:
+            checked = self._rewrites_checked
+            if not force and checked is not None and time.monotonic() - checked < REWRITE_CHECK_SECONDS:
+                return 0
+            if self._rewrite_position is None:
+                self._rewrite_position = self._load_rewrite_position()
+            position = self._rewrite_position
+
+            rows = [
+                (symbol, day, at if at.tzinfo else at.replace(tzinfo=timezone.utc))
+                for symbol, day, at in client.execute(REWRITES_QUERY, {'since': position - REWRITE_OVERLAP})
+            ]
+            new = [row for row in rows if row not in self._rewrites_seen]
+
+            refetched = 0
+            for symbol, day in sorted({(symbol, day) for symbol, day, _ in new}):
+                for name in [symbol] if symbol else self._stored_symbols():
+                    refetched += self._refetch_day(client, name, (day - EPOCH).days)
+
+            if rows:
+                position = max(position, rows[-1][2])
+                self._save_rewrite_position(position)
+            self._rewrite_position = position
+            self._rewrites_seen = {row for row in rows if row[2] > position - REWRITE_OVERLAP}
+            self._rewrites_checked = time.monotonic()
+            return refetched
+        finally:
+            self._rewrite_lock.release()
+
+    def _refetch_day(self, client, symbol: str, day: int) -> int:
+        """Replaces the stored minutes of one day with the rollup's current bars."""
+        if not symbol.isalnum():
+            return 0  # not a symbol the store can hold
+        with self._lock(symbol):
+            floor, watermark = self.watermarks(symbol)
+            start = max(day * SECONDS_PER_DAY, floor + 60)
+            end = min((day + 1) * SECONDS_PER_DAY, watermark + 60)
+            if start >= end:
+                return 0  # nothing of that day is stored
+
+            bars = self._fetch(client, symbol, start, end)
+            day_map = self._day(symbol, day, create=len(bars) > 0)
+            if day_map is None:
+                return 0
+            offset = day * SECONDS_PER_DAY
+            day_map[(start - offset) // 60:(end - offset) // 60] = 0
+            day_map[(bars["minute"] - offset) // 60] = bars
+            day_map.flush()
+            return 1
+
+    # --- Reads ---
+
+    def stored(self, symbol: str, start: int, end: int) -> np.ndarray:
+        """
+        Stored bars with start <= minute < end, copied out of the memory maps. The copy is
+        deliberate: days are re-fetched in place (apply_rewrites), so a view could change
+        under the caller. Only the populated minutes of [start, end) are copied, once.
+        """
+        with self._lock(symbol):
+            chunks = []
+            for day in range(start // SECONDS_PER_DAY, (end - 1) // SECONDS_PER_DAY + 1):
+                day_map = self._day(symbol, day)
+                if day_map is None:
+                    continue
+                lo = max(start - day * SECONDS_PER_DAY, 0) // 60
+                hi = min(end - day * SECONDS_PER_DAY, SECONDS_PER_DAY) // 60
+                chunk = day_map[lo:hi]
+                chunks.append((chunk, np.flatnonzero(chunk["minute"])))
+
+            bars = np.empty(sum(len(rows) for _, rows in chunks), dtype=BAR_DTYPE)
+            position = 0
+            for chunk, rows in chunks:
+                np.take(chunk, rows, out=bars[position:position + len(rows)])
+                position += len(rows)
+        return bars
+
+    def _fetch(self, client, symbol: str, start: int, end: int) -> np.ndarray:
+        """Bars with start <= minute < end straight from ClickHouse ('minute > after')."""
+        return bars_from_columns(client.execute(
+            BARS_QUERY, {'symbol': symbol, 'after': start - 60, 'until': end - 60}, columnar=True
+        ))
+
+    def bars(self, client, symbol: str, start: int, end: int) -> np.ndarray:
+        """
+        Bars in [start, end): the stored part from disk, plus whatever lies outside
+        (floor, watermark] from ClickHouse - normally just the tail after the watermark.
+        """
+        self.sync(client, symbol)
+        floor, watermark = self.watermarks(symbol)
+        stored_start, stored_end = max(start, floor + 60), min(end, watermark + 60)
+
+        parts = []
+        if start < stored_start:
+            parts.append(self._fetch(client, symbol, start, min(end, stored_start)))
+        if stored_start < stored_end:
+            parts.append(self.stored(symbol, stored_start, stored_end))
+        if stored_end < end:
+            parts.append(self._fetch(client, symbol, max(start, stored_end), end))
+
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
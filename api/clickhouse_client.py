@@ -1,4 +1,5 @@
 import os
+from contextlib import contextmanager
 from clickhouse_driver import Client
 
 # --- Configuration ---
@@ -9,6 +10,18 @@ CLICKHOUSE_PORT = int(os.environ.get("CLICKHOUSE_PORT", 9000))  # Native protoco
 # We will query the 'default' database
 CLICKHOUSE_DB = "default"
 
+# 'native' = ClickHouse server(s) over the native protocol,
+# 'local' = embedded chDB over synthetic data, no services needed (see local_backend.py)
+CLICKHOUSE_BACKEND = os.environ.get("CLICKHOUSE_BACKEND", "native")
+
+# Optional: native endpoints of several replicas of the same data ("host:port,host:port").
+# When set, get_clickhouse_client() returns a ReplicaPool (see replica_pool.py).
+CLICKHOUSE_REPLICAS = os.environ.get("CLICKHOUSE_REPLICAS", "")
+# Replicas lagging more than this (system.replicas absolute_delay) get no reads
+CLICKHOUSE_MAX_REPLICA_DELAY = float(os.environ.get("CLICKHOUSE_MAX_REPLICA_DELAY", 30))
+# Send a duplicate SELECT to a second replica after this many ms (0 = no hedging)
+CLICKHOUSE_HEDGE_AFTER_MS = float(os.environ.get("CLICKHOUSE_HEDGE_AFTER_MS", 0))
+
 # --- Client Function ---
 
 def get_clickhouse_client():
@@ -16,6 +29,28 @@ def get_clickhouse_client():
     Creates and returns a ClickHouse client connection.
     Manages connection settings in one place.
     """
+    if CLICKHOUSE_BACKEND == "local":
+        from local_backend import get_local_client
+
+        return get_local_client()
+    if CLICKHOUSE_BACKEND != "native":
+        raise ValueError(f"Unknown CLICKHOUSE_BACKEND: {CLICKHOUSE_BACKEND!r} (expected 'native' or 'local')")
+
+    if CLICKHOUSE_REPLICAS:
+        from replica_pool import ReplicaPool
+
+        pool = ReplicaPool(
+            [e for e in CLICKHOUSE_REPLICAS.split(",") if e.strip()],
+            max_delay=CLICKHOUSE_MAX_REPLICA_DELAY,
+            hedge_after_ms=CLICKHOUSE_HEDGE_AFTER_MS,
+            database=CLICKHOUSE_DB,
+            user='default',
+            password=''
+        )
+        healthy = [r.name for r in pool.replicas if r.healthy]
+        print(f"✅ ClickHouse replica pool: {len(healthy)}/{len(pool.replicas)} healthy ({', '.join(healthy)})")
+        return pool
+
     try:
         # Connect with default user (no password by default)
         client = Client(
@@ -39,6 +74,22 @@ def get_clickhouse_client():
         # In a real app, you might exit or retry, but here we'll let the error propagate
         raise
 
+def is_shareable(client) -> bool:
+    """A plain clickhouse_driver Client must not be used by two threads at once."""
+    return getattr(client, "shareable", False)
+
+@contextmanager
+def single_node(client):
+    """
+    Yields a Client bound to one server, for work that must see its own writes
+    (e.g. non-replicated scratch tables). A plain Client is yielded as is.
+    """
+    if hasattr(client, "pinned"):
+        with client.pinned() as node:
+            yield node
+    else:
+        yield client
+
 # --- Example Usage (for testing this file directly) ---
 if __name__ == "__main__":
     try:
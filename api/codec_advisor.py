@@ -0,0 +1,244 @@
+"""
+Codec tuning advisor.
+
+For each column of a table, copies a sample (in the table's own sort order, which is what
+Delta/DoubleDelta/Gorilla depend on) into a scratch MergeTree table that holds the same values
+once per candidate codec. It then reads the per-column sizes from system.columns, times a
+single-threaded decode of each candidate, and emits ALTER statements for the winners.
+"""
+import time
+import uuid
+
+# Candidates per base type. 'None' keeps the column type; a string replaces it
+# (e.g. String -> LowCardinality(String)).
+TIMESTAMP_CODECS = [
+    (None, "LZ4"),
+    (None, "ZSTD(1)"),
+    (None, "ZSTD(3)"),
+    (None, "Delta, ZSTD(1)"),
+    (None, "DoubleDelta, LZ4"),
+    (None, "DoubleDelta, ZSTD(1)"),
+    (None, "DoubleDelta, ZSTD(3)"),
+]
+FLOAT_CODECS = [
+    (None, "LZ4"),
+    (None, "ZSTD(1)"),
+    (None, "ZSTD(3)"),
+    (None, "Gorilla, LZ4"),
+    (None, "Gorilla, ZSTD(1)"),
+    (None, "Gorilla, ZSTD(3)"),
+]
+INTEGER_CODECS = [
+    (None, "LZ4"),
+    (None, "ZSTD(1)"),
+    (None, "ZSTD(3)"),
+    (None, "ZSTD(6)"),
+    (None, "T64, LZ4"),
+    (None, "T64, ZSTD(1)"),
+    (None, "Delta, ZSTD(1)"),
+    (None, "DoubleDelta, ZSTD(1)"),
+]
+ENUM_CODECS = [
+    (None, "LZ4"),
+    (None, "ZSTD(1)"),
+    (None, "ZSTD(3)"),
+]
+STRING_CODECS = [
+    (None, "LZ4"),
+    (None, "ZSTD(1)"),
+    (None, "ZSTD(3)"),
+    ("LowCardinality(String)", "LZ4"),
+    ("LowCardinality(String)", "ZSTD(1)"),
+]
+
+# Only recommend a change when it saves at least this share of the current size...
+MIN_SAVING = 0.05
+# ...and does not decode more than this many times slower than the current codec.
+MAX_DECODE_SLOWDOWN = 1.5
+# Every trial holds the sample once per candidate codec (up to 9 copies)
+MAX_SAMPLE_ROWS = 10_000_000
+
+
+def candidates_for(column_type: str) -> list:
+    """Candidate (type, codec) pairs for a ClickHouse column type."""
+    if column_type.startswith(("DateTime", "Date")):
+        return TIMESTAMP_CODECS
+    if column_type.startswith("Float"):
+        return FLOAT_CODECS
+    if column_type.startswith(("UInt", "Int")):
+        return INTEGER_CODECS
+    if column_type.startswith("Enum"):
+        return ENUM_CODECS
+    if column_type == "String":
+        return STRING_CODECS
+    if column_type.startswith("LowCardinality"):
+        return [(None, "LZ4"), (None, "ZSTD(1)"), (None, "ZSTD(3)")]
+    return []
+
+
+def _table_columns(client, table: str) -> dict:
+    rows = client.execute(
+        """
+        SELECT name, type, compression_codec
+        FROM system.columns
+        WHERE database = 'default' AND table = {table:String}
+        ORDER BY position
+        """,
+        {'table': table}
+    )
+    return {name: (col_type, codec) for name, col_type, codec in rows}
+
+
+def _sorting_key(client, table: str) -> str:
+    rows = client.execute(
+        "SELECT sorting_key FROM system.tables WHERE database = 'default' AND name = {table:String}",
+        {'table': table}
+    )
+    if not rows:
+        raise ValueError(f"Unknown table: {table}")
+    return rows[0][0]
+
+
+def _current_codec(codec: str) -> str:
+    """system.columns reports 'CODEC(Gorilla, ZSTD(1))' or '' (server default, LZ4)."""
+    if codec.startswith("CODEC(") and codec.endswith(")"):
+        return codec[len("CODEC("):-1]
+    return "LZ4"
+
+
+def _decode_ms(client, scratch: str, column: str, repeats: int = 3) -> float:
+    """Best-of-N single-threaded full read of one scratch column."""
+    query = f"SELECT count() FROM {scratch} WHERE NOT ignore({column})"
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        client.execute(query, settings={'max_threads': 1, 'use_uncompressed_cache': 0})
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def trial_column(client, table: str, column: str, column_type: str, current_codec: str,
+                 sort_key: str, sample_rows: int) -> dict:
+    """Trial-encodes one column with every candidate codec and picks a winner."""
+    trials = [(None, current_codec)] + [
+        candidate for candidate in candidates_for(column_type) if candidate != (None, current_codec)
+    ]
+
+    scratch = f"default._codec_trial_{uuid.uuid4().hex[:12]}"
+    definitions = ", ".join(
+        f"c{i} {new_type or column_type} CODEC({codec})" for i, (new_type, codec) in enumerate(trials)
+    )
+    copies = ", ".join(f"{column} AS c{i}" for i in range(len(trials)))
+
+    # Wide parts are required for per-column sizes in system.columns
+    client.execute(
+        f"CREATE TABLE {scratch} ({definitions}) ENGINE = MergeTree ORDER BY tuple() "
+        f"SETTINGS min_bytes_for_wide_part = 0"
+    )
+    try:
+        client.execute(
+            f"INSERT INTO {scratch} SELECT {copies} FROM default.{table} "
+            f"ORDER BY {sort_key} LIMIT {int(sample_rows)}"
+        )
+        client.execute(f"OPTIMIZE TABLE {scratch} FINAL")
+
+        sizes = dict(
+            (name, (compressed, uncompressed))
+            for name, compressed, uncompressed in client.execute(
+                """
+                SELECT name, data_compressed_bytes, data_uncompressed_bytes
+                FROM system.columns
+                WHERE database = 'default' AND table = {table:String}
+                """,
+                {'table': scratch.split(".", 1)[1]}
+            )
+        )
+
+        results = []
+        for i, (new_type, codec) in enumerate(trials):
+            compressed, uncompressed = sizes[f"c{i}"]
+            decode_ms = _decode_ms(client, scratch, f"c{i}")
+            results.append({
+                "type": new_type or column_type,
+                "codec": codec,
+                "is_current": i == 0,
+                "compressed_bytes": compressed,
+                "compression_ratio": round(uncompressed / compressed, 2) if compressed else None,
+                "decode_ms": round(decode_ms, 2),
+                "decode_mb_s": round(uncompressed / 1e6 / (decode_ms / 1000), 1) if decode_ms else None,
+            })
+    finally:
+        client.execute(f"DROP TABLE IF EXISTS {scratch}")
+
+    current = results[0]
+    acceptable = [
+        r for r in results
+        if r["decode_ms"] <= current["decode_ms"] * MAX_DECODE_SLOWDOWN
+    ]
+    best = min(acceptable, key=lambda r: r["compressed_bytes"])
+
+    alter = None
+    if not best["is_current"] and best["compressed_bytes"] <= current["compressed_bytes"] * (1 - MIN_SAVING):
+        alter = (
+            f"ALTER TABLE default.{table} ON CLUSTER analytics_cluster "
+            f"MODIFY COLUMN `{column}` {best['type']} CODEC({best['codec']})"
+        )
+
+    return {
+        "column": column,
+        "current": {"type": column_type, "codec": current_codec},
+        "recommended": {"type": best["type"], "codec": best["codec"]},
+        "saving": round(1 - best["compressed_bytes"] / current["compressed_bytes"], 3)
+        if current["compressed_bytes"] else 0.0,
+        "alter": alter,
+        "trials": results,
+    }
+
+
+def advise(client, table: str, columns: list = None, sample_rows: int = 1_000_000) -> dict:
+    """
+    Runs the trials for every requested column of 'table' (all columns by default).
+    Columns are validated against system.columns before any SQL is built from them.
+    """
+    if not 1 <= sample_rows <= MAX_SAMPLE_ROWS:
+        raise ValueError(f"sample_rows must be between 1 and {MAX_SAMPLE_ROWS}")
+    table_columns = _table_columns(client, table)
+    if not table_columns:
+        raise ValueError(f"Unknown table: {table}")
+    columns = columns or list(table_columns)
+    unknown = [c for c in columns if c not in table_columns]
+    if unknown:
+        raise ValueError(f"Unknown column(s) in {table}: {unknown}")
+
+    sort_key = _sorting_key(client, table) or "tuple()"
+
+    reports = []
+    for column in columns:
+        column_type, codec = table_columns[column]
+        # Skip aggregate states and anything we have no candidates for
+        if not candidates_for(column_type):
+            continue
+        reports.append(trial_column(
+            client, table, column, column_type, _current_codec(codec), sort_key, sample_rows
+        ))
+
+    return {
+        "table": table,
+        "sample_rows": sample_rows,
+        "columns": reports,
+        "alters": [r["alter"] for r in reports if r["alter"]],
+    }
+
+
+# --- Example Usage (prints ALTER statements for ticks_dedup) ---
+if __name__ == "__main__":
+    from clickhouse_client import get_clickhouse_client
+
+    report = advise(get_clickhouse_client(), "ticks_dedup")
+    for col in report["columns"]:
+        print(f"{col['column']:<16} {col['current']['codec']:<24} -> "
+              f"{col['recommended']['type']} CODEC({col['recommended']['codec']}) "
+              f"saves {col['saving'] * 100:.1f}%")
+    print()
+    for statement in report["alters"]:
+        print(statement + ";")
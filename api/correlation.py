@@ -0,0 +1,179 @@
+"""
+Cross-symbol correlation and covariance matrices of interval log returns.
+
+One columnar query reads the closing price of every (symbol, interval) from
+'trades_1m_agg' (argMax states merged per interval on the server), so hundreds of
+symbols cost one round trip instead of one /backtest/fast call each:
+
+- The closes are scattered into a (intervals x symbols) matrix. Intervals without a
+  trade are forward-filled for up to 'fill_limit' intervals; longer gaps stay NaN.
+- Log returns are NaN wherever either end is missing. Statistics are pairwise-complete:
+  each pair uses the intervals where both symbols have a return. The sums behind them
+  are matrix products over the validity mask (M) and the zero-filled returns (X):
+
+      n  = M'M          counts
+      sx = X'M          sum of x_i over the rows where j is valid
+      sxy = X'X         cross products
+      sxx = (X*X)'M     sum of x_i^2 over the rows where j is valid
+
+  so the whole matrix is a handful of BLAS calls, with or without gaps.
+- Rolling matrices are the same computation over 'window' returns every 'step' returns.
+
+Results for windows that ended FINALIZE_LAG_SECONDS ago never change and are kept in a
+small LRU cache keyed by the window and options.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bar_store import FINALIZE_LAG_SECONDS
+
+MAX_SYMBOLS = 500
+MAX_ROLLING_WINDOWS = 200
+STATS = ("correlation", "covariance", "both")
+
+# One row per (symbol, interval). Buckets are aligned to the epoch rather than the day,
+# so consecutive buckets are always 'interval' apart. The filter is added only when
+# symbols are given.
+CLOSES_QUERY = """
+SELECT
+    intDiv(toUnixTimestamp(minute), {{interval:UInt32}} * 60) * {{interval:UInt32}} * 60 AS bucket,
+    symbol,
+    argMaxMerge(trades_1m_agg.close) AS close
+FROM default.trades_1m_agg
+WHERE minute >= toStartOfMinute({{start:DateTime64(6, 'UTC')}})
+    AND minute < {{end:DateTime64(6, 'UTC')}}
+    {symbol_filter}
+GROUP BY symbol, bucket
+ORDER BY bucket
+"""
+
+
+def closes_query(filtered: bool) -> str:
+    return CLOSES_QUERY.format(symbol_filter="AND symbol IN {symbols:Array(String)}" if filtered else "")
+
+
+def price_matrix(buckets, symbols, closes, interval_seconds: int, fill_limit: int):
+    """
+    Columnar CLOSES_QUERY result -> (bucket starts, symbol names, closes matrix).
+    Every interval between the first and last bucket gets a row; missing closes are NaN
+    after forward-filling at most 'fill_limit' intervals.
+    """
+    buckets = np.asarray(buckets, dtype=np.int64)
+    names, column = np.unique(np.asarray(symbols, dtype=object), return_inverse=True)
+    first = buckets.min()
+    times = np.arange(first, buckets.max() + interval_seconds, interval_seconds)
+
+    prices = np.full((len(times), len(names)), np.nan)
+    prices[(buckets - first) // interval_seconds, column] = closes
+
+    if fill_limit > 0:
+        # Row of the last observed close in each column, carried forward
+        rows = np.arange(len(times))[:, None]
+        last_seen = np.maximum.accumulate(np.where(np.isnan(prices), -1, rows), axis=0)
+        fillable = (last_seen >= 0) & (rows - last_seen <= fill_limit)
+        filled = prices[np.maximum(last_seen, 0), np.arange(len(names))]
+        prices = np.where(fillable, filled, np.nan)
+    return times, names.tolist(), prices
+
+
+def log_returns(prices: np.ndarray) -> np.ndarray:
+    """Returns between consecutive intervals; NaN where either close is missing."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.diff(np.log(prices), axis=0)
+
+
+def pairwise_moments(returns: np.ndarray, min_periods: int):
+    """
+    (covariance, correlation) with pairwise-complete observations.
+    Pairs with fewer than 'min_periods' common returns are NaN.
+    """
+    valid = ~np.isnan(returns)
+    mask = valid.astype(np.float64)
+    x = np.where(valid, returns, 0.0)
+
+    n = mask.T @ mask
+    sx = x.T @ mask            # sx[i, j]: sum of x_i where x_j is valid
+    sxy = x.T @ x
+    sxx = (x * x).T @ mask
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cross = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n           # variance sums of x_i over the common rows
+        covariance = cross / (n - 1)
+        correlation = cross / np.sqrt(var_i * var_i.T)
+
+    too_few = n < max(min_periods, 2)
+    covariance[too_few] = np.nan
+    correlation[too_few] = np.nan
+    # Rounding can push |r| a hair over 1
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+    np.fill_diagonal(correlation, np.where(np.diag(too_few) | (np.diag(var_i) <= 0), np.nan, 1.0))
+    return covariance, correlation
+
+
+def _matrix(values: np.ndarray) -> list:
+    """NaN (not enough data) becomes null, which JSON can carry."""
+    return [[None if np.isnan(v) else float(v) for v in row] for row in values]
+
+
+def _stats(returns: np.ndarray, stat: str, min_periods: int) -> dict:
+    covariance, correlation = pairwise_moments(returns, min_periods)
+    result = {"observations": int((~np.isnan(returns)).all(axis=1).sum())}
+    if stat in ("correlation", "both"):
+        result["correlation"] = _matrix(correlation)
+    if stat in ("covariance", "both"):
+        result["covariance"] = _matrix(covariance)
+    return result
+
+
+def compute(times, returns: np.ndarray, stat: str, min_periods: int, window: int = None, step: int = 1) -> dict:
+    """
+    Full-range statistics, or with 'window' the rolling ones. 'observations' counts the
+    returns where every symbol traded; each pair may use more.
+    """
+    if window is None:
+        return _stats(returns, stat, min_periods)
+
+    # times[i + 1] is the end of returns[i]
+    ends = range(window, len(returns) + 1, step)
+    return {
+        "windows": [
+            {"end": datetime.fromtimestamp(int(times[end]), timezone.utc), **_stats(returns[end - window:end], stat, min_periods)}
+            for end in ends
+        ]
+    }
+
+
+def rolling_window_count(returns_count: int, window: int, step: int) -> int:
+    return max((returns_count - window) // step + 1, 0)
+
+
+class ResultCache:
+    """LRU cache of finished results. Only windows that can no longer change should be put."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def is_final(end_timestamp: float, now_timestamp: float) -> bool:
+    """Minutes older than the finalisation lag receive no more ticks."""
+    return end_timestamp <= now_timestamp - FINALIZE_LAG_SECONDS
@@ -0,0 +1,153 @@
+"""
+Server-side downsampling for chart-sized bar responses.
+
+A chart has a few hundred to a couple of thousand pixels across, so returning one
+row per minute for a week wastes payload and render time. With 'max_points' the bar
+endpoints return at most that many points:
+
+- 'ohlc' (default): bars are re-bucketed to a coarser interval. On the rollups
+  this is done in ClickHouse by merging the per-minute states over each bucket,
+  so open/high/low/close/volume/vwap are exactly what a native N-minute bar would be.
+- 'lttb': Largest-Triangle-Three-Buckets on the close price, keeping the shape
+  of a line series.
+- 'minmax': per bucket, the bars with the lowest and highest close, so no spike
+  disappears.
+
+Line modes return a subset of the original 1-minute bars.
+"""
+import math
+
+import numpy as np
+
+DOWNSAMPLE_MODES = ("ohlc", "lttb", "minmax")
+
+# Bucket sizes in minutes; a bucket never straddles an hour or day boundary
+NICE_BUCKETS = (1, 2, 3, 5, 10, 15, 30, 60, 120, 240, 360, 720, 1440)
+
+
+def bucket_minutes(span_minutes: int, max_points: int) -> int:
+    """
+    Smallest nice bucket that fits 'span_minutes' into at most 'max_points' buckets.
+    Buckets are aligned to the epoch, not to the window, so a window starting b - 1
+    minutes into a bucket of b touches (span + b - 2) // b + 1 of them; the bucket is
+    chosen so that even this worst case fits. 'max_points' must be at least 2.
+    """
+    need = (span_minutes - 2) // max(max_points - 1, 1) + 1
+    for bucket in NICE_BUCKETS:
+        if bucket >= need:
+            return bucket
+    return math.ceil(need / 1440) * 1440
+
+
+def build_bucketed_query(table: str, filters: list) -> str:
+    """
+    OHLCV/VWAP over the last {limit} minutes of a trade rollup, re-bucketed to
+    {bucket} minutes by merging the minute states. 'filters' are fixed SQL snippets
+    with query parameters (see /backtest/fast), never user text.
+    """
+    where = " AND ".join(filters)
+    # Columns are table-qualified so they never resolve to the 'minute' alias
+    return f"""
+    SELECT
+        toStartOfInterval({table}.minute, toIntervalMinute({{bucket:UInt32}})) AS minute,
+        symbol,
+        argMinMerge({table}.open) AS open,
+        maxMerge({table}.high) AS high,
+        minMerge({table}.low) AS low,
+        argMaxMerge({table}.close) AS close,
+        sumMerge({table}.volume) AS volume,
+        sumMerge({table}.vwap_pv) / sumMerge({table}.volume) AS vwap
+    FROM
+        default.{table}
+    WHERE
+        {where}
+        AND {table}.minute >= (
+            SELECT min(m) FROM (
+                SELECT minute AS m FROM default.{table}
+                WHERE {where}
+                GROUP BY m ORDER BY m DESC LIMIT {{limit:UInt32}}
+            )
+        )
+    GROUP BY
+        symbol, minute
+    ORDER BY
+        minute DESC
+    """
+
+
+def ohlc_buckets(bars: np.ndarray, bucket: int) -> np.ndarray:
+    """
+    Re-buckets a structured bar array (bar_store.BAR_DTYPE, oldest first) to
+    'bucket' minutes. Buckets are aligned to the epoch, like toStartOfInterval.
+    """
+    if bucket <= 1 or len(bars) == 0:
+        return bars
+
+    keys = bars["minute"] // (bucket * 60)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), dtype=bars.dtype)
+    out["minute"] = keys[starts] * bucket * 60
+    out["open"] = bars["open"][starts]
+    out["high"] = np.maximum.reduceat(bars["high"], starts)
+    out["low"] = np.minimum.reduceat(bars["low"], starts)
+    out["close"] = bars["close"][ends]
+    out["volume"] = np.add.reduceat(bars["volume"], starts)
+    notional = np.add.reduceat(bars["vwap"] * bars["volume"], starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["vwap"] = notional / out["volume"]
+    return out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices kept by Largest-Triangle-Three-Buckets (x ascending)."""
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1])
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # First and last points are always kept; the rest is split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    kept = [0]
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        prev_x, prev_y = x[kept[-1]], y[kept[-1]]
+        area = np.abs(
+            (prev_x - next_x) * (y[lo:hi] - prev_y) - (prev_x - x[lo:hi]) * (next_y - prev_y)
+        )
+        kept.append(lo + int(np.argmax(area)))
+    kept.append(n - 1)
+    return np.asarray(kept)
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of the min and max of y in each of max_points // 2 equal buckets."""
+    n = len(y)
+    buckets = max_points // 2
+    if max_points >= n or buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    kept = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            kept.extend((lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))))
+    return np.unique(kept)
+
+
+def line_indices(mode: str, x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Dispatches to LTTB or min/max decimation; indices are ascending."""
+    if mode == "lttb":
+        return lttb_indices(x, y, max_points)
+    return minmax_indices(y, max_points)
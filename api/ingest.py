@@ -0,0 +1,255 @@
+"""
+Tick ingestion over HTTP, for writers that are not on Kafka (e.g. corrections
+with a higher source_version).
+
+Every insert creates at least one part per shard, so many small writers inserting
+directly would flood the merges. Batches are validated against the ticks_local
+schema, then coalesced before they reach ClickHouse:
+
+- mode 'block' (default): rows go into a bounded in-process ring buffer. One
+  flusher thread sends them to 'ticks_all' as large native blocks, once
+  INGEST_FLUSH_ROWS rows are waiting or the oldest row is INGEST_FLUSH_SECONDS old.
+- mode 'async': each batch is sent straight away with async_insert=1, and the
+  server does the coalescing.
+
+Acknowledgement levels:
+- 'buffered': returns once the rows are validated and queued (lost if the API dies).
+- 'committed': returns once ClickHouse confirmed the insert on the shards
+  (insert_distributed_sync=1, and wait_for_async_insert=1 in async mode).
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+from datetime import datetime, timezone
+
+# --- Configuration ---
+INGEST_MODE = os.environ.get("INGEST_MODE", "block")
+# Ring buffer capacity; batches that do not fit are rejected (back-pressure)
+INGEST_BUFFER_ROWS = int(os.environ.get("INGEST_BUFFER_ROWS", 1_000_000))
+INGEST_FLUSH_ROWS = int(os.environ.get("INGEST_FLUSH_ROWS", 100_000))
+INGEST_FLUSH_SECONDS = float(os.environ.get("INGEST_FLUSH_SECONDS", 1.0))
+# Largest accepted batch per request
+INGEST_MAX_BATCH = 100_000
+# How long ack='committed' waits before answering 504 (the rows stay queued)
+INGEST_ACK_TIMEOUT_SECONDS = float(os.environ.get("INGEST_ACK_TIMEOUT_SECONDS", 30))
+
+INGEST_MODES = ("block", "async")
+ACK_LEVELS = ("buffered", "committed")
+
+TICK_COLUMNS = (
+    "exchange", "symbol", "event_time", "seq_id", "event_type",
+    "price", "size", "side", "source_version",
+)
+INSERT_QUERY = f"INSERT INTO default.ticks_all ({', '.join(TICK_COLUMNS)}) VALUES"
+
+EVENT_TYPES = ("trade", "quote", "book")  # Enum8 in ticks_local
+SIDES = ("buy", "sell")                   # Enum8 in ticks_local
+UINT32_MAX = 2**32 - 1
+UINT64_MAX = 2**64 - 1
+
+# Ack 'committed' needs the shards to have the rows, not just the Distributed queue
+COMMIT_SETTINGS = {'insert_distributed_sync': 1}
+ASYNC_SETTINGS = {'async_insert': 1, 'wait_for_async_insert': 0}
+
+
+class BufferFull(Exception):
+    """The ring buffer cannot take the batch without exceeding its capacity."""
+
+
+# --- Validation ---
+
+def _uint(value, limit: int, name: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= limit:
+        raise ValueError(f"{name} must be an integer in [0, {limit}]")
+    return value
+
+
+def _event_time(value) -> datetime:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc)
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        # Naive timestamps are UTC, like the producer's
+        return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+    raise ValueError("event_time must be an ISO 8601 string or unix seconds")
+
+
+def validate_tick(tick: dict) -> tuple:
+    """One tick dict -> row tuple in TICK_COLUMNS order. Raises ValueError."""
+    if not isinstance(tick, dict):
+        raise ValueError("tick must be an object")
+    missing = [c for c in TICK_COLUMNS if c not in tick]
+    if missing:
+        raise ValueError(f"missing field(s): {missing}")
+    unknown = [k for k in tick if k not in TICK_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown field(s): {unknown}")
+
+    exchange, symbol = tick["exchange"], tick["symbol"]
+    if not isinstance(exchange, str) or not exchange:
+        raise ValueError("exchange must be a non-empty string")
+    if not isinstance(symbol, str) or not symbol:
+        raise ValueError("symbol must be a non-empty string")
+    if tick["event_type"] not in EVENT_TYPES:
+        raise ValueError(f"event_type must be one of {EVENT_TYPES}")
+    if tick["side"] not in SIDES:
+        raise ValueError(f"side must be one of {SIDES}")
+    price = tick["price"]
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or not math.isfinite(price) or price <= 0:
+        raise ValueError("price must be a positive number")
+
+    return (
+        exchange,
+        symbol,
+        _event_time(tick["event_time"]),
+        _uint(tick["seq_id"], UINT64_MAX, "seq_id"),
+        tick["event_type"],
+        float(price),
+        _uint(tick["size"], UINT32_MAX, "size"),
+        tick["side"],
+        _uint(tick["source_version"], UINT64_MAX, "source_version"),
+    )
+
+
+def validate_batch(ticks) -> tuple:
+    """Returns (rows, errors); errors are {'index', 'error'} for every rejected tick."""
+    rows, errors = [], []
+    for index, tick in enumerate(ticks):
+        try:
+            rows.append(validate_tick(tick))
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            errors.append({"index": index, "error": str(e)})
+    return rows, errors
+
+
+# --- Buffer ---
+
+class IngestBuffer:
+    """
+    Bounded FIFO of validated rows with one background flusher.
+    Rows get consecutive sequence numbers, so a writer waiting for 'committed'
+    only has to watch the highest flushed sequence number.
+    """
+
+    def __init__(self, client_factory, capacity: int = INGEST_BUFFER_ROWS,
+                 flush_rows: int = INGEST_FLUSH_ROWS, flush_seconds: float = INGEST_FLUSH_SECONDS):
+        self._client_factory = client_factory
+        self._client = None
+        self.capacity = capacity
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        self._rows = deque()
+        self._oldest = None          # monotonic time the oldest buffered row arrived
+        self._next_seq = 0           # sequence number of the next row submitted
+        self._flushed_seq = 0        # every row below this is in ClickHouse
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        self.stats = {
+            "rows_received": 0,
+            "rows_flushed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": None,
+            "last_error": None,
+        }
+
+    def submit(self, rows: list) -> int:
+        """Queues rows; returns the sequence number that marks them committed."""
+        with self._cond:
+            if len(self._rows) + len(rows) > self.capacity:
+                raise BufferFull(f"ingest buffer full ({len(self._rows)}/{self.capacity} rows)")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+                self._thread.start()
+            was_empty = not self._rows
+            if was_empty:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            self._next_seq += len(rows)
+            self.stats["rows_received"] += len(rows)
+            # An idle flusher waits without a timeout; the first row starts its clock
+            if was_empty or len(self._rows) >= self.flush_rows:
+                self._cond.notify_all()
+            return self._next_seq
+
+    def wait_committed(self, seq: int, timeout: float) -> bool:
+        """Blocks until every row below 'seq' is flushed, or the timeout passes."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._flushed_seq >= seq, timeout)
+
+    def depth(self) -> int:
+        return len(self._rows)
+
+    def close(self, timeout: float = 10.0):
+        """Flushes what is left and stops the flusher (API shutdown)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _due(self) -> bool:
+        if not self._rows:
+            return False
+        if self._stopping or len(self._rows) >= self.flush_rows:
+            return True
+        return time.monotonic() - self._oldest >= self.flush_seconds
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._stopping:
+                        return
+                    timeout = None
+                    if self._rows:
+                        timeout = max(self.flush_seconds - (time.monotonic() - self._oldest), 0)
+                    self._cond.wait(timeout)
+                # Take a block; rows stay queued (and count against capacity) until written
+                block = list(islice(self._rows, self.flush_rows))
+
+            if self._flush(block):
+                with self._cond:
+                    for _ in block:
+                        self._rows.popleft()
+                    self._flushed_seq += len(block)
+                    self._oldest = time.monotonic() if self._rows else None
+                    self._cond.notify_all()
+            elif self._stopping:
+                return
+            else:
+                time.sleep(1)  # ClickHouse unavailable; keep the rows and retry
+
+    def _flush(self, block: list) -> bool:
+        start = time.perf_counter()
+        try:
+            if self._client is None:
+                # Own connection: clickhouse_driver clients are not thread-safe
+                self._client = self._client_factory()
+            self._client.execute(INSERT_QUERY, block, settings=COMMIT_SETTINGS)
+        except Exception as e:
+            self._client = None
+            self.stats["flush_errors"] += 1
+            self.stats["last_error"] = str(e)
+            return False
+
+        self.stats["flushes"] += 1
+        self.stats["rows_flushed"] += len(block)
+        self.stats["last_flush_rows"] = len(block)
+        self.stats["last_flush_ms"] = (time.perf_counter() - start) * 1000
+        return True
+
+
+def insert_async(client, rows: list, wait: bool):
+    """Mode 'async': one INSERT per batch; ClickHouse coalesces them server-side."""
+    settings = dict(ASYNC_SETTINGS, **COMMIT_SETTINGS)
+    if wait:
+        settings['wait_for_async_insert'] = 1
+    client.execute(INSERT_QUERY, rows, settings=settings)
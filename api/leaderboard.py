@@ -0,0 +1,328 @@
+"""
+Live leaderboards: which symbols traded most / moved most over the last N minutes.
+
+Fed by the tick stream (POST /ingest/ticks, and the Kafka 'ticks' topic when
+LEADERBOARD_KAFKA_BROKER is set) instead of a GROUP BY over every symbol per request:
+
+- Trades are added to LEADERBOARD_BUCKET_SECONDS buckets in a ring that covers the
+  longest tracked window. Each bucket holds {symbol: [volume, notional, last price]}.
+- For every tracked window, running per-symbol sums are updated when a trade arrives
+  and when its bucket leaves the window. Expiry only visits symbols that traded in the
+  expiring bucket, so the cost follows the trades, not the symbol count. A symbol whose
+  window volume drops to 0 leaves that window's sums and heaps.
+- An indexed max-heap per (window, metric) is updated in O(log n) per change, and
+  top-k is read from it in O(k log k) without popping.
+
+'move' is the % change from the last price before the window (or the first trade in it)
+to the latest price. Corrections (source_version > 1) are skipped, so the live view is
+approximate where they occur. The clock is the newest event_time plus wall time elapsed
+since it arrived, so windows keep expiring while the feed is idle, also during replays.
+Windows that are not tracked are served from 'trades_1m_agg' (see FALLBACK_QUERY).
+"""
+import heapq
+import json
+import os
+import threading
+import time
+
+# --- Configuration ---
+LEADERBOARD_BUCKET_SECONDS = int(os.environ.get("LEADERBOARD_BUCKET_SECONDS", 5))
+LEADERBOARD_WINDOWS = tuple(
+    int(w) for w in os.environ.get("LEADERBOARD_WINDOWS", "1,5,15,60").split(",") if w.strip()
+)
+# Consume the 'ticks' topic directly ('' = only /ingest/ticks feeds the leaderboards)
+LEADERBOARD_KAFKA_BROKER = os.environ.get("LEADERBOARD_KAFKA_BROKER", "")
+LEADERBOARD_KAFKA_TOPIC = "ticks"
+LEADERBOARD_KAFKA_GROUP = "api_leaderboard"
+
+# metric -> how it ranks (the heap key)
+METRICS = ("volume", "notional", "movers", "gainers", "losers")
+MAX_K = 100
+
+# ORDER BY per metric for the ClickHouse fallback; never formatted from user input
+FALLBACK_ORDER = {
+    "volume": "volume DESC",
+    "notional": "notional DESC",
+    "movers": "abs(change_pct) DESC",
+    "gainers": "change_pct DESC",
+    "losers": "change_pct ASC",
+}
+
+# The outer SELECT orders by the finished values, never by the state columns of the same name
+FALLBACK_QUERY = """
+SELECT *
+FROM (
+    SELECT
+        symbol,
+        sumMerge(trades_1m_agg.volume) AS volume,
+        sumMerge(trades_1m_agg.vwap_pv) AS notional,
+        argMaxMerge(trades_1m_agg.close) AS last_price,
+        (last_price - argMinMerge(trades_1m_agg.open)) / argMinMerge(trades_1m_agg.open) * 100 AS change_pct
+    FROM default.trades_1m_agg
+    WHERE minute >= toStartOfMinute(now('UTC') - toIntervalMinute({{window:UInt32}}))
+    GROUP BY symbol
+)
+ORDER BY {order}
+LIMIT {{k:UInt32}}
+"""
+
+
+class IndexedHeap:
+    """Max-heap of (key, item) with a position index, so any item's key can change in O(log n)."""
+
+    def __init__(self):
+        self._heap = []   # [key, item]
+        self._pos = {}    # item -> index in _heap
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._pos
+
+    def update(self, item, key: float):
+        index = self._pos.get(item)
+        if index is None:
+            self._heap.append([key, item])
+            self._pos[item] = len(self._heap) - 1
+            self._up(len(self._heap) - 1)
+            return
+        old = self._heap[index][0]
+        self._heap[index][0] = key
+        if key > old:
+            self._up(index)
+        elif key < old:
+            self._down(index)
+
+    def remove(self, item):
+        """Drops 'item' if present: the last entry takes its place and moves up or down."""
+        index = self._pos.pop(item, None)
+        if index is None:
+            return
+        last = self._heap.pop()
+        if index == len(self._heap):
+            return
+        old = self._heap[index][0]
+        self._heap[index] = last
+        self._pos[last[1]] = index
+        if last[0] > old:
+            self._up(index)
+        elif last[0] < old:
+            self._down(index)
+
+    def top(self, k: int) -> list:
+        """The k largest (item, key), best first; walks the heap with a frontier instead of popping."""
+        result, frontier = [], [(-self._heap[0][0], 0)] if self._heap else []
+        while frontier and len(result) < k:
+            negative_key, index = heapq.heappop(frontier)
+            result.append((self._heap[index][1], -negative_key))
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (-self._heap[child][0], child))
+        return result
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][1]] = i
+        self._pos[heap[j][1]] = j
+
+    def _up(self, index: int):
+        while index > 0:
+            parent = (index - 1) // 2
+            if self._heap[index][0] <= self._heap[parent][0]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _down(self, index: int):
+        size = len(self._heap)
+        while True:
+            largest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self._heap[child][0] > self._heap[largest][0]:
+                    largest = child
+            if largest == index:
+                return
+            self._swap(index, largest)
+            index = largest
+
+
+class _Window:
+    """Running per-symbol aggregates for one window length, plus one heap per metric."""
+
+    def __init__(self, minutes: int, bucket_seconds: int):
+        self.minutes = minutes
+        self.buckets = max(minutes * 60 // bucket_seconds, 1)
+        self.volume = {}
+        self.notional = {}
+        self.reference = {}   # symbol -> last price before the window
+        self.heaps = {metric: IndexedHeap() for metric in METRICS}
+
+    def change_pct(self, symbol: str, last_price: float, first_price: float) -> float:
+        reference = self.reference.get(symbol, first_price)
+        return (last_price - reference) / reference * 100 if reference else 0.0
+
+    def refresh(self, symbol: str, last_price: float, first_price: float):
+        change = self.change_pct(symbol, last_price, first_price)
+        heaps = self.heaps
+        heaps["volume"].update(symbol, self.volume.get(symbol, 0))
+        heaps["notional"].update(symbol, self.notional.get(symbol, 0.0))
+        heaps["movers"].update(symbol, abs(change))
+        heaps["gainers"].update(symbol, change)
+        heaps["losers"].update(symbol, -change)
+
+    def drop(self, symbol: str):
+        """The symbol has no trades left in the window."""
+        del self.volume[symbol]
+        del self.notional[symbol]
+        for heap in self.heaps.values():
+            heap.remove(symbol)
+
+
+class Leaderboard:
+    def __init__(self, windows=LEADERBOARD_WINDOWS, bucket_seconds: int = LEADERBOARD_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.windows = {minutes: _Window(minutes, bucket_seconds) for minutes in sorted(set(windows))}
+        # One more slot than the longest window, so an expiring bucket is still readable
+        self._capacity = max(w.buckets for w in self.windows.values()) + 1
+        self._ring = [None] * self._capacity   # slot -> (bucket, {symbol: [volume, notional, last]})
+        self._clock = None                     # newest bucket seen
+        self._last_event = None                # newest event_time (unix seconds)
+        self._last_arrival = None              # time.monotonic() when it arrived
+        self._last_price = {}
+        self._first_price = {}
+        self._lock = threading.Lock()
+        self.stats = {"trades": 0, "skipped": 0, "late": 0}
+
+    # --- Feed ---
+
+    def observe(self, symbol: str, event_time: float, price: float, size: int):
+        """One trade (event_time in unix seconds)."""
+        with self._lock:
+            bucket = int(event_time // self.bucket_seconds)
+            if self._clock is None:
+                self._clock = bucket
+            if event_time >= (self._last_event or 0):
+                self._last_event, self._last_arrival = event_time, time.monotonic()
+            if bucket > self._clock:
+                self._advance(bucket)
+            elif bucket <= self._clock - self._capacity + 1:
+                self.stats["late"] += 1
+                return
+
+            slot = bucket % self._capacity
+            entry = self._ring[slot]
+            if entry is None or entry[0] != bucket:
+                entry = self._ring[slot] = (bucket, {})
+            stats = entry[1].setdefault(symbol, [0, 0.0, price])
+            stats[0] += size
+            stats[1] += price * size
+            if bucket == self._clock:
+                stats[2] = price
+
+            first = self._first_price.setdefault(symbol, price)
+            if bucket == self._clock:
+                self._last_price[symbol] = price
+            last = self._last_price.setdefault(symbol, price)
+            for window in self.windows.values():
+                if bucket > self._clock - window.buckets:
+                    window.volume[symbol] = window.volume.get(symbol, 0) + size
+                    window.notional[symbol] = window.notional.get(symbol, 0.0) + price * size
+                    window.refresh(symbol, last, first)
+            self.stats["trades"] += 1
+
+    def observe_rows(self, rows):
+        """Validated ingest rows (ingest.TICK_COLUMNS order); only original trades count."""
+        for exchange, symbol, event_time, seq_id, event_type, price, size, side, source_version in rows:
+            if event_type != "trade" or source_version > 1:
+                self.stats["skipped"] += 1
+                continue
+            self.observe(symbol, event_time.timestamp(), price, size)
+
+    def _advance(self, bucket: int):
+        """Moves the clock to 'bucket', expiring what leaves each window."""
+        old = self._clock
+        self._clock = bucket
+        for window in self.windows.values():
+            # Buckets in (old - n, bucket - n] leave the window; only stored ones matter
+            first = max(old - window.buckets + 1, old - self._capacity + 1)
+            for expired in range(first, min(bucket - window.buckets, old) + 1):
+                entry = self._ring[expired % self._capacity]
+                if entry is None or entry[0] != expired:
+                    continue
+                for symbol, (volume, notional, last) in entry[1].items():
+                    window.reference[symbol] = last
+                    if symbol not in window.volume:
+                        continue  # dropped with an earlier bucket (its later trades had size 0)
+                    window.volume[symbol] -= volume
+                    if window.volume[symbol] <= 0:
+                        window.drop(symbol)
+                        continue
+                    window.notional[symbol] -= notional
+                    window.refresh(symbol, self._last_price[symbol], self._first_price[symbol])
+
+    # --- Queries ---
+
+    def tracks(self, minutes: int) -> bool:
+        return minutes in self.windows and self._clock is not None
+
+    def top(self, metric: str, minutes: int, k: int) -> list:
+        with self._lock:
+            # Keep expiring while the feed is idle
+            now = self._last_event + (time.monotonic() - self._last_arrival)
+            if int(now // self.bucket_seconds) > self._clock:
+                self._advance(int(now // self.bucket_seconds))
+
+            window = self.windows[minutes]
+            rows = []
+            for symbol, _ in window.heaps[metric].top(k):
+                last = self._last_price[symbol]
+                rows.append({
+                    "symbol": symbol,
+                    "volume": window.volume.get(symbol, 0),
+                    "notional": window.notional.get(symbol, 0.0),
+                    "last_price": last,
+                    "change_pct": window.change_pct(symbol, last, self._first_price[symbol]),
+                })
+            return rows
+
+    def status(self) -> dict:
+        return {
+            "windows_minutes": list(self.windows),
+            "bucket_seconds": self.bucket_seconds,
+            "symbols": len(self._last_price),
+            "clock": None if self._clock is None else self._clock * self.bucket_seconds,
+            **self.stats,
+        }
+
+
+def fallback_query(metric: str) -> str:
+    """Leaderboard over 'trades_1m_agg' for windows not tracked in memory (minute resolution)."""
+    return FALLBACK_QUERY.format(order=FALLBACK_ORDER[metric])
+
+
+def consume_kafka(leaderboard: Leaderboard, broker: str = LEADERBOARD_KAFKA_BROKER):
+    """Feeds the leaderboard from the 'ticks' topic; run in a daemon thread, reconnects on errors."""
+    from kafka import KafkaConsumer
+    from ingest import validate_tick
+
+    while True:
+        try:
+            consumer = KafkaConsumer(
+                LEADERBOARD_KAFKA_TOPIC,
+                bootstrap_servers=[broker],
+                group_id=LEADERBOARD_KAFKA_GROUP,
+                auto_offset_reset="latest",
+                value_deserializer=json.loads,
+            )
+            for message in consumer:
+                try:
+                    row = validate_tick(message.value)
+                except (ValueError, TypeError, OverflowError, OSError):
+                    leaderboard.stats["skipped"] += 1
+                    continue
+                leaderboard.observe_rows((row,))
+        except Exception as e:
+            leaderboard.stats["last_error"] = str(e)
+            time.sleep(5)
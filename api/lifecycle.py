@@ -0,0 +1,158 @@
+"""
+ClickHouse connection lifecycle for the API.
+
+The API used to connect at import time: if ClickHouse was down for a moment, the client
+stayed None and every endpoint answered 503 until a restart. Now startup never blocks:
+
+- A supervisor thread connects in the background, retrying with exponential backoff.
+  The client is handed to the app as soon as it works.
+- Afterwards it probes ClickHouse every SUPERVISOR_PROBE_SECONDS on its own connection.
+  Failed probes make the API not ready. clickhouse_driver reconnects by itself on the next
+  query, and after SUPERVISOR_RECONNECT_AFTER failed probes a fresh client replaces a plain
+  Client (a replica pool manages its own connections).
+- An optional warm-up callback runs after every (re)connect, before the API reports
+  ready, so a rolling restart does not send cold requests to a cold node. It returns
+  the items (symbols) that failed to warm up, which are reported with the state.
+
+Liveness (the process works) and readiness (connected and warmed up) are reported separately.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# --- Configuration ---
+SUPERVISOR_PROBE_SECONDS = float(os.environ.get("SUPERVISOR_PROBE_SECONDS", 5))
+# Consecutive failed probes before the client is rebuilt
+SUPERVISOR_RECONNECT_AFTER = int(os.environ.get("SUPERVISOR_RECONNECT_AFTER", 3))
+# Symbols whose recent bars and queries are preloaded before the API reports ready ('' = no warm-up)
+WARMUP_SYMBOLS = [s.strip() for s in os.environ.get("WARMUP_SYMBOLS", "").split(",") if s.strip()]
+WARMUP_MINUTES = int(os.environ.get("WARMUP_MINUTES", 240))
+BACKOFF_INITIAL_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ConnectionSupervisor:
+    def __init__(self, factory, on_connect, warm_up=None, shareable=lambda client: False,
+                 probe_seconds: float = SUPERVISOR_PROBE_SECONDS,
+                 reconnect_after: int = SUPERVISOR_RECONNECT_AFTER):
+        """
+        factory() -> client; on_connect(client) publishes it to the app; warm_up(client)
+        preloads caches and returns {item: error} for the parts that failed. shareable(client) says whether the client is safe to probe while
+        requests use it (otherwise the supervisor opens its own probe connection).
+        """
+        self._factory = factory
+        self._on_connect = on_connect
+        self._warm_up = warm_up
+        self._shareable = shareable
+        self.probe_seconds = probe_seconds
+        self.reconnect_after = reconnect_after
+
+        self._client = None
+        self._probe = None
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.state = {
+            "connected": False,
+            "warmed_up": warm_up is None,
+            "connect_attempts": 0,
+            "failed_probes": 0,
+            "connected_at": None,
+            "last_probe_at": None,
+            "last_probe_ms": None,
+            "last_error": None,
+            "warm_up_ms": None,
+            "warm_up_error": None,
+            "warm_up_failures": {},
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.state["connected"] and self.state["warmed_up"]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="clickhouse-supervisor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # --- Background loop ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._client is None:
+                self._connect()
+            else:
+                self._stop.wait(self.probe_seconds)
+                if not self._stop.is_set():
+                    self._check()
+
+    def _connect(self):
+        """Blocks (in the supervisor thread) until a client works or stop() is called."""
+        backoff = BACKOFF_INITIAL_SECONDS
+        while not self._stop.is_set():
+            self.state["connect_attempts"] += 1
+            try:
+                client = self._factory()
+                break
+            except Exception as e:
+                self.state["last_error"] = str(e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX_SECONDS)
+        else:
+            return
+
+        self._client, self._probe = client, None
+        self._on_connect(client)
+        self.state.update(connected=True, failed_probes=0, connected_at=_now(), last_error=None)
+        print(f"✅ ClickHouse connected after {self.state['connect_attempts']} attempt(s)")
+        self._run_warm_up(client)
+
+    def _run_warm_up(self, client):
+        if self._warm_up is None:
+            return
+        self.state["warmed_up"] = False
+        start = time.perf_counter()
+        # A failed warm-up costs latency, not correctness; serve anyway
+        try:
+            failures = self._warm_up(client) or {}
+            self.state.update(warm_up_error=None, warm_up_failures=failures)
+            if failures:
+                print(f"⚠️ Warm-up failed for {len(failures)} item(s): {', '.join(failures)}")
+        except Exception as e:
+            self.state.update(warm_up_error=str(e), warm_up_failures={})
+        self.state["warm_up_ms"] = (time.perf_counter() - start) * 1000
+        self.state["warmed_up"] = True
+
+    def _check(self):
+        start = time.perf_counter()
+        try:
+            if self._shareable(self._client):
+                probe = self._client
+            else:
+                if self._probe is None:
+                    self._probe = self._factory()
+                probe = self._probe
+            probe.execute("SELECT 1")
+        except Exception as e:
+            self._probe = None
+            self.state["failed_probes"] += 1
+            self.state.update(connected=False, last_error=str(e), last_probe_at=_now())
+            if self.state["failed_probes"] >= self.reconnect_after and not self._shareable(self._client):
+                # Rebuild from scratch; the old client keeps serving until the new one works.
+                # Shareable clients (replica pool, embedded backend) manage their own connections.
+                self._client = None
+            return
+
+        self.state.update(connected=True, failed_probes=0, last_probe_at=_now(),
+                          last_probe_ms=(time.perf_counter() - start) * 1000)
+
+    def status(self) -> dict:
+        return {"ready": self.ready, **self.state}
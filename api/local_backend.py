@@ -0,0 +1,304 @@
+"""
+In-process ClickHouse backend for offline development and CI (CLICKHOUSE_BACKEND=local).
+
+Runs the API's queries on chDB (embedded ClickHouse, `pip install chdb`), so no
+ClickHouse, Keeper or Kafka containers are needed. The SQL is the same as on the
+cluster, so FINAL, the ...Merge combinators and system.columns behave the same:
+
+- Tables come from sql_schema/, minus the cluster parts: ON CLUSTER is dropped,
+  Replicated*MergeTree becomes *MergeTree, 'ticks_all' becomes a Merge table over
+  'ticks_local', and tiered storage (storage_policy, TTL ... TO VOLUME) is removed.
+  The materialized views are kept, so the rollups and 'ticks_dedup' fill on insert.
+- On first start, a seeded synthetic generator writes ticks (about 1% corrections)
+  to Parquet and loads them into 'ticks_local'. The database persists in LOCAL_DB_PATH.
+
+LocalClient.execute() takes the same arguments as clickhouse_driver.Client.execute().
+Query parameters ({name:Type}) are bound client-side as typed literals. Settings
+(distributed/async insert tuning) have no local meaning and are ignored.
+"""
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# --- Configuration ---
+API_DIR = Path(__file__).resolve().parent
+SCHEMA_DIR = API_DIR.parent / "sql_schema"
+LOCAL_DB_PATH = os.environ.get("LOCAL_DB_PATH", str(API_DIR / "local_db"))
+LOCAL_PARQUET = os.environ.get("LOCAL_PARQUET", str(API_DIR / "local_data" / "ticks_synthetic.parquet"))
+LOCAL_ROWS = int(os.environ.get("LOCAL_ROWS", 1_000_000))
+LOCAL_DAYS = int(os.environ.get("LOCAL_DAYS", 3))
+LOCAL_SEED = int(os.environ.get("LOCAL_SEED", 42))
+
+# Kafka and Buffer plumbing has no local counterpart; inserts go straight to ticks_local
+SKIPPED_SCHEMA_FILES = ("02_ticks_kafka.sql", "03_kafka_to_buffer_mv.sql", "04_ticks_buffer.sql", "all.sql")
+# What a single-shard Distributed table would forward an INSERT to
+INSERT_TARGETS = {"default.ticks_all": "default.ticks_local"}
+
+SYMBOLS = ("AAPL", "GOOG", "MSFT", "TSLA")
+
+# Deterministic for a given seed. A correction reuses an earlier seq_id (and, because
+# exchange and symbol are derived from seq_id, its exchange and symbol) with a higher
+# source_version, like the producer. Each field hashes with its own salt, so symbols
+# trade on every exchange.
+SYNTHETIC_QUERY = """
+INSERT INTO FUNCTION file({path}, 'Parquet')
+SELECT
+    ['NASDAQ', 'NYSE'][1 + cityHash64(seq_id, {seed}, 'exchange') % 2] AS exchange,
+    {symbols}[1 + cityHash64(seq_id, {seed}, 'symbol') % {symbol_count}] AS symbol,
+    (toDateTime64({start}, 6, 'UTC') + toIntervalMicrosecond(number * {step_us})) AS event_time,
+    seq_id,
+    multiIf(h % 10 < 6, 'trade', h % 10 < 9, 'quote', 'book') AS event_type,
+    round(50 + 50 * (cityHash64(symbol) % 5) + 5 * sin(number / 20000) + (intDiv(h, 7) % 1000) / 500, 2) AS price,
+    toUInt32(1 + intDiv(h, 11) % 500) AS size,
+    ['buy', 'sell'][1 + intDiv(h, 13) % 2] AS side,
+    toUInt64(if(is_correction, 2 + intDiv(h, 17) % 50, 1)) AS source_version
+FROM (
+    SELECT
+        number,
+        cityHash64(number, {seed}) AS h,
+        (h % 100 = 0 AND number > 100) AS is_correction,
+        toUInt64(if(is_correction, number - 1 - intDiv(h, 100) % 100, number)) AS seq_id
+    FROM numbers({rows})
+)
+"""
+
+# Applied once per session
+SESSION_SETTINGS = {
+    # Native-protocol integers, not JSON strings
+    'output_format_json_quote_64bit_integers': 0,
+}
+
+PARAMETER = re.compile(r"\{(\w+):([^{}]+)\}")
+# Parameter types whose bare literal already has the right type (LIMIT needs a bare literal)
+BARE_TYPES = re.compile(r"^(U?Int\d+|Float\d+|String)$")
+
+
+# --- Schema ---
+
+def local_ddl(sql: str) -> list:
+    """CREATE statements of one sql_schema file, rewritten for a single embedded node."""
+    sql = re.sub(r"--[^\n]*", "", sql)
+    sql = sql.replace(" ON CLUSTER analytics_cluster", "")
+    sql = re.sub(r"Replicated(\w*MergeTree)\(\s*'[^']*'\s*,\s*'\{replica\}'\s*,?\s*", r"\1(", sql)
+    sql = re.sub(r"Distributed\(\s*\w+\s*,\s*'?(\w+)'?\s*,\s*'?(\w+)'?(?:\s*,\s*[\w()]+)?\s*\)",
+                 r"Merge('\1', '^\2$')", sql)
+    # A TTL without its TO VOLUME action would delete the rows instead of moving them
+    sql = re.sub(r"\bTTL\b[^;]*?TO VOLUME '\w+'", "", sql)
+    sql = re.sub(r",?\s*storage_policy\s*=\s*'\w+'", "", sql)
+    return [s.strip() for s in sql.split(";") if s.strip().upper().startswith("CREATE")]
+
+
+# --- Parameters and results ---
+
+def _literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return f"'{value:%Y-%m-%d %H:%M:%S.%f}'"
+    if isinstance(value, date):
+        return f"'{value:%Y-%m-%d}'"
+    if isinstance(value, (list, set, frozenset)):
+        return "[" + ", ".join(_literal(v) for v in value) + "]"
+    if isinstance(value, tuple):
+        return "(" + ", ".join(_literal(v) for v in value) + ("," if len(value) == 1 else "") + ")"
+    text = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{text}'"
+
+
+def bind(query: str, params: dict) -> str:
+    """Replaces {name:Type} placeholders with typed literals, like the server does."""
+    params = params or {}
+
+    def replace(match):
+        name, type_name = match.group(1), match.group(2).strip()
+        if name not in params:
+            raise ValueError(f"Missing query parameter: {name}")
+        literal = _literal(params[name])
+        return literal if BARE_TYPES.match(type_name) else f"CAST({literal} AS {type_name})"
+    return PARAMETER.sub(replace, query)
+
+
+def _split_types(args: str) -> list:
+    """'String, DateTime(\\'UTC\\')' -> ['String', "DateTime('UTC')"] (top-level commas only)."""
+    parts, depth, current = [], 0, ""
+    for char in args:
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += (char == "(") - (char == ")")
+        current += char
+    return parts + [current.strip()] if current.strip() else parts
+
+
+def _converter(type_name: str):
+    """JSON value -> the Python type clickhouse_driver returns for this column type."""
+    wrapper = re.fullmatch(r"(Nullable|LowCardinality|Array|Tuple)\((.*)\)", type_name)
+    if wrapper:
+        kind, inner = wrapper.groups()
+        if kind == "Tuple":
+            # Named elements ('price Float64') carry their name first
+            converters = [_converter(re.sub(r"^[a-z_]\w*\s+", "", t)) for t in _split_types(inner)]
+            return lambda v: tuple(c(x) for c, x in zip(converters, v))
+        convert = _converter(inner)
+        if kind == "Array":
+            return lambda v: [convert(x) for x in v]
+        return lambda v: None if v is None else convert(v)
+
+    if type_name.startswith("DateTime"):
+        zone = re.search(r"'([^']+)'", type_name)
+        tz = ZoneInfo(zone.group(1)) if zone else None
+
+        def convert(v):
+            parsed = datetime.fromisoformat(v)
+            return parsed.replace(tzinfo=tz) if tz else parsed
+        return convert
+    if type_name.startswith("Date"):
+        return date.fromisoformat
+    return lambda v: v
+
+
+class LocalClient:
+    """The slice of clickhouse_driver.Client the API uses, over one chDB session."""
+
+    # Calls are serialised internally, so threads can share one instance
+    shareable = True
+
+    def __init__(self, path: str = LOCAL_DB_PATH):
+        try:
+            from chdb import session
+        except ImportError as e:
+            raise ImportError("CLICKHOUSE_BACKEND=local needs chDB: pip install chdb") from e
+        self._session = session.Session(path)
+        # One embedded engine per process; chDB sessions are not safe to share across threads
+        self._lock = threading.Lock()
+        for name, value in SESSION_SETTINGS.items():
+            self._query(f"SET {name} = {_literal(value)}")
+
+    def _query(self, sql: str, fmt: str = "JSONCompact") -> str:
+        with self._lock:
+            result = self._session.query(sql, fmt)
+        if hasattr(result, "has_error") and result.has_error():
+            raise RuntimeError(result.error_message())
+        return result.bytes().decode() if hasattr(result, "bytes") else str(result)
+
+    def execute(self, query: str, params=None, with_column_types: bool = False,
+                columnar: bool = False, settings: dict = None, **kwargs):
+        if query.lstrip().upper().startswith("INSERT") and isinstance(params, (list, tuple)):
+            for source, target in INSERT_TARGETS.items():
+                query = query.replace(source, target)
+            if not params:
+                return []
+            self._query(f"{query} {', '.join(_literal(tuple(row)) for row in params)}")
+            return []
+
+        text = self._query(bind(query, params))
+        if not text.strip():
+            return ([], []) if with_column_types else []
+
+        payload = json.loads(text)
+        meta = payload.get("meta", [])
+        converters = [_converter(column["type"]) for column in meta]
+        rows = [tuple(c(v) for c, v in zip(converters, row)) for row in payload.get("data", [])]
+
+        data = [tuple(column) for column in zip(*rows)] if columnar else rows
+        if columnar and not rows:
+            data = [() for _ in meta]
+        if with_column_types:
+            return data, [(column["name"], column["type"]) for column in meta]
+        return data
+
+    def execute_iter(self, query: str, params=None, **kwargs):
+        yield from self.execute(query, params, **kwargs)
+
+    def disconnect(self):
+        pass
+
+
+# --- Setup ---
+
+def generate_parquet(path: str = LOCAL_PARQUET, rows: int = LOCAL_ROWS,
+                     days: int = LOCAL_DAYS, seed: int = LOCAL_SEED, client: LocalClient = None):
+    """Writes the synthetic tick set, ending at today's midnight (UTC), to Parquet."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).unlink(missing_ok=True)  # file() appends otherwise
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    step_us = max(days * 86_400_000_000 // max(rows, 1), 1)
+    client = client or LocalClient()
+    client.execute(SYNTHETIC_QUERY.format(
+        path=_literal(str(Path(path).resolve())),
+        symbols=_literal(list(SYMBOLS)),
+        symbol_count=len(SYMBOLS),
+        start=_literal(start.replace(tzinfo=None)),
+        step_us=step_us,
+        seed=seed,
+        rows=rows,
+    ))
+
+
+def create_schema(client: LocalClient):
+    for sql_file in sorted(SCHEMA_DIR.glob("*.sql")):
+        if sql_file.name in SKIPPED_SCHEMA_FILES:
+            continue
+        for statement in local_ddl(sql_file.read_text(encoding="utf-8")):
+            client.execute(statement)
+
+
+def load_parquet(client: LocalClient, path: str = LOCAL_PARQUET):
+    """
+    Inserts through 'ticks_local', so the materialized views fill the rollups.
+    On the cluster, originals and corrections arrive in different inserts; without
+    optimize_on_insert=0 one big block would collapse them in 'ticks_dedup' right away.
+    """
+    client.execute(
+        f"INSERT INTO default.ticks_local SELECT * FROM file({_literal(str(Path(path).resolve()))}, 'Parquet') "
+        "SETTINGS optimize_on_insert = 0"
+    )
+
+
+_local_client = None
+_setup_lock = threading.Lock()
+
+
+def get_local_client() -> LocalClient:
+    """The process-wide embedded client; creates the schema and loads data on first use."""
+    global _local_client
+    with _setup_lock:
+        if _local_client is None:
+            client = LocalClient()
+            create_schema(client)
+            (count,), = client.execute("SELECT count() FROM default.ticks_local")
+            if count == 0:
+                if not Path(LOCAL_PARQUET).exists():
+                    generate_parquet(client=client)
+                load_parquet(client)
+                (count,), = client.execute("SELECT count() FROM default.ticks_local")
+            print(f"✅ Local chDB backend at {LOCAL_DB_PATH} ({count:,} ticks)")
+            _local_client = client
+        return _local_client
+
+
+# --- Example Usage (writes the synthetic Parquet file for CI caches) ---
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate the synthetic tick Parquet file.")
+    parser.add_argument("--rows", type=int, default=LOCAL_ROWS)
+    parser.add_argument("--days", type=int, default=LOCAL_DAYS)
+    parser.add_argument("--seed", type=int, default=LOCAL_SEED)
+    parser.add_argument("--path", default=LOCAL_PARQUET)
+    args = parser.parse_args()
+
+    generate_parquet(args.path, args.rows, args.days, args.seed)
+    print(f"Wrote {args.rows:,} synthetic ticks to {args.path}")
@@ -1,6 +1,44 @@
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from clickhouse_client import get_clickhouse_client
+from clickhouse_client import get_clickhouse_client, is_shareable, single_node
+from asof_join import (
+    ASOF_JOIN_QUERY, TRADES_WINDOW_QUERY, QUOTES_WINDOW_QUERY,
+    QuoteWindowCache, split_quotes, align_trades, aligned_rows, tca_summary,
+)
+from archive import tick_source
+from codec_advisor import MAX_SAMPLE_ROWS as CODEC_MAX_SAMPLE_ROWS, advise as advise_codecs
+from approx import ACCURACY_MODES, build_query as build_approx_query, summarise as summarise_approx
+from bar_store import BarStore
+from downsample import DOWNSAMPLE_MODES, bucket_minutes, build_bucketed_query, ohlc_buckets, line_indices
+import numpy as np
+from ingest import (
+    INGEST_MODE, INGEST_MODES, INGEST_MAX_BATCH, INGEST_ACK_TIMEOUT_SECONDS, ACK_LEVELS,
+    IngestBuffer, BufferFull, validate_batch, insert_async,
+)
+from starlette.concurrency import run_in_threadpool
+from singleflight import SingleFlight, normalise_key
+from lifecycle import ConnectionSupervisor, WARMUP_MINUTES, WARMUP_SYMBOLS
+from leaderboard import (
+    Leaderboard, METRICS as LEADERBOARD_METRICS, MAX_K as LEADERBOARD_MAX_K,
+    LEADERBOARD_KAFKA_BROKER, consume_kafka,
+)
+from sequence_quality import (
+    MAX_MINUTES as SEQUENCE_MAX_MINUTES, NUMBERINGS as SEQ_ID_NUMBERINGS, SEQ_ID_NUMBERING,
+    summarise as summarise_sequence, symbol_gaps,
+)
+from volume_profile import (
+    DEFAULT_BANDS, parse_bands, bucket_cents, summarise as summarise_profile, band_series,
+)
+from correlation import (
+    MAX_SYMBOLS as CORRELATION_MAX_SYMBOLS, MAX_ROLLING_WINDOWS, STATS as CORRELATION_STATS,
+    ResultCache, price_matrix, log_returns, compute as compute_correlation,
+    rolling_window_count, is_final,
+)
+from query_registry import QueryTemplate
+from query_templates import QUERIES
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 import time
 
 # Create the FastAPI app instance
@@ -11,15 +49,21 @@ app = FastAPI(
 
 # --- Database Connection ---
 
-# We instantiate one client when the app starts.
-# For a production app, you might use a more complex connection pool.
-try:
-    client = get_clickhouse_client()
-except Exception as e:
-    print(f"FATAL: Could not connect to ClickHouse on startup. {e}")
-    # In a real app, you might not want to exit, but for this demo,
-    # if the DB isn't up, the API is useless.
-    client = None 
+# Set by the connection supervisor once ClickHouse answers (see lifecycle.py and
+# section 11). Until then the endpoints answer 503 and /health/ready says why.
+client = None
+
+def _set_client(new_client):
+    global client
+    client = new_client
+
+# Identical concurrent read queries share one execution (see singleflight.py)
+query_flights = SingleFlight()
+
+def execute_coalesced(query: str, params: dict = None, **kwargs):
+    """client.execute() for read-only queries; callers must not mutate the result."""
+    key = normalise_key(query, params, **kwargs)
+    return query_flights.do(key, lambda: client.execute(query, params, **kwargs))
 
 # --- API Endpoints ---
 
@@ -33,41 +77,32 @@ def read_root():
 # ---
 
 @app.get("/backtest/slow")
-def run_backtest_slow(symbol: str = "AAPL", limit: int = 100):
+def run_backtest_slow(symbol: str = "AAPL", limit: int = 100,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None):
     """
     Runs the "SLOW" backtest query.
     This query calculates 1-minute OHLCV/VWAP by scanning
     the raw 'ticks_all' table.
+
+    With 'start' (and optionally 'end') only that range is scanned. Partitions that
+    were archived to Parquet and dropped are read back transparently.
     """
     if client is None:
         raise HTTPException(status_code=503, detail="Database connection not available.")
 
-    # This is the "slow" query. It must scan raw data and group it.
-    query = """
-    SELECT
-        toStartOfMinute(event_time) AS minute,
-        symbol,
-        argMin(price, event_time) AS open,
-        max(price) AS high,
-        min(price) AS low,
-        argMax(price, event_time) AS close,
-        sum(size) AS volume,
-        sum(price * size) / sum(size) AS vwap
-    FROM 
-        default.ticks_all
-    WHERE 
-        symbol = {symbol:String}
-        AND event_type = 'trade'
-    GROUP BY 
-        symbol, minute
-    ORDER BY 
-        minute DESC
-    LIMIT {limit:UInt32}
-    """
+    params = {'symbol': symbol, 'limit': limit}
     
     try:
         start_time = time.perf_counter()
-        result = client.execute(query, {'symbol': symbol, 'limit': limit}, with_column_types=True)
+
+        if start is not None:
+            params['start'] = _as_utc(start)
+            params['end'] = _as_utc(end) if end else datetime.now(timezone.utc)
+            query = build_ranged_slow_query(tick_source(client, params['start'], params['end']))
+            result = execute_coalesced(query, params, with_column_types=True)
+        else:
+            # This is the "slow" query. It must scan raw data and group it.
+            result = QUERIES.execute(execute_coalesced, "ohlcv_1m_raw", params, with_column_types=True)
         end_time = time.perf_counter()
         
         # Process results into a nice JSON
@@ -83,56 +118,176 @@ def run_backtest_slow(symbol: str = "AAPL", limit: int = 100):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_ranged_slow_query(source: str) -> str:
+    """The slow query restricted to [start, end), reading from 'source' (see archive.tick_source)."""
+    return f"""
+    SELECT
+        toStartOfMinute(event_time) AS minute,
+        symbol,
+        argMin(price, event_time) AS open,
+        max(price) AS high,
+        min(price) AS low,
+        argMax(price, event_time) AS close,
+        sum(size) AS volume,
+        sum(price * size) / sum(size) AS vwap
+    FROM
+        {source}
+    WHERE
+        symbol = {{symbol:String}}
+        AND event_type = 'trade'
+        AND event_time >= {{start:DateTime64(6, 'UTC')}}
+        AND event_time < {{end:DateTime64(6, 'UTC')}}
+    GROUP BY
+        symbol, minute
+    ORDER BY
+        minute DESC
+    LIMIT {{limit:UInt32}}
+    """
+
 @app.get("/backtest/fast")
-def run_backtest_fast(symbol: str = "AAPL", limit: int = 100):
+def run_backtest_fast(symbol: str = "AAPL", limit: int = 100,
+                      exchange: str = "", side: str = "", group_by: str = "",
+                      format: str = "rows", max_points: Optional[int] = None, downsample: str = "ohlc"):
     """
     Runs the "FAST" backtest query.
     This query reads from the pre-aggregated 'trades_1m_agg' table.
+
+    'exchange' / 'side' filter and 'group_by' (comma list of 'exchange', 'side')
+    switch to the 'trades_1m_venue_agg' rollup, which keeps those dimensions.
+    format='columnar' returns {"columns": {name: [values]}} instead of row dicts.
+    'max_points' caps the points returned for the 'limit' minutes (see downsample.py).
     """
     if client is None:
         raise HTTPException(status_code=503, detail="Database connection not available.")
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {RESPONSE_FORMATS}")
 
-    # This is the "fast" query. It reads pre-calculated states.
-    query = """
-    SELECT
-        minute,
-        symbol,
-        -- Use '...Merge' functions to finalize the aggregate states
-        argMinMerge(open) AS open,
-        maxMerge(high) AS high,
-        minMerge(low) AS low,
-        argMaxMerge(close) AS close,
-        sumMerge(volume) AS volume,
-        sumMerge(vwap_pv) / sumMerge(volume) AS vwap
-    FROM 
-        default.trades_1m_agg
-    WHERE 
-        symbol = {symbol:String}
-    GROUP BY 
-        symbol, minute
-    ORDER BY 
-        minute DESC
-    LIMIT {limit:UInt32}
-    """
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    if any(d not in VENUE_DIMENSIONS for d in dimensions):
+        raise HTTPException(status_code=400, detail=f"group_by must be a subset of {VENUE_DIMENSIONS}")
+    if side not in ("", "buy", "sell"):
+        raise HTTPException(status_code=400, detail="side must be 'buy' or 'sell'")
+    _check_downsample(max_points, downsample)
+    if max_points and dimensions:
+        raise HTTPException(status_code=400, detail="max_points cannot be combined with group_by")
+
+    # This is the "fast" query. It reads pre-calculated states (see query_templates.py).
+    query = QUERIES.get("ohlcv_1m_rollup")
+    params = {'symbol': symbol, 'limit': limit}
+
+    # Venue/side questions read the split rollup instead
+    if exchange or side or dimensions:
+        query = build_venue_backtest_query(exchange, side, dimensions)
+        params.update({'exchange': exchange, 'side': side})
+
+    # Candles: merge the minute states into coarser buckets inside ClickHouse
+    downsampling = bool(max_points) and limit > max_points
+    bucket = 1
+    if downsampling and downsample == "ohlc":
+        bucket = bucket_minutes(limit, max_points)
+        table = "trades_1m_venue_agg" if exchange or side else "trades_1m_agg"
+        query = build_bucketed_query(table, _venue_filters(exchange, side))
+        params['bucket'] = bucket
     
     try:
         start_time = time.perf_counter()
-        result = client.execute(query, {'symbol': symbol, 'limit': limit}, with_column_types=True)
-        end_time = time.perf_counter()
+        if isinstance(query, QueryTemplate):
+            result = QUERIES.execute(execute_coalesced, query, params, with_column_types=True, columnar=True)
+        else:
+            result = execute_coalesced(query, params, with_column_types=True, columnar=True)
         
-        # Process results into a nice JSON
         columns = [col[0] for col in result[1]]
-        data = [dict(zip(columns, row)) for row in result[0]]
-        
-        return {
-            "query_type": "fast",
-            "query_time_ms": (end_time - start_time) * 1000,
-            "rows_returned": len(data),
-            "data": data
-        }
+        values = result[0] or [() for _ in columns]
+
+        # Lines: keep a subset of the 1-minute bars (rows are newest first)
+        if downsampling and downsample != "ohlc" and len(values[0]) > max_points:
+            minutes = values[columns.index("minute")][::-1]
+            closes = values[columns.index("close")][::-1]
+            keep = line_indices(downsample, np.array([m.timestamp() for m in minutes]),
+                                np.array(closes, dtype=np.float64), max_points)
+            keep = [len(minutes) - 1 - i for i in keep[::-1]]
+            values = [[column[i] for i in keep] for column in values]
+        end_time = time.perf_counter()
+
+        if format == "columnar":
+            response = _columnar_response("fast", end_time - start_time, columns, values)
+        else:
+            # Process results into a nice JSON
+            data = [dict(zip(columns, row)) for row in zip(*values)]
+            response = {
+                "query_type": "fast",
+                "query_time_ms": (end_time - start_time) * 1000,
+                "rows_returned": len(data),
+                "data": data
+            }
+        if max_points:
+            response.update({"downsample": downsample, "bucket_minutes": bucket})
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Dimensions kept by 'trades_1m_venue_agg' on top of (symbol, minute)
+VENUE_DIMENSIONS = ("exchange", "side")
+
+# 'columnar' skips the per-row dicts; clients build DataFrames straight from the lists
+RESPONSE_FORMATS = ("rows", "columnar")
+
+def _columnar_response(query_type: str, elapsed: float, names: list, columns) -> dict:
+    columns = [list(values) for values in columns] if columns else [[] for _ in names]
+    return {
+        "query_type": query_type,
+        "query_time_ms": elapsed * 1000,
+        "rows_returned": len(columns[0]) if columns else 0,
+        "columns": dict(zip(names, columns))
+    }
+
+def _venue_filters(exchange: str, side: str) -> list:
+    """WHERE conditions for the trade rollups; only added when set, values stay parameters."""
+    filters = ["symbol = {symbol:String}"]
+    if exchange:
+        filters.append("exchange = {exchange:String}")
+    if side:
+        filters.append("side = {side:String}")
+    return filters
+
+def _check_downsample(max_points: Optional[int], downsample: str):
+    if downsample not in DOWNSAMPLE_MODES:
+        raise HTTPException(status_code=400, detail=f"downsample must be one of {DOWNSAMPLE_MODES}")
+    if max_points is not None and max_points < 2:
+        raise HTTPException(status_code=400, detail="max_points must be at least 2")
+
+def build_venue_backtest_query(exchange: str, side: str, dimensions: list) -> str:
+    """
+    Builds the OHLCV query over 'trades_1m_venue_agg'.
+    Filters are only added when set, and dimensions come from VENUE_DIMENSIONS,
+    so no user text is formatted into the SQL.
+    """
+    filters = _venue_filters(exchange, side)
+
+    extra = "".join(f", {d}" for d in dimensions)
+
+    # Columns are table-qualified so 'sumMerge(volume)' never resolves to the 'volume' alias
+    return f"""
+    SELECT
+        minute,
+        symbol{extra},
+        argMinMerge(trades_1m_venue_agg.open) AS open,
+        maxMerge(trades_1m_venue_agg.high) AS high,
+        minMerge(trades_1m_venue_agg.low) AS low,
+        argMaxMerge(trades_1m_venue_agg.close) AS close,
+        sumMerge(trades_1m_venue_agg.volume) AS volume,
+        sumMerge(trades_1m_venue_agg.vwap_pv) / sumMerge(trades_1m_venue_agg.volume) AS vwap
+    FROM
+        default.trades_1m_venue_agg
+    WHERE
+        {" AND ".join(filters)}
+    GROUP BY
+        symbol, minute{extra}
+    ORDER BY
+        minute DESC{extra}
+    LIMIT {{limit:UInt32}}
+    """
+
 # ---
 # 2. THE DEDUPLICATION BENCHMARK ENDPOINTS
 # ---
@@ -145,11 +300,9 @@ def get_dedup_raw_count(symbol: str = "AAPL"):
     if client is None:
         raise HTTPException(status_code=503, detail="Database connection not available.")
     
-    query = "SELECT count() FROM default.ticks_dedup WHERE symbol = {symbol:String}"
-    
     try:
         start_time = time.perf_counter()
-        (count,) = client.execute(query, {'symbol': symbol})[0]
+        (count,) = QUERIES.execute(execute_coalesced, "tick_count_dedup", {'symbol': symbol})[0]
         end_time = time.perf_counter()
         
         return {
@@ -171,11 +324,9 @@ def get_dedup_final_count(symbol: str = "AAPL"):
     
     # The FINAL keyword forces ClickHouse to perform the merge
     # logic on the fly, giving us the accurate, deduplicated count.
-    query = "SELECT count() FROM default.ticks_dedup FINAL WHERE symbol = {symbol:String}"
-    
     try:
         start_time = time.perf_counter()
-        (count,) = client.execute(query, {'symbol': symbol})[0]
+        (count,) = QUERIES.execute(execute_coalesced, "tick_count_final", {'symbol': symbol})[0]
         end_time = time.perf_counter()
         
         return {
@@ -251,7 +402,7 @@ def get_compression_stats():
         ORDER BY table, data_compressed_bytes DESC
         """
         
-        result = client.execute(query, with_column_types=True)
+        result = execute_coalesced(query, with_column_types=True)
         columns = [col[0] for col in result[1]]
         data = [dict(zip(columns, row)) for row in result[0]]
         
@@ -263,6 +414,55 @@ def get_compression_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats/coalescing")
+def get_coalescing_stats(top: int = 50):
+    """
+    Single-flight counters: 'executions' queries actually sent to ClickHouse,
+    'merged' requests that attached to one already in flight, per normalised query.
+    """
+    return query_flights.metrics(top)
+
+@app.get("/stats/replicas")
+def get_replica_stats():
+    """
+    Per-replica health, replication delay, in-flight queries and hedge wins/losses
+    when CLICKHOUSE_REPLICAS is set; a single direct connection otherwise.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if not hasattr(client, "status"):
+        return {"mode": "single", "replicas": []}
+    return {"mode": "pool", "hedges": client.hedges, "replicas": client.status()}
+
+@app.get("/stats/compression/advisor")
+def get_codec_advice(table: str = "ticks_dedup", columns: str = "", sample_rows: int = 1000000):
+    """
+    Trial-encodes a sample of each column with candidate codecs (Delta, DoubleDelta,
+    Gorilla, T64, ZSTD levels, LowCardinality) in scratch tables, measures compressed
+    size and decode time, and returns ALTER statements for the worthwhile changes.
+    Nothing is altered; the statements are for review.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if not 1 <= sample_rows <= CODEC_MAX_SAMPLE_ROWS:
+        raise HTTPException(status_code=400, detail=f"sample_rows must be between 1 and {CODEC_MAX_SAMPLE_ROWS}")
+
+    try:
+        start_time = time.perf_counter()
+        # Scratch tables are local to one node, so the whole run stays on one connection
+        with single_node(client) as node:
+            report = advise_codecs(node, table, [c.strip() for c in columns.split(",") if c.strip()], sample_rows)
+        end_time = time.perf_counter()
+
+        return {
+            "query_time_ms": (end_time - start_time) * 1000,
+            **report
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ---
 # 5. (STRETCH GOAL) HOT PATH ENDPOINT
 # ---
@@ -273,6 +473,790 @@ def get_book_depth(symbol: str = "AAPL"):
     return {"status": "hot-path-not-implemented", "symbol": symbol}
 
 
+# ---
+# 6. TCA: ALIGN TRADES WITH THE PREVAILING QUOTE (AS-OF JOIN)
+# ---
+
+# Sorted bid/ask arrays for closed windows, reused by the client-side fallback.
+quote_cache = QuoteWindowCache()
+
+@app.get("/tca/asof")
+def get_trades_with_quotes(
+    symbol: str = "AAPL",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    minutes: int = 60,
+    max_staleness_seconds: int = 300,
+    limit: int = 100000,
+    mode: str = "server",
+):
+    """
+    Aligns every trade in [start, end) with the prevailing bid and ask: the last quote
+    at or before the trade and at most 'max_staleness_seconds' older (else null).
+    mode='server' runs an ASOF JOIN in ClickHouse.
+    mode='client' fetches the window once and aligns it with NumPy searchsorted,
+    caching the quote arrays of closed windows for repeated requests.
+    Both modes return the same fields (see asof_join.ASOF_COLUMNS).
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if mode not in ("server", "client"):
+        raise HTTPException(status_code=400, detail="mode must be 'server' or 'client'")
+    if max_staleness_seconds < 0:
+        raise HTTPException(status_code=400, detail="max_staleness_seconds must not be negative")
+
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(minutes=minutes)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    params = {
+        'symbol': symbol,
+        'start': start,
+        'end': end,
+        'quote_start': start - timedelta(seconds=max_staleness_seconds),
+        'max_staleness_us': max_staleness_seconds * 1_000_000,
+        'limit': limit,
+    }
+
+    try:
+        start_time = time.perf_counter()
+
+        if mode == "server":
+            result = execute_coalesced(ASOF_JOIN_QUERY, params, with_column_types=True)
+            columns = [col[0] for col in result[1]]
+            data = [dict(zip(columns, row)) for row in result[0]]
+            # Unmatched quotes come back as NULL; NumPy turns them into NaN
+            summary = tca_summary(
+                [row['price'] for row in data],
+                [row['side'] == 'buy' for row in data],
+                [row['mid'] for row in data],
+                [row['spread'] for row in data],
+            )
+        else:
+            trade_cols = client.execute(TRADES_WINDOW_QUERY, params, columnar=True) or [[], [], [], []]
+            trade_ts, price, size, is_buy = trade_cols
+
+            cache_key = (symbol, params['quote_start'], end)
+            quotes = quote_cache.get(cache_key)
+            if quotes is None:
+                quote_cols = client.execute(QUOTES_WINDOW_QUERY, params, columnar=True) or [[], [], []]
+                quotes = split_quotes(*quote_cols)
+                if end < datetime.now(timezone.utc):
+                    quote_cache.put(cache_key, quotes)
+
+            aligned = align_trades(trade_ts, quotes, params['max_staleness_us'])
+            summary = tca_summary(price, is_buy, aligned['mid'], aligned['spread'])
+            data = aligned_rows(trade_ts, price, size, is_buy, aligned)
+
+        end_time = time.perf_counter()
+
+        return {
+            "query_type": f"asof_{mode}",
+            "query_time_ms": (end_time - start_time) * 1000,
+            "rows_returned": len(data),
+            "summary": summary,
+            "data": data
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _as_utc(value: datetime) -> datetime:
+    """Query-string datetimes without an offset are treated as UTC, like the tables."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+# ---
+# 7. QUOTE / SPREAD ROLLUP ENDPOINT
+# ---
+
+@app.get("/quotes/fast")
+def get_quotes_fast(symbol: str = "AAPL", exchange: str = "", limit: int = 100):
+    """
+    Per-minute quote activity from the pre-aggregated 'quotes_1m_agg' table.
+    Pass 'exchange' to restrict to one venue; otherwise one row per exchange and minute.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+
+    # The inner query finalizes the states under new names, so the outer
+    # expressions never feed a '...Merge' result into another aggregate.
+    query = """
+    SELECT
+        minute,
+        symbol,
+        exchange,
+        quote_count,
+        if(isFinite(mid_raw), mid_raw, NULL) AS twap_mid,
+        low,
+        high,
+        if(bids > 0, bid_raw, NULL) AS last_bid,
+        if(asks > 0, ask_raw, NULL) AS last_ask,
+        last_ask - last_bid AS last_spread,
+        bids AS bid_count,
+        asks AS ask_count,
+        (toInt64(bid_sz) - toInt64(ask_sz)) / (bid_sz + ask_sz) AS imbalance
+    FROM
+    (
+        SELECT
+            minute,
+            symbol,
+            exchange,
+            sumMerge(quotes_1m_agg.quote_count) AS quote_count,
+            avgIfMerge(quotes_1m_agg.twap_mid) AS mid_raw,
+            minMerge(quotes_1m_agg.low) AS low,
+            maxMerge(quotes_1m_agg.high) AS high,
+            argMaxMerge(quotes_1m_agg.last_bid) AS bid_raw,
+            argMaxMerge(quotes_1m_agg.last_ask) AS ask_raw,
+            sumMerge(quotes_1m_agg.bid_count) AS bids,
+            sumMerge(quotes_1m_agg.ask_count) AS asks,
+            sumMerge(quotes_1m_agg.bid_size) AS bid_sz,
+            sumMerge(quotes_1m_agg.ask_size) AS ask_sz
+        FROM
+            default.quotes_1m_agg
+        WHERE
+            symbol = {symbol:String}
+            AND ({exchange:String} = '' OR exchange = {exchange:String})
+        GROUP BY
+            symbol, minute, exchange
+    )
+    ORDER BY
+        minute DESC, exchange
+    LIMIT {limit:UInt32}
+    """
+
+    try:
+        start_time = time.perf_counter()
+        result = execute_coalesced(query, {'symbol': symbol, 'exchange': exchange, 'limit': limit}, with_column_types=True)
+        end_time = time.perf_counter()
+
+        columns = [col[0] for col in result[1]]
+        data = [dict(zip(columns, row)) for row in result[0]]
+
+        return {
+            "query_type": "quotes_fast",
+            "query_time_ms": (end_time - start_time) * 1000,
+            "rows_returned": len(data),
+            "data": data
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---
+# 8. APPROXIMATE ANALYTICS ENDPOINT
+# ---
+
+@app.get("/stats/distribution")
+def get_distribution(
+    symbol: str = "AAPL",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    accuracy: str = "sketch",
+    sample_rate: float = 0.1,
+):
+    """
+    Distinct seq_ids, trade count/volume and price/size quantiles for a symbol.
+    accuracy='exact' scans raw ticks, 'sampled' reads 'ticks_all SAMPLE <sample_rate>',
+    'sketch' merges the uniq/t-digest states in 'ticks_sketch_1m_all'.
+    'start' and 'end' are rounded down to whole minutes in every mode.
+    Estimates come back with 95% error bounds.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if accuracy not in ACCURACY_MODES:
+        raise HTTPException(status_code=400, detail=f"accuracy must be one of {ACCURACY_MODES}")
+    if not 0 < sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be in (0, 1]")
+
+    start = _as_utc(start) if start else None
+    end = _as_utc(end) if end else None
+    query = build_approx_query(accuracy, start, end, sample_rate)
+
+    try:
+        start_time = time.perf_counter()
+        result = execute_coalesced(query, {'symbol': symbol, 'start': start, 'end': end}, with_column_types=True)
+        end_time = time.perf_counter()
+
+        columns = [col[0] for col in result[1]]
+        row = dict(zip(columns, result[0][0]))
+        rate = sample_rate if accuracy == "sampled" else 1.0
+
+        return {
+            "query_type": f"distribution_{accuracy}",
+            "query_time_ms": (end_time - start_time) * 1000,
+            "symbol": symbol,
+            "accuracy": accuracy,
+            "sample_rate": rate,
+            **summarise_approx(accuracy, row, rate)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---
+# 9. CACHED BAR STORE ENDPOINT
+# ---
+
+# Finalised bars persisted on the API host (see bar_store.py)
+bar_store = BarStore()
+
+@app.get("/bars/cached")
+def get_cached_bars(symbol: str = "AAPL", limit: int = 100,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    format: str = "rows", max_points: Optional[int] = None, downsample: str = "ohlc"):
+    """
+    Same OHLCV/VWAP bars as /backtest/fast, served from the local memory-mapped
+    bar store. Only minutes newer than the store's watermark hit ClickHouse.
+    The requested minutes are copied out of the maps rather than served as views,
+    because rewritten days (repair_rollups.py, apply_corrections.py) are updated in place.
+    Without 'start' the last 'limit' minutes up to 'end' (default now) are returned.
+    format='columnar' returns the columns as lists, with 'minute' in unix seconds.
+
+    With 'max_points' the bucket size is derived from 'limit' alone, so a client that
+    refreshes with 'start' set to its last bucket gets the same buckets back.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {RESPONSE_FORMATS}")
+    _check_downsample(max_points, downsample)
+    if not symbol.isalnum():
+        raise HTTPException(status_code=400, detail="symbol must be alphanumeric")
+
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(minutes=limit)
+
+    try:
+        start_time = time.perf_counter()
+        bars = bar_store.bars(client, symbol, int(start.timestamp()), int(end.timestamp()))
+
+        bucket, rows = 1, limit
+        if max_points and limit > max_points:
+            if downsample == "ohlc":
+                bucket = bucket_minutes(limit, max_points)
+                bars, rows = ohlc_buckets(bars, bucket), -(-limit // bucket)
+            elif len(bars) > max_points:
+                bars = bars[line_indices(downsample, bars["minute"], bars["close"], max_points)]
+        end_time = time.perf_counter()
+
+        # Newest first, like /backtest/fast
+        bars = bars[::-1][:rows]
+        if format == "columnar":
+            names = list(bars.dtype.names)
+            response = _columnar_response("cached", end_time - start_time, names,
+                                          [bars[name].tolist() for name in names])
+            response["watermark"] = bar_store.watermarks(symbol)[1]
+        else:
+            data = [
+                {
+                    "minute": datetime.fromtimestamp(int(bar["minute"]), timezone.utc),
+                    "symbol": symbol,
+                    "open": float(bar["open"]),
+                    "high": float(bar["high"]),
+                    "low": float(bar["low"]),
+                    "close": float(bar["close"]),
+                    "volume": int(bar["volume"]),
+                    "vwap": float(bar["vwap"]),
+                }
+                for bar in bars
+            ]
+            response = {
+                "query_type": "cached",
+                "query_time_ms": (end_time - start_time) * 1000,
+                "rows_returned": len(data),
+                "watermark": datetime.fromtimestamp(bar_store.watermarks(symbol)[1], timezone.utc),
+                "data": data
+            }
+        if max_points:
+            response.update({"downsample": downsample, "bucket_minutes": bucket})
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---
+# 10. TICK INGEST ENDPOINT
+# ---
+
+def _ingest_client():
+    # A replica pool or the embedded backend is thread-safe; a plain Client is not shared
+    if client is not None and is_shareable(client):
+        return client
+    return get_clickhouse_client()
+
+# Coalesces small batches into large inserts (see ingest.py); has its own connection
+ingest_buffer = IngestBuffer(_ingest_client)
+
+# Mode 'async' inserts from threadpool workers: one connection per worker thread
+_async_ingest = threading.local()
+
+def _insert_async(rows: list, wait: bool):
+    ingest_client = getattr(_async_ingest, "client", None)
+    if ingest_client is None:
+        ingest_client = _async_ingest.client = _ingest_client()
+    try:
+        insert_async(ingest_client, rows, wait)
+    except Exception:
+        _async_ingest.client = None   # reconnect on the next batch
+        raise
+
+@app.post("/ingest/ticks")
+async def ingest_ticks(request: Request, ack: str = "buffered"):
+    """
+    Accepts {"ticks": [...]} with the ticks_local columns. Invalid ticks are reported
+    by index and nothing from the batch is queued. ack='committed' answers only once
+    the rows are in ClickHouse.
+    """
+    if ack not in ACK_LEVELS:
+        raise HTTPException(status_code=400, detail=f"ack must be one of {ACK_LEVELS}")
+    if INGEST_MODE not in INGEST_MODES:
+        raise HTTPException(status_code=500, detail=f"INGEST_MODE must be one of {INGEST_MODES}")
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    ticks = body.get("ticks") if isinstance(body, dict) else None
+    if not isinstance(ticks, list) or not ticks:
+        raise HTTPException(status_code=400, detail="'ticks' must be a non-empty list")
+    if len(ticks) > INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {INGEST_MAX_BATCH} ticks per request")
+
+    rows, errors = validate_batch(ticks)
+    if errors:
+        raise HTTPException(status_code=422, detail={"rejected": len(errors), "errors": errors[:100]})
+
+    start_time = time.perf_counter()
+    if INGEST_MODE == "async":
+        if client is None:
+            raise HTTPException(status_code=503, detail="Database connection not available.")
+        try:
+            await run_in_threadpool(_insert_async, rows, ack == "committed")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    else:
+        try:
+            seq = ingest_buffer.submit(rows)
+        except BufferFull as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        if ack == "committed":
+            committed = await run_in_threadpool(ingest_buffer.wait_committed, seq, INGEST_ACK_TIMEOUT_SECONDS)
+            if not committed:
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"Rows are buffered but not committed yet: {ingest_buffer.stats['last_error']}"
+                )
+
+    # Accepted ticks also feed the live leaderboards (section 12)
+    leaderboard.observe_rows(rows)
+
+    return {
+        "accepted": len(rows),
+        "mode": INGEST_MODE,
+        "ack": ack,
+        "ack_time_ms": (time.perf_counter() - start_time) * 1000,
+    }
+
+@app.get("/ingest/stats")
+def get_ingest_stats():
+    """Buffer depth and flush counters; rows_flushed / flushes is the average block size."""
+    stats = dict(ingest_buffer.stats)
+    return {
+        "mode": INGEST_MODE,
+        "buffered_rows": ingest_buffer.depth(),
+        "capacity": ingest_buffer.capacity,
+        "avg_rows_per_flush": stats["rows_flushed"] / stats["flushes"] if stats["flushes"] else None,
+        **stats
+    }
+
+@app.on_event("shutdown")
+def flush_ingest_buffer():
+    """Writes whatever is still buffered before the process exits."""
+    ingest_buffer.close()
+
+# ---
+# 11. LIFECYCLE: HEALTH AND WARM-UP
+# ---
+
+def warm_up(new_client):
+    """
+    Runs the representative queries for WARMUP_SYMBOLS before the API reports ready:
+    syncs their recent bars into the bar store, and reads the rollups and recent raw
+    ticks so ClickHouse has the marks and blocks cached. A failing symbol does not stop
+    the others; returns {symbol: error} for the ones that failed.
+    """
+    end = datetime.now(timezone.utc)
+    failures = {}
+    for symbol in WARMUP_SYMBOLS:
+        try:
+            bar_store.sync(new_client, symbol)
+            run_backtest_fast(symbol=symbol, limit=WARMUP_MINUTES)
+            run_backtest_slow(symbol=symbol, limit=WARMUP_MINUTES, start=end - timedelta(minutes=WARMUP_MINUTES), end=end)
+            get_quotes_fast(symbol=symbol, limit=WARMUP_MINUTES)
+            get_dedup_raw_count(symbol=symbol)
+        except HTTPException as e:
+            failures[symbol] = e.detail
+        except Exception as e:
+            failures[symbol] = str(e)
+    return failures
+
+supervisor = ConnectionSupervisor(
+    get_clickhouse_client,
+    on_connect=_set_client,
+    warm_up=warm_up if WARMUP_SYMBOLS else None,
+    shareable=is_shareable,
+)
+
+@app.on_event("startup")
+def start_supervisor():
+    """Connects in the background; startup does not wait for ClickHouse."""
+    supervisor.start()
+
+@app.on_event("shutdown")
+def stop_supervisor():
+    supervisor.stop()
+
+@app.get("/health/live")
+def get_liveness():
+    """The process is up and serving requests. Does not touch ClickHouse."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def get_readiness():
+    """
+    200 once ClickHouse answers the supervisor's probes and the warm-up finished;
+    503 (with the supervisor state) while connecting, warming up or after failed probes.
+    """
+    status = supervisor.status()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+# ---
+# 12. LIVE LEADERBOARDS
+# ---
+
+# Sliding-window top-k per symbol, fed by /ingest/ticks and optionally Kafka (see leaderboard.py)
+leaderboard = Leaderboard()
+
+@app.on_event("startup")
+def start_leaderboard_feed():
+    if LEADERBOARD_KAFKA_BROKER:
+        threading.Thread(target=consume_kafka, args=(leaderboard,), name="leaderboard-kafka", daemon=True).start()
+
+@app.get("/leaderboard")
+def get_leaderboard(metric: str = "volume", window_minutes: int = 5, k: int = 10, source: str = "auto"):
+    """
+    Top-k symbols over the last 'window_minutes' by 'metric' (volume, notional, movers,
+    gainers, losers). Tracked windows are answered from memory; others, or source='clickhouse',
+    aggregate 'trades_1m_agg' (whole minutes). 'source' in the response says which was used.
+    """
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {LEADERBOARD_METRICS}")
+    if source not in ("auto", "memory", "clickhouse"):
+        raise HTTPException(status_code=400, detail="source must be 'auto', 'memory' or 'clickhouse'")
+    if not 1 <= k <= LEADERBOARD_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {LEADERBOARD_MAX_K}")
+    if window_minutes < 1:
+        raise HTTPException(status_code=400, detail="window_minutes must be at least 1")
+
+    in_memory = source != "clickhouse" and leaderboard.tracks(window_minutes)
+    if source == "memory" and not in_memory:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window_minutes must be one of {list(leaderboard.windows)} once ticks have arrived"
+        )
+
+    start_time = time.perf_counter()
+    if in_memory:
+        data = leaderboard.top(metric, window_minutes, k)
+    else:
+        if client is None:
+            raise HTTPException(status_code=503, detail="Database connection not available.")
+        try:
+            rows, types = QUERIES.execute(execute_coalesced, f"leaderboard_{metric}",
+                                          {'window': window_minutes, 'k': k}, with_column_types=True)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        columns = [name for name, _ in types]
+        data = [dict(zip(columns, row)) for row in rows]
+    end_time = time.perf_counter()
+
+    return {
+        "query_type": "leaderboard",
+        "source": "memory" if in_memory else "clickhouse",
+        "metric": metric,
+        "window_minutes": window_minutes,
+        "query_time_ms": (end_time - start_time) * 1000,
+        "rows_returned": len(data),
+        "data": data
+    }
+
+@app.get("/leaderboard/stats")
+def get_leaderboard_stats():
+    """Tracked windows, symbols and trades seen by the in-memory leaderboards."""
+    return leaderboard.status()
+
+
+# ---
+# 13. SEQUENCE-GAP AND DATA-QUALITY MONITOR
+# ---
+
+@app.get("/quality/sequence")
+def get_sequence_quality(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         symbol: Optional[str] = None, limit: int = 100, gap_ids: bool = False):
+    """
+    Completeness of the seq_id sequence from the bitmaps in 'ticks_seq_1m_agg':
+    missing ids, duplicates, out-of-order and late ticks, in total and for up to 'limit'
+    minutes with issues ('gap_ids' also lists each minute's first missing ids). Defaults
+    to the last hour. Without 'symbol' the whole feed is checked as one sequence; with
+    it, missing ids and gaps are only reported when SEQ_ID_NUMBERING is per_symbol
+    (see sequence_quality.py).
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if SEQ_ID_NUMBERING not in SEQ_ID_NUMBERINGS:
+        raise HTTPException(status_code=500, detail=f"SEQ_ID_NUMBERING must be one of {SEQ_ID_NUMBERINGS}")
+    if not 1 <= limit <= SEQUENCE_MAX_MINUTES:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEQUENCE_MAX_MINUTES}")
+    gaps = symbol is None or symbol_gaps()
+    if gap_ids and not gaps:
+        raise HTTPException(status_code=400,
+                            detail="gap_ids needs the whole feed or SEQ_ID_NUMBERING=per_symbol; "
+                                   "seq_ids are numbered across all symbols")
+
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(hours=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    scope = "feed" if symbol is None else "symbol"
+    params = {'start': start, 'end': end}
+    if symbol is not None:
+        params['symbol'] = symbol
+
+    try:
+        start_time = time.perf_counter()
+        totals, totals_types = QUERIES.execute(execute_coalesced, f"sequence_totals_{scope}", params,
+                                               with_column_types=True)
+        issues_template = f"sequence_issues_ids_{scope}" if gap_ids else f"sequence_issues_{scope}"
+        issues, issues_types = QUERIES.execute(execute_coalesced, issues_template,
+                                               dict(params, limit=limit), with_column_types=True)
+        end_time = time.perf_counter()
+
+        summary = summarise_sequence(dict(zip([name for name, _ in totals_types], totals[0])), gaps)
+        columns = [name for name, _ in issues_types]
+        data = [dict(zip(columns, row)) for row in issues]
+
+        return {
+            "query_type": "sequence_quality",
+            "query_time_ms": (end_time - start_time) * 1000,
+            "start": start,
+            "end": end,
+            "symbol": symbol,
+            "numbering": SEQ_ID_NUMBERING,
+            "summary": summary,
+            "rows_returned": len(data),
+            "data": data
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---
+# 14. VOLUME PROFILE AND VWAP BANDS
+# ---
+
+@app.get("/profile/volume")
+def get_volume_profile(symbol: str = "AAPL", start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       bucket: float = 0.5, value_area: float = 0.7, bands: str = "1,2", series: bool = False):
+    """
+    Volume at price in 'bucket'-wide levels, with the point of control and the value area,
+    plus VWAP +/- 'bands' standard deviations for the window (default: the last day).
+    series=true adds the VWAP and bands anchored at 'start' for every minute.
+    Merges the per-minute histograms in 'trades_profile_1m_agg' (see volume_profile.py).
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if not 0 < value_area <= 1:
+        raise HTTPException(status_code=400, detail="value_area must be in (0, 1]")
+    try:
+        cents = bucket_cents(bucket)
+        multipliers = parse_bands(bands) if bands else DEFAULT_BANDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(days=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    params = {'symbol': symbol, 'start': start, 'end': end}
+
+    try:
+        start_time = time.perf_counter()
+        levels = QUERIES.execute(execute_coalesced, "volume_profile_levels", dict(params, bucket_cents=cents),
+                                 columnar=True) or [[], []]
+        running = QUERIES.execute(execute_coalesced, "volume_profile_vwap", params)
+        end_time = time.perf_counter()
+
+        profile = summarise_profile(*levels, running, cents / 100, multipliers, value_area)
+        response = {
+            "query_type": "volume_profile",
+            "query_time_ms": (end_time - start_time) * 1000,
+            "symbol": symbol,
+            "start": start,
+            "end": end,
+            "bucket": cents / 100,
+            "minutes": len(running),
+            **profile,
+        }
+        if series:
+            response["series"] = band_series(running, multipliers)
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---
+# 15. CROSS-SYMBOL CORRELATION AND COVARIANCE
+# ---
+
+# Results for closed windows, keyed by the window and options (see correlation.py)
+correlation_cache = ResultCache()
+
+@app.get("/stats/correlation")
+def get_correlation(symbols: str = "", start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    interval_minutes: int = 5, stat: str = "correlation", window: Optional[int] = None,
+                    step: Optional[int] = None, min_periods: int = 20, fill_limit: int = 3):
+    """
+    Correlation and/or covariance matrix of 'interval_minutes' log returns across symbols
+    (comma-separated; default: every symbol that traded in the window, up to 500).
+    Defaults to the last day. With 'window' (in returns) the matrices are rolling,
+    one every 'step' returns. Missing closes are forward-filled for up to 'fill_limit'
+    intervals; pairs use the intervals where both have returns.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+    if stat not in CORRELATION_STATS:
+        raise HTTPException(status_code=400, detail=f"stat must be one of {CORRELATION_STATS}")
+    if not 1 <= interval_minutes <= 1440:
+        raise HTTPException(status_code=400, detail="interval_minutes must be between 1 and 1440")
+    if min_periods < 2 or fill_limit < 0:
+        raise HTTPException(status_code=400, detail="min_periods must be at least 2 and fill_limit not negative")
+    if window is not None and (window < 2 or (step is not None and step < 1)):
+        raise HTTPException(status_code=400, detail="window must be at least 2 and step at least 1")
+    requested = sorted({s.strip() for s in symbols.split(",") if s.strip()})
+    if len(requested) > CORRELATION_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {CORRELATION_MAX_SYMBOLS} symbols")
+
+    now = datetime.now(timezone.utc)
+    end = _as_utc(end) if end else now
+    start = _as_utc(start) if start else end - timedelta(days=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    step = step or window
+
+    key = (tuple(requested), start, end, interval_minutes, stat, window, step, min_periods, fill_limit)
+    start_time = time.perf_counter()
+    cached = correlation_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True, "query_time_ms": (time.perf_counter() - start_time) * 1000}
+
+    params = {'start': start, 'end': end, 'interval': interval_minutes}
+    try:
+        if requested:
+            columns = QUERIES.execute(execute_coalesced, "interval_closes", dict(params, symbols=requested),
+                                      columnar=True)
+        else:
+            columns = QUERIES.execute(execute_coalesced, "interval_closes_all", params, columnar=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not columns or not len(columns[0]):
+        names, times, returns = [], [], np.empty((0, 0))
+    else:
+        times, names, prices = price_matrix(*columns, interval_minutes * 60, fill_limit)
+        if len(names) > CORRELATION_MAX_SYMBOLS:
+            raise HTTPException(status_code=400, detail=f"{len(names)} symbols traded; pass at most "
+                                                        f"{CORRELATION_MAX_SYMBOLS} in 'symbols'")
+        returns = log_returns(prices)
+
+    if window is not None and rolling_window_count(len(returns), window, step) > MAX_ROLLING_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"More than {MAX_ROLLING_WINDOWS} rolling windows; "
+                                                    f"raise 'step' or shorten the range")
+
+    result = {
+        "query_type": "correlation",
+        "symbols": names,
+        "start": start,
+        "end": end,
+        "interval_minutes": interval_minutes,
+        "returns": len(returns),
+        "window": window,
+        "step": step if window else None,
+        **compute_correlation(times, returns, stat, min_periods, window, step),
+    }
+    if is_final(end.timestamp(), now.timestamp()):
+        correlation_cache.put(key, result)
+    return {**result, "cached": False, "query_time_ms": (time.perf_counter() - start_time) * 1000}
+
+
+# ---
+# 16. QUERY TEMPLATES
+# ---
+
+@app.get("/stats/queries")
+def get_query_stats():
+    """Registered query templates (latest versions) and per-template latency."""
+    return {
+        "templates": [template.describe() for template in QUERIES.templates()],
+        "latency": QUERIES.stats(),
+    }
+
+@app.post("/query/template")
+async def execute_query_template(request: Request):
+    """
+    Runs a registered template. JSON body: 'params' plus either 'name' (and optional
+    'version') or 'group' with optional 'needs', e.g. {"group": "tick_count",
+    "needs": ["deduplicated"], "params": {"symbol": "AAPL"}} routes to ticks_dedup FINAL.
+    Parameters are validated against the template's types before anything is sent.
+    """
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database connection not available.")
+
+    body = await request.json()
+    try:
+        if body.get("name"):
+            template = QUERIES.get(body["name"], body.get("version"))
+        else:
+            template = QUERIES.route(body.get("group", ""), body.get("needs") or ())
+        params = template.bind(body.get("params") or {})
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown template: {e}")
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        start_time = time.perf_counter()
+        rows, types = await run_in_threadpool(
+            QUERIES.execute, execute_coalesced, template, params, with_column_types=True
+        )
+        end_time = time.perf_counter()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    columns = [name for name, _ in types]
+    data = [dict(zip(columns, row)) for row in rows]
+    return {
+        "query_type": "template",
+        "template": template.key,
+        "source": template.source,
+        "query_time_ms": (end_time - start_time) * 1000,
+        "rows_returned": len(data),
+        "data": data
+    }
+
+
 # ---
 # Run the application
 # ---
@@ -0,0 +1,274 @@
+"""
+Registry of named, versioned query templates with typed parameters.
+
+Every template is plain SQL with server-side placeholders ({name:Type}); the declared
+types are read from the SQL itself, so a template cannot drift from its schema:
+
+- Parameters are validated and converted in Python before a query is sent (int ranges,
+  ISO timestamps -> UTC datetimes, arrays). Mistakes come back as ValueError, which the
+  API turns into a 400 instead of a ClickHouse error. '%(x)s' placeholders are rejected
+  when a template is registered.
+- Templates of one group answer the same question from different tables. route() picks
+  the cheapest source (rollup, then dedup, then raw) whose template provides every
+  capability the caller needs, e.g. 'exact' (recomputed from ticks, immune to rollup
+  drift) or 'deduplicated' (one row per (symbol, seq_id)).
+- execute() records per-template latency (calls, errors, p50/p95/max over the last
+  LATENCY_SAMPLES calls).
+- check_pruning() runs EXPLAIN indexes = 1 with the template's sample parameters and
+  reports every MergeTree read whose primary key condition is 'true' (a full scan).
+  query_templates.py runs it for every template; a failing check exits non-zero.
+"""
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Cheapest first; route() prefers earlier sources
+SOURCES = ("rollup", "dedup", "raw")
+LATENCY_SAMPLES = 1024
+
+PLACEHOLDER = re.compile(r"\{(\w+):([^{}]+)\}")
+# clickhouse_driver's client-side styles; templates use server-side parameters only
+CLIENT_SIDE_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+
+INT_RANGES = {
+    f"{prefix}Int{bits}": (0, 2 ** bits - 1) if prefix else (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+    for prefix in ("U", "") for bits in (8, 16, 32, 64)
+}
+DATETIME_TYPE = re.compile(r"^DateTime(64)?(\(.*\))?$")
+ARRAY_TYPE = re.compile(r"^Array\((.+)\)$")
+
+# Bounded reads of a MergeTree table look like:
+#   ReadFromMergeTree (default.ticks_local) ... PrimaryKey / Keys: ... / Condition: (...)
+READ_STEP = re.compile(r"ReadFromMergeTree \(([^)]+)\)")
+KEY_CONDITION = re.compile(r"^\s*Condition:\s*(.+)$")
+
+
+def convert(type_name: str, value, name: str = "value"):
+    """Validates 'value' against a ClickHouse parameter type and returns the Python value to send."""
+    type_name = type_name.strip()
+    if type_name == "String":
+        if not isinstance(value, str):
+            raise ValueError(f"{name} must be a string")
+        return value
+
+    if type_name in INT_RANGES:
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be an integer")
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be an integer") from None
+        if isinstance(value, float) and number != value:
+            raise ValueError(f"{name} must be an integer")
+        low, high = INT_RANGES[type_name]
+        if not low <= number <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        return number
+
+    if type_name in ("Float32", "Float64"):
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a number")
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number") from None
+
+    if DATETIME_TYPE.match(type_name):
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                raise ValueError(f"{name} must be an ISO 8601 timestamp") from None
+        if not isinstance(value, datetime):
+            raise ValueError(f"{name} must be a timestamp")
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+    array = ARRAY_TYPE.match(type_name)
+    if array:
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"{name} must be a list")
+        return [convert(array.group(1), item, f"{name}[{i}]") for i, item in enumerate(value)]
+
+    raise ValueError(f"Unsupported parameter type for {name}: {type_name}")
+
+
+class QueryTemplate:
+    def __init__(self, name: str, sql: str, source: str, version: int = 1, group: str = None,
+                 provides=(), sample_params: dict = None, check_pruning: bool = True, description: str = ""):
+        """
+        'source' is the kind of table read (SOURCES). 'group' names the question the
+        template answers (default: its name); 'provides' lists capabilities for route().
+        'sample_params' are used by the EXPLAIN check; check_pruning=False opts out
+        for templates that read whole tables on purpose.
+        """
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of {SOURCES}")
+        if CLIENT_SIDE_PLACEHOLDER.search(sql):
+            raise ValueError(f"{name}: use server-side {{name:Type}} parameters, not %(name)s")
+
+        self.params = {}
+        for param, type_name in PLACEHOLDER.findall(sql):
+            type_name = type_name.strip()
+            if self.params.setdefault(param, type_name) != type_name:
+                raise ValueError(f"{name}: parameter {param} is declared as {self.params[param]} and {type_name}")
+            convert(type_name, _example(type_name), param)   # rejects unsupported types now
+
+        self.name = name
+        self.sql = sql
+        self.source = source
+        self.version = version
+        self.group = group or name
+        self.provides = frozenset(provides)
+        self.sample_params = sample_params or {}
+        self.check_pruning = check_pruning
+        self.description = description
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def bind(self, params: dict) -> dict:
+        """Validated, converted parameters; raises ValueError for missing or unknown names."""
+        params = params or {}
+        missing = [p for p in self.params if p not in params]
+        if missing:
+            raise ValueError(f"{self.name}: missing parameter(s) {', '.join(missing)}")
+        unknown = [p for p in params if p not in self.params]
+        if unknown:
+            raise ValueError(f"{self.name}: unknown parameter(s) {', '.join(unknown)}")
+        return {p: convert(type_name, params[p], p) for p, type_name in self.params.items()}
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "group": self.group,
+            "source": self.source,
+            "provides": sorted(self.provides),
+            "params": self.params,
+            "description": self.description,
+        }
+
+
+def _example(type_name: str):
+    """A value of the type, only used to check that convert() supports it."""
+    if type_name == "String":
+        return ""
+    if type_name in INT_RANGES or type_name in ("Float32", "Float64"):
+        return 0
+    if DATETIME_TYPE.match(type_name):
+        return datetime.now(timezone.utc)
+    if ARRAY_TYPE.match(type_name):
+        return []
+    return None
+
+
+class _Latency:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def summary(self) -> dict:
+        samples = np.asarray(self.samples, dtype=np.float64)
+        if not len(samples):
+            return {"calls": self.calls, "errors": self.errors}
+        p50, p95 = np.percentile(samples, (50, 95))
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "max_ms": float(samples.max()),
+        }
+
+
+class QueryRegistry:
+    def __init__(self):
+        self._templates = {}   # name -> {version: template}
+        self._latency = {}     # template key -> _Latency
+        self._lock = threading.Lock()
+
+    def register(self, template: QueryTemplate) -> QueryTemplate:
+        versions = self._templates.setdefault(template.name, {})
+        if template.version in versions:
+            raise ValueError(f"{template.key} is already registered")
+        versions[template.version] = template
+        self._latency[template.key] = _Latency()
+        return template
+
+    def get(self, name: str, version: int = None) -> QueryTemplate:
+        """The template (latest version unless 'version' is given); KeyError if unknown."""
+        versions = self._templates[name]
+        return versions[max(versions) if version is None else version]
+
+    def templates(self) -> list:
+        """Latest version of every template."""
+        return [self.get(name) for name in sorted(self._templates)]
+
+    def route(self, group: str, needs=()) -> QueryTemplate:
+        """Cheapest template of 'group' that provides every capability in 'needs'."""
+        needs = frozenset(needs)
+        candidates = [t for t in self.templates() if t.group == group and needs <= t.provides]
+        if not candidates:
+            raise KeyError(f"No template of {group!r} provides {sorted(needs)}")
+        return min(candidates, key=lambda t: SOURCES.index(t.source))
+
+    def execute(self, run, template, params: dict = None, **kwargs):
+        """
+        run(sql, params, **kwargs) executes the query (client.execute or a coalescing
+        wrapper). 'template' is a QueryTemplate or a registered name.
+        """
+        if isinstance(template, str):
+            template = self.get(template)
+        bound = template.bind(params)
+        latency = self._latency[template.key]
+        start = time.perf_counter()
+        try:
+            return run(template.sql, bound, **kwargs)
+        except Exception:
+            with self._lock:
+                latency.errors += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                latency.calls += 1
+                latency.samples.append(elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {key: latency.summary() for key, latency in sorted(self._latency.items())}
+
+
+def full_scans(explain_lines) -> list:
+    """
+    Tables read without primary key pruning in EXPLAIN indexes = 1 output: a
+    ReadFromMergeTree step without a PrimaryKey index, or whose condition is 'true'.
+    """
+    scans, table, in_primary_key, pruned = [], None, False, False
+    for line in list(explain_lines) + ["ReadFromMergeTree (end)"]:
+        step = READ_STEP.search(line)
+        if step:
+            if table is not None and not pruned:
+                scans.append(table)
+            table, in_primary_key, pruned = step.group(1), False, False
+            continue
+        stripped = line.strip(" │└─")
+        if stripped in ("Min-Max", "Partition", "PrimaryKey", "Skip"):
+            in_primary_key = stripped == "PrimaryKey"
+            continue
+        condition = KEY_CONDITION.match(stripped)
+        if condition and in_primary_key and condition.group(1).strip() != "true":
+            pruned = True
+    return scans
+
+
+def check_pruning(run, template: QueryTemplate) -> list:
+    """Tables the template reads without primary key pruning, for its sample parameters."""
+    rows = run(f"EXPLAIN indexes = 1 {template.sql}", template.bind(template.sample_params))
+    return full_scans(row[0] for row in rows)
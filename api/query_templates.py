@@ -0,0 +1,170 @@
+"""
+The API's query templates (see query_registry.py).
+
+Endpoints run these through QUERIES.execute(), so every query has typed parameters
+and latency stats (GET /stats/queries). Check that every template still prunes by
+primary key, offline against the embedded backend or against a cluster:
+
+    CLICKHOUSE_BACKEND=local python api/query_templates.py
+    python api/query_templates.py            # CLICKHOUSE_HOST / CLICKHOUSE_REPLICAS
+
+The script exits non-zero when a template reads a MergeTree table without pruning.
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+
+from correlation import closes_query
+from leaderboard import METRICS as LEADERBOARD_METRICS, fallback_query as leaderboard_fallback_query
+from query_registry import QueryRegistry, QueryTemplate, check_pruning
+from sequence_quality import build_queries as build_sequence_queries, symbol_gaps as sequence_symbol_gaps
+from volume_profile import PROFILE_QUERY, VWAP_QUERY
+
+QUERIES = QueryRegistry()
+
+_now = datetime.now(timezone.utc)
+# Parameter values for the EXPLAIN check, by parameter name
+SAMPLE_PARAMS = {
+    'symbol': "AAPL",
+    'symbols': ["AAPL", "MSFT"],
+    'limit': 100,
+    'k': 10,
+    'window': 5,
+    'interval': 5,
+    'bucket_cents': 50,
+    'start': _now - timedelta(days=1),
+    'end': _now,
+}
+
+
+def register(name: str, sql: str, source: str, **kwargs) -> QueryTemplate:
+    template = QueryTemplate(name, sql, source, **kwargs)
+    template.sample_params = {p: SAMPLE_PARAMS[p] for p in template.params}
+    return QUERIES.register(template)
+
+
+# --- 1-minute OHLCV/VWAP bars ---
+
+register("ohlcv_1m_rollup", """
+    SELECT
+        minute,
+        symbol,
+        -- Use '...Merge' functions to finalize the aggregate states.
+        -- Columns are table-qualified, so 'volume' in the VWAP is not the alias.
+        argMinMerge(trades_1m_agg.open) AS open,
+        maxMerge(trades_1m_agg.high) AS high,
+        minMerge(trades_1m_agg.low) AS low,
+        argMaxMerge(trades_1m_agg.close) AS close,
+        sumMerge(trades_1m_agg.volume) AS volume,
+        sumMerge(trades_1m_agg.vwap_pv) / sumMerge(trades_1m_agg.volume) AS vwap
+    FROM
+        default.trades_1m_agg
+    WHERE
+        symbol = {symbol:String}
+    GROUP BY
+        symbol, minute
+    ORDER BY
+        minute DESC
+    LIMIT {limit:UInt32}
+    """, "rollup", group="ohlcv_1m",
+    description="Latest bars from the pre-aggregated states ('fast').")
+
+# This is the "slow" query. It must scan raw data and group it.
+register("ohlcv_1m_raw", """
+    SELECT
+        toStartOfMinute(event_time) AS minute,
+        symbol,
+        argMin(price, event_time) AS open,
+        max(price) AS high,
+        min(price) AS low,
+        argMax(price, event_time) AS close,
+        sum(size) AS volume,
+        sum(price * size) / sum(size) AS vwap
+    FROM
+        default.ticks_all
+    WHERE
+        symbol = {symbol:String}
+        AND event_type = 'trade'
+    GROUP BY
+        symbol, minute
+    ORDER BY
+        minute DESC
+    LIMIT {limit:UInt32}
+    """, "raw", group="ohlcv_1m", provides=("exact",),
+    description="Latest bars recomputed from raw ticks ('slow').")
+
+# --- Tick counts ---
+
+register("tick_count_dedup",
+         "SELECT count() FROM default.ticks_dedup WHERE symbol = {symbol:String}",
+         "dedup", group="tick_count",
+         description="Rows in ticks_dedup, including versions not merged away yet.")
+
+# The FINAL keyword forces ClickHouse to perform the merge
+# logic on the fly, giving us the accurate, deduplicated count.
+register("tick_count_final",
+         "SELECT count() FROM default.ticks_dedup FINAL WHERE symbol = {symbol:String}",
+         "dedup", group="tick_count", provides=("exact", "deduplicated"),
+         description="One row per (symbol, seq_id), merged at query time.")
+
+# --- Leaderboard fallback (windows not tracked in memory) ---
+
+for _metric in LEADERBOARD_METRICS:
+    register(f"leaderboard_{_metric}", leaderboard_fallback_query(_metric), "rollup", group="leaderboard",
+             description=f"Top symbols by {_metric} over trades_1m_agg.")
+
+# --- Sequence quality ---
+
+for _scope, _symbol in (("feed", None), ("symbol", "")):
+    # Per symbol, gaps only mean something when each symbol has its own counter
+    _gaps = _symbol is None or sequence_symbol_gaps()
+    _totals, _issues = build_sequence_queries(_symbol, _gaps)
+    register(f"sequence_totals_{_scope}", _totals, "rollup", group="sequence_quality",
+             description="Missing, duplicate, out-of-order and late ticks in a range.")
+    register(f"sequence_issues_{_scope}", _issues, "rollup", group="sequence_quality",
+             description="Minutes with sequence issues.")
+    if _gaps:
+        register(f"sequence_issues_ids_{_scope}", build_sequence_queries(_symbol, _gaps, gap_ids=True)[1],
+                 "rollup", group="sequence_quality",
+                 description="Minutes with sequence issues and their first missing ids.")
+
+# --- Volume profile and VWAP bands ---
+
+register("volume_profile_levels", PROFILE_QUERY, "rollup", group="volume_profile",
+         description="Merged volume-at-price histogram in price levels.")
+register("volume_profile_vwap", VWAP_QUERY, "rollup", group="volume_profile",
+         description="Running volume-weighted price moments per minute.")
+
+# --- Correlation ---
+
+register("interval_closes", closes_query(True), "rollup", group="correlation",
+         description="Close per (symbol, interval) for the given symbols.")
+register("interval_closes_all", closes_query(False), "rollup", group="correlation",
+         description="Close per (symbol, interval) for every symbol that traded.")
+
+
+def main() -> int:
+    from clickhouse_client import get_clickhouse_client
+
+    client = get_clickhouse_client()
+    failures = 0
+    for template in QUERIES.templates():
+        if not template.check_pruning:
+            print(f"⏭️  {template.key}: check disabled")
+            continue
+        try:
+            scans = check_pruning(client.execute, template)
+        except Exception as e:
+            print(f"❌ {template.key}: {e}")
+            failures += 1
+            continue
+        if scans:
+            print(f"❌ {template.key}: no primary key pruning on {', '.join(scans)}")
+            failures += 1
+        else:
+            print(f"✅ {template.key}")
+    print(f"{len(QUERIES.templates()) - failures} template(s) passed, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Replica-aware ClickHouse client.
+
+Drop-in for clickhouse_driver.Client.execute() over several replicas of the same
+data (CLICKHOUSE_REPLICAS="host:port,host:port"):
+
+- Least-outstanding-requests balancing: each query goes to the healthy replica with
+  the fewest queries in flight.
+- Health: a background thread reads max(absolute_delay) from system.replicas on every
+  replica. Replicas that lag more than CLICKHOUSE_MAX_REPLICA_DELAY seconds, or fail
+  the check, get no traffic until they recover. If every replica is unhealthy,
+  all of them are used anyway.
+- Hedged reads (CLICKHOUSE_HEDGE_AFTER_MS > 0): if a SELECT has not returned after
+  that many ms, the same query is sent to a second replica. The first answer wins and
+  the loser is cancelled with KILL QUERY.
+
+Only list true replicas. In the bundled docker-compose, clickhouse-01 and clickhouse-02
+are different shards, so their local tables hold different rows.
+"""
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+from clickhouse_driver import Client
+
+HEALTH_QUERY = "SELECT max(absolute_delay) FROM system.replicas"
+
+# Statements that are safe to send twice
+READ_PREFIXES = ("SELECT", "WITH")
+
+
+class Replica:
+    def __init__(self, host: str, port: int, connect_kwargs: dict):
+        self.host, self.port = host, port
+        self.name = f"{host}:{port}"
+        self._connect_kwargs = connect_kwargs
+        self._idle = []
+        self._lock = threading.Lock()
+        self.outstanding = 0
+        self.healthy = True
+        self.delay = 0
+        self.stats = {"queries": 0, "errors": 0, "hedges_won": 0, "hedges_lost": 0}
+
+    def acquire(self) -> Client:
+        """An idle connection to this replica (clickhouse_driver clients are not thread-safe)."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return Client(host=self.host, port=self.port, **self._connect_kwargs)
+
+    def release(self, client: Client, broken: bool = False):
+        if broken:
+            client.disconnect()
+            return
+        with self._lock:
+            self._idle.append(client)
+
+
+class ReplicaPool:
+    # Safe to use from many threads at once (see clickhouse_client.is_shareable)
+    shareable = True
+
+    def __init__(self, endpoints: list, max_delay: float = 30, hedge_after_ms: float = 0,
+                 health_interval: float = 5, **connect_kwargs):
+        self.replicas = []
+        for endpoint in endpoints:
+            host, _, port = endpoint.strip().partition(":")
+            self.replicas.append(Replica(host, int(port or 9000), connect_kwargs))
+        if not self.replicas:
+            raise ValueError("At least one replica endpoint is required")
+
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after_ms / 1000
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+        self.hedges = 0
+
+        self.check_health()
+        if health_interval:
+            threading.Thread(target=self._health_loop, args=(health_interval,),
+                             name="replica-health", daemon=True).start()
+
+    # --- Health ---
+
+    def check_health(self):
+        for replica in self.replicas:
+            client = None
+            try:
+                client = replica.acquire()
+                (delay,), = client.execute(HEALTH_QUERY)
+                replica.delay = delay or 0
+                replica.healthy = replica.delay <= self.max_delay
+                replica.release(client)
+            except Exception:
+                replica.healthy = False
+                if client is not None:
+                    replica.release(client, broken=True)
+
+    def _health_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            self.check_health()
+
+    # --- Balancing ---
+
+    def _pick(self, exclude: Replica = None) -> Replica:
+        """Healthy replica with the fewest queries in flight; round-robin among ties."""
+        with self._lock:
+            candidates = [r for r in self.replicas if r.healthy and r is not exclude] \
+                or [r for r in self.replicas if r is not exclude]
+            if not candidates:
+                return None
+            start = next(self._rr) % len(candidates)
+            rotated = candidates[start:] + candidates[:start]
+            replica = min(rotated, key=lambda r: r.outstanding)
+            replica.outstanding += 1
+            return replica
+
+    def _run(self, replica: Replica, query: str, params, kwargs: dict):
+        client = replica.acquire()
+        broken = False
+        try:
+            replica.stats["queries"] += 1
+            return client.execute(query, params, **kwargs)
+        except Exception:
+            replica.stats["errors"] += 1
+            broken = True
+            raise
+        finally:
+            replica.release(client, broken)
+            with self._lock:
+                replica.outstanding -= 1
+
+    def _kill(self, replica: Replica, query_id: str):
+        client = None
+        try:
+            client = Client(host=replica.host, port=replica.port, **replica._connect_kwargs)
+            client.execute("KILL QUERY WHERE query_id = {query_id:String} ASYNC", {'query_id': query_id})
+        except Exception:
+            pass  # The query finishes on its own; only the wasted work remains
+        finally:
+            if client is not None:
+                client.disconnect()
+
+    # --- Client API ---
+
+    def execute(self, query: str, params=None, **kwargs):
+        replica = self._pick()
+        hedge = (
+            self.hedge_after > 0
+            and len(self.replicas) > 1
+            and query.lstrip().upper().startswith(READ_PREFIXES)
+        )
+        if not hedge:
+            return self._run(replica, query, params, kwargs)
+        return self._execute_hedged(replica, query, params, kwargs)
+
+    def _execute_hedged(self, primary: Replica, query: str, params, kwargs: dict):
+        ids = {primary: uuid.uuid4().hex}
+        futures = {
+            self._hedge_pool.submit(self._run, primary, query, params, dict(kwargs, query_id=ids[primary])): primary
+        }
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            backup = self._pick(exclude=primary)
+            if backup is not None:
+                self.hedges += 1
+                ids[backup] = uuid.uuid4().hex
+                futures[self._hedge_pool.submit(
+                    self._run, backup, query, params, dict(kwargs, query_id=ids[backup])
+                )] = backup
+
+        # First successful answer wins; if one fails, wait for the other
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = futures[future]
+                    for other in pending:
+                        loser = futures[other]
+                        loser.stats["hedges_lost"] += 1
+                        self._kill(loser, ids[loser])
+                    if len(futures) > 1:
+                        winner.stats["hedges_won"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @contextmanager
+    def pinned(self):
+        """One connection on one replica, for work that must stay on the same node (scratch tables)."""
+        replica = self._pick()
+        client = replica.acquire()
+        broken = False
+        try:
+            yield client
+        except Exception:
+            broken = True
+            raise
+        finally:
+            replica.release(client, broken)
+            with self._lock:
+                replica.outstanding -= 1
+
+    def disconnect(self):
+        for replica in self.replicas:
+            with replica._lock:
+                idle, replica._idle = replica._idle, []
+            for client in idle:
+                client.disconnect()
+
+    def status(self) -> list:
+        return [
+            {
+                "replica": r.name,
+                "healthy": r.healthy,
+                "delay_seconds": r.delay,
+                "outstanding": r.outstanding,
+                **r.stats,
+            }
+            for r in self.replicas
+        ]
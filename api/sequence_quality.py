@@ -0,0 +1,170 @@
+"""
+Sequence-gap and data-quality monitor.
+
+The producer numbers original ticks 0, 1, 2, ... and the Kafka engine silently skips
+messages it cannot parse (kafka_skip_broken_messages = 1). 'ticks_seq_1m_agg' keeps a
+roaring bitmap of the original seq_ids per symbol and minute, so completeness questions
+merge compressed bitmaps instead of scanning raw ticks:
+
+- missing:      ids between the first and last seq_id of the range that never arrived:
+                (last - first + 1) minus the cardinality of the range's merged bitmap.
+- gaps:         per minute, the ids in (highest id of earlier minutes, highest id of this
+                minute] that this minute did not receive. Computed from the minute's
+                bounds and cardinality, so no id range is ever materialised; an id that
+                arrives in a later minute is a gap here and out_of_order there.
+- duplicates:   original ticks received more than once (rows minus distinct ids). Per
+                minute only repeats within the minute count; an id re-delivered in a
+                later minute shows up there as out_of_order.
+- out_of_order: ids that landed in a later minute than a higher id.
+- late:         ticks written more than 120s of event time behind a tick written before
+                them in the same insert (see 18_ticks_seq_1m_mv.sql). This follows the
+                stream rather than the wall clock, so replays and backfills are not late.
+- corrections:  re-sent ticks (source_version > 1); they are expected, not errors.
+
+Without a symbol the whole feed is one sequence. The producer's counter is global
+(SEQ_ID_NUMBERING = global), so one symbol's ids skip every other symbol's ticks and
+its missing/gaps mean nothing; they are only reported per symbol when the feed numbers
+each symbol separately (SEQ_ID_NUMBERING = per_symbol).
+"""
+import os
+
+# How the producer numbers original ticks: one counter for the feed, or one per symbol
+SEQ_ID_NUMBERING = os.environ.get("SEQ_ID_NUMBERING", "global")
+NUMBERINGS = ("global", "per_symbol")
+
+# Listed gap ids per minute; the count is always exact
+GAP_SAMPLE = 10
+MAX_MINUTES = 1000
+
+# The first GAP_SAMPLE ids missing from (prev, last_seq]: the holes between consecutive
+# received ids, each cut to GAP_SAMPLE ids, so a jump in the sequence (e.g. a replay
+# with --seq-offset) cannot build a huge range
+GAP_IDS = f"""
+        arraySlice(arrayFlatten(arrayMap(
+            (low, high) -> range(low, least(high, low + {GAP_SAMPLE})),
+            arrayConcat([toUInt64(prev + 1)], arrayMap(id -> id + 1, in_span)),
+            arrayConcat(in_span, [last_seq + 1])
+        )), 1, {GAP_SAMPLE}) AS gap_ids"""
+
+
+def symbol_gaps() -> bool:
+    """Whether missing/gaps are meaningful for a single symbol."""
+    return SEQ_ID_NUMBERING == "per_symbol"
+
+
+def _filters(symbol) -> str:
+    filters = [
+        "minute >= toStartOfMinute({start:DateTime64(6, 'UTC')})",
+        "minute < {end:DateTime64(6, 'UTC')}",
+    ]
+    if symbol is not None:
+        filters.append("symbol = {symbol:String}")
+    return " AND ".join(filters)
+
+
+def _per_minute(symbol, gap_ids: bool) -> str:
+    """
+    One row per minute with original ticks. 'prev' is the highest id of the earlier
+    minutes (first id - 1 for the first minute), as Int64 so it can be -1.
+    """
+    where = _filters(symbol)
+    ids = ""
+    if gap_ids:
+        ids = ",\n        bitmapToArray(bitmapSubsetInRange(bm, toUInt64(prev + 1), last_seq + 1)) AS in_span," + GAP_IDS
+    return f"""
+    SELECT
+        minute,
+        received,
+        originals,
+        corrections,
+        late,
+        max_lag_seconds,
+        first_seq,
+        last_seq,
+        if(minute_index = 1, toInt64(first_seq) - 1, toInt64(prev_max)) AS prev,
+        bitmapCardinality(bitmapSubsetInRange(bm, 0, toUInt64(prev + 1))) AS out_of_order,
+        greatest(toInt64(last_seq) - prev, 0) - (received - out_of_order) AS gaps,
+        originals - received AS duplicates{ids}
+    FROM (
+        SELECT
+            minute,
+            groupBitmapMergeState(ticks_seq_1m_all.seq_ids) AS bm,
+            bitmapCardinality(bm) AS received,
+            sum(ticks_seq_1m_all.originals) AS originals,
+            sum(ticks_seq_1m_all.corrections) AS corrections,
+            sum(ticks_seq_1m_all.late) AS late,
+            max(ticks_seq_1m_all.max_lag_seconds) AS max_lag_seconds,
+            minMerge(ticks_seq_1m_all.min_seq) AS first_seq,
+            maxMerge(ticks_seq_1m_all.max_seq) AS last_seq,
+            max(last_seq) OVER (ORDER BY minute ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS prev_max,
+            row_number() OVER (ORDER BY minute) AS minute_index
+        FROM default.ticks_seq_1m_all
+        WHERE {where}
+        GROUP BY minute
+        HAVING sum(ticks_seq_1m_all.originals) > 0
+    )
+    """
+
+
+def build_queries(symbol=None, gaps: bool = True, gap_ids: bool = False) -> tuple:
+    """
+    (totals query, per-minute query listing only minutes with issues). Without 'gaps'
+    the per-minute gap count is left out; 'gap_ids' also lists the first missing ids.
+    """
+    where = _filters(symbol)
+    totals = f"""
+    SELECT
+        min(first_seq) AS first_seq,
+        max(last_seq) AS last_seq,
+        sum(originals) AS originals,
+        (SELECT groupBitmapMerge(seq_ids) FROM default.ticks_seq_1m_all WHERE {where}) AS distinct_ids,
+        sum(out_of_order) AS out_of_order,
+        sum(corrections) AS corrections,
+        sum(late) AS late,
+        max(max_lag_seconds) AS max_lag_seconds,
+        count() AS minutes
+    FROM ({_per_minute(symbol, False)})
+    """
+    columns = ["minute", "received", "duplicates", "out_of_order", "late", "max_lag_seconds", "corrections"]
+    conditions = ["duplicates > 0", "out_of_order > 0", "late > 0"]
+    if gaps:
+        columns.insert(2, "gaps")
+        conditions.insert(0, "gaps > 0")
+    if gap_ids:
+        columns.append("gap_ids")
+    issues = f"""
+    SELECT
+        {', '.join(columns)}
+    FROM ({_per_minute(symbol, gap_ids)})
+    WHERE {' OR '.join(conditions)}
+    ORDER BY minute
+    LIMIT {{limit:UInt32}}
+    """
+    return totals, issues
+
+
+def summarise(row: dict, gaps: bool = True) -> dict:
+    """
+    Turns the totals row into the report. Without 'gaps' the sequence is not this
+    scope's own, so expected, missing and completeness are None.
+    """
+    if not row["minutes"]:
+        return {"first_seq": None, "last_seq": None, "expected": 0 if gaps else None, "received": 0,
+                "missing": 0 if gaps else None, "completeness": None, "duplicates": 0, "out_of_order": 0,
+                "corrections": 0, "late": 0, "max_lag_seconds": None}
+
+    distinct = row["distinct_ids"]
+    expected = row["last_seq"] - row["first_seq"] + 1
+    return {
+        "first_seq": row["first_seq"],
+        "last_seq": row["last_seq"],
+        "expected": expected if gaps else None,
+        "received": distinct,
+        "missing": expected - distinct if gaps else None,
+        "completeness": distinct / expected if gaps else None,
+        "duplicates": row["originals"] - distinct,
+        "out_of_order": row["out_of_order"],
+        "corrections": row["corrections"],
+        "late": row["late"],
+        "max_lag_seconds": row["max_lag_seconds"],
+    }
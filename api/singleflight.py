@@ -0,0 +1,102 @@
+"""
+Single-flight coalescing of identical concurrent queries.
+
+FastAPI runs the sync endpoints in a thread pool. When a dashboard page loads for many
+users at once, the same query arrives on many threads at the same time. The first
+caller for a key runs it; callers that arrive while it is in flight wait for that
+execution and get the same decoded result. Nothing is cached: once the execution
+finishes, the next caller runs the query again.
+
+Shared results are handed to several callers, so callers must not mutate them.
+"""
+import threading
+from collections import OrderedDict
+
+# Keys kept in the metrics table (least recently used are dropped)
+MAX_TRACKED_KEYS = 1000
+
+
+def normalise_key(query: str, params: dict = None, **kwargs) -> str:
+    """Whitespace-insensitive query text plus parameters and execute() options."""
+    return "\n".join((
+        " ".join(query.split()),
+        repr(sorted((params or {}).items())),
+        repr(sorted(kwargs.items())),
+    ))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, max_tracked_keys: int = MAX_TRACKED_KEYS):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._metrics = OrderedDict()
+        self._max_tracked_keys = max_tracked_keys
+
+    def do(self, key: str, fn):
+        """Runs fn() once per key at a time; concurrent callers share its result or exception."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+            self._record(key, leader, call.waiters)
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _record(self, key: str, leader: bool, waiters: int):
+        metrics = self._metrics.pop(key, None) or {"executions": 0, "merged": 0, "max_waiters": 0}
+        if leader:
+            metrics["executions"] += 1
+        else:
+            metrics["merged"] += 1
+            metrics["max_waiters"] = max(metrics["max_waiters"], waiters)
+        self._metrics[key] = metrics
+        if len(self._metrics) > self._max_tracked_keys:
+            self._metrics.popitem(last=False)
+
+    def metrics(self, top: int = 50) -> dict:
+        """Totals plus the keys with the most merged waiters."""
+        with self._lock:
+            items = [(key, dict(m)) for key, m in self._metrics.items()]
+            in_flight = len(self._calls)
+
+        executions = sum(m["executions"] for _, m in items)
+        merged = sum(m["merged"] for _, m in items)
+        items.sort(key=lambda item: item[1]["merged"], reverse=True)
+        return {
+            "in_flight": in_flight,
+            "tracked_keys": len(items),
+            "requests": executions + merged,
+            "executions": executions,
+            "merged": merged,
+            "keys": [
+                {"key": key, "requests": m["executions"] + m["merged"], **m}
+                for key, m in items[:top]
+            ],
+        }
@@ -0,0 +1,151 @@
+"""
+Volume profile and VWAP bands from the 'trades_profile_1m_agg' histograms.
+
+Each minute keeps a sumMap of price in cents -> traded size, plus the volume-weighted
+price moments (volume, sum(p * size), sum(p^2 * size)). Any window is answered by
+merging minutes, so a day costs ~390-1440 small rows instead of every trade:
+
+- profile:     the merged histogram, regrouped into 'bucket'-wide price levels, with the
+               point of control (the level with the most volume) and the value area
+               (the levels around it holding 'value_area' of the volume).
+- VWAP bands:  VWAP anchored at the window start, +/- k volume-weighted standard
+               deviations, where variance = sum(p^2 * size) / volume - VWAP^2.
+
+Both read 'trades_profile_1m_all', so the minutes of both shards are merged.
+"""
+import numpy as np
+
+DEFAULT_BANDS = (1.0, 2.0)
+
+PROFILE_FILTER = """
+symbol = {symbol:String}
+AND minute >= toStartOfMinute({start:DateTime64(6, 'UTC')})
+AND minute < {end:DateTime64(6, 'UTC')}
+"""
+
+# The cents of every minute are summed by sumMapMerge, then grouped into wider levels
+PROFILE_QUERY = f"""
+SELECT
+    intDiv(cents, {{bucket_cents:UInt32}}) * {{bucket_cents:UInt32}} AS level_cents,
+    sum(traded) AS volume
+FROM (
+    SELECT sumMapMerge(trades_profile_1m_all.profile) AS histogram
+    FROM default.trades_profile_1m_all
+    WHERE {PROFILE_FILTER}
+)
+ARRAY JOIN histogram.1 AS cents, histogram.2 AS traded
+GROUP BY level_cents
+ORDER BY level_cents
+"""
+
+# Running sums from the window start; the last row covers the whole window
+VWAP_QUERY = f"""
+SELECT
+    minute,
+    sum(minute_volume) OVER running AS volume,
+    sum(minute_pv) OVER running AS pv,
+    sum(minute_pv2) OVER running AS pv2
+FROM (
+    SELECT
+        minute,
+        sum(trades_profile_1m_all.volume) AS minute_volume,
+        sum(trades_profile_1m_all.pv) AS minute_pv,
+        sum(trades_profile_1m_all.pv2) AS minute_pv2
+    FROM default.trades_profile_1m_all
+    WHERE {PROFILE_FILTER}
+    GROUP BY minute
+)
+WINDOW running AS (ORDER BY minute ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+ORDER BY minute
+"""
+
+
+def parse_bands(value: str) -> tuple:
+    """'1,2' -> (1.0, 2.0). Raises ValueError for anything but positive numbers."""
+    bands = tuple(float(b) for b in value.split(",") if b.strip())
+    if not bands or any(not 0 < b < np.inf for b in bands):
+        raise ValueError("bands must be a comma-separated list of positive numbers")
+    return bands
+
+
+def bucket_cents(bucket: float) -> int:
+    """Price bucket width in whole cents. Raises ValueError for other widths."""
+    cents = round(bucket * 100)
+    if cents < 1 or abs(cents - bucket * 100) > 1e-6:
+        raise ValueError("bucket must be a positive multiple of 0.01")
+    return cents
+
+
+def vwap_moments(volume, pv, pv2):
+    """VWAP and volume-weighted standard deviation; works on scalars and arrays."""
+    volume = np.asarray(volume, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = np.asarray(pv, dtype=np.float64) / volume
+        # Rounding can make a zero variance slightly negative
+        variance = np.maximum(np.asarray(pv2, dtype=np.float64) / volume - vwap * vwap, 0.0)
+    return vwap, np.sqrt(variance)
+
+
+def value_area(volumes: np.ndarray, share: float) -> tuple:
+    """
+    (poc, low, high) level indices. Starting at the point of control, the area grows
+    one level at a time towards the side with more volume until it holds 'share'.
+    """
+    poc = int(np.argmax(volumes))
+    low = high = poc
+    target = share * volumes.sum()
+    covered = volumes[poc]
+    while covered < target and (low > 0 or high + 1 < len(volumes)):
+        below = volumes[low - 1] if low > 0 else -1
+        above = volumes[high + 1] if high + 1 < len(volumes) else -1
+        if above >= below:
+            high += 1
+            covered += above
+        else:
+            low -= 1
+            covered += below
+    return poc, low, high
+
+
+def summarise(levels, level_volumes, running, bucket: float, bands: tuple, share: float) -> dict:
+    """
+    levels/level_volumes: PROFILE_QUERY columns; running: VWAP_QUERY rows.
+    Prices are returned in currency units; a level covers [price, price + bucket).
+    """
+    if not running:
+        return {"volume": 0, "vwap": None, "stddev": None, "bands": {}, "poc": None,
+                "value_area": None, "profile": []}
+
+    _, volume, pv, pv2 = running[-1]
+    vwap, stddev = (float(x) for x in vwap_moments(volume, pv, pv2))
+    prices = np.asarray(levels, dtype=np.float64) / 100
+    volumes = np.asarray(level_volumes, dtype=np.float64)
+    poc, low, high = value_area(volumes, share)
+
+    return {
+        "volume": int(volume),
+        "vwap": vwap,
+        "stddev": stddev,
+        "bands": {f"{k:g}": {"lower": vwap - k * stddev, "upper": vwap + k * stddev} for k in bands},
+        "poc": float(prices[poc]),
+        "value_area": {
+            "low": float(prices[low]),
+            "high": float(prices[high] + bucket),
+            "volume_share": float(volumes[low:high + 1].sum() / volumes.sum()),
+        },
+        "profile": [{"price": float(p), "volume": int(v)} for p, v in zip(prices, volumes)],
+    }
+
+
+def band_series(running, bands: tuple) -> list:
+    """Anchored VWAP and its bands for every minute of the window."""
+    minutes = [row[0] for row in running]
+    vwap, stddev = vwap_moments([r[1] for r in running], [r[2] for r in running], [r[3] for r in running])
+    series = []
+    for i, minute in enumerate(minutes):
+        point = {"minute": minute, "vwap": float(vwap[i]), "stddev": float(stddev[i])}
+        for k in bands:
+            point[f"lower_{k:g}"] = float(vwap[i] - k * stddev[i])
+            point[f"upper_{k:g}"] = float(vwap[i] + k * stddev[i])
+        series.append(point)
+    return series
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Correction-Aware Trade Rollups
+
+A correction is a tick with an existing (symbol, seq_id) and a higher source_version.
+'ticks_dedup' collapses it, but 'trades_1m_mv' and 'trades_1m_venue_mv' aggregate
+every row they see, so the original and the correction are both in the rollups.
+
+The MVs stay as they are (ingest throughput is unchanged). This service then applies
+corrections to the trade rollups shortly after they arrive:
+
+  1. Every --interval seconds, find (symbol, seq_id) keys with more than one version
+     whose newest version arrived since the last pass. The lookup runs over 'ticks_all'
+     because a correction can land on a different shard than the original.
+  2. Collect every minute that holds any version of those keys. That is the minute of
+     the original and the minute of the correction, which can differ.
+  3. On every shard, delete those minutes from the rollups and rebuild them from the
+     shard's 'ticks_local' rows, minus versions superseded anywhere in the cluster.
+  4. Log the rebuilt (symbol, day) pairs in 'rollup_rewrites'.
+
+Summed over the shards, each affected minute then counts every trade exactly once, at
+its latest version. Minutes are only touched after --settle seconds, once the Buffer
+table has flushed them.
+
+A correction can reach back --lookback-hours (default 24h), so the minute of its
+original is usually finalised already and stored by the API bar store (after 180s).
+The bar store reads 'rollup_rewrites' and re-fetches the logged days.
+
+A VersionedCollapsingMergeTree with retract rows was considered, but sign-weighted sums
+only fix volume and VWAP. min/max/argMin/argMax states cannot be retracted, so OHLC
+would stay wrong. Rebuilding the affected minutes keeps all of OHLCV exact.
+
+Usage:
+    python apply_corrections.py                    # run forever
+    python apply_corrections.py --once --since 6   # one pass over the last 6 hours
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from repair_rollups import (
+    CLICKHOUSE_HOSTS, ROLLUPS, STATE_COLUMNS, STATE_SELECT, connect, not_superseded, record_rewrites,
+)
+
+# How far back a correction may reach for its original
+DEFAULT_LOOKBACK_HOURS = 24
+
+# Bound every ticks scan to the lookback window; the versions lookup uses the same one
+SCOPE = "event_time >= {lookback_start:DateTime64(6, 'UTC')} AND event_time < {until:DateTime64(6, 'UTC')}"
+
+AFFECTED_MINUTES_QUERY = f"""
+SELECT DISTINCT symbol, toStartOfMinute(event_time) AS minute
+FROM default.ticks_all
+WHERE {SCOPE}
+    AND (symbol, seq_id) GLOBAL IN (
+        SELECT symbol, seq_id
+        FROM default.ticks_all
+        WHERE {SCOPE}
+        GROUP BY symbol, seq_id
+        HAVING uniqExact(source_version) > 1 AND max(event_time) >= {{after:DateTime64(6, 'UTC')}}
+    )
+ORDER BY symbol, minute
+"""
+
+AFFECTED = "(symbol, minute) IN {minutes:Array(Tuple(String, DateTime('UTC')))}"
+
+
+def rebuild_query(table: str) -> str:
+    """Recomputes the affected minutes of one rollup from this shard's latest-version trades."""
+    keys = ROLLUPS[table]
+    return f"""
+    INSERT INTO default.{table} ({keys}, {STATE_COLUMNS})
+    SELECT
+        {keys.replace('minute', 'toStartOfMinute(event_time) AS minute')},
+        {STATE_SELECT}
+    FROM default.ticks_local
+    WHERE {SCOPE}
+        AND event_type = 'trade'
+        AND (symbol, toStartOfMinute(event_time)) IN {{minutes:Array(Tuple(String, DateTime('UTC')))}}
+        AND {not_superseded(SCOPE)}
+    GROUP BY {keys}
+    """
+
+
+def apply_pass(endpoints: list, after: datetime, until: datetime, lookback: timedelta) -> int:
+    """Corrects minutes for keys whose newest version falls in [after, until). Returns minutes rebuilt."""
+    clients = [connect(endpoint) for endpoint in endpoints]
+    params = {'after': after, 'until': until, 'lookback_start': after - lookback}
+
+    minutes = clients[0].execute(AFFECTED_MINUTES_QUERY, params)
+    if not minutes:
+        return 0
+    params['minutes'] = minutes
+
+    # Delete and rebuild shard by shard; every shard only rebuilds its own rows
+    for endpoint, client in zip(endpoints, clients):
+        for table in ROLLUPS:
+            client.execute(f"DELETE FROM default.{table} WHERE {AFFECTED}", params)
+            client.execute(rebuild_query(table), params)
+        print(f"  [OK] {endpoint}: rebuilt {len(minutes)} minute(s) in {', '.join(ROLLUPS)}")
+
+    # Only once every shard is rebuilt, so a bar store never re-fetches a half-corrected minute
+    record_rewrites(clients[0], minutes, "apply_corrections")
+    return len(minutes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply tick corrections to the trade rollups.")
+    parser.add_argument("--interval", type=int, default=15, help="Seconds between passes (default: 15)")
+    parser.add_argument("--settle", type=int, default=75,
+                        help="Only handle ticks older than this many seconds (default: 75)")
+    parser.add_argument("--lookback-hours", type=float, default=DEFAULT_LOOKBACK_HOURS,
+                        help=f"How old a corrected original may be (default: {DEFAULT_LOOKBACK_HOURS})")
+    parser.add_argument("--since", type=float, default=1,
+                        help="On start, handle corrections from this many hours back (default: 1)")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in CLICKHOUSE_HOSTS.split(",") if e.strip()]
+    lookback = timedelta(hours=args.lookback_hours)
+
+    print("=" * 60)
+    print(f"Correction Applier (settle {args.settle}s, lookback {args.lookback_hours}h)")
+    print("=" * 60)
+
+    # Rebuilding a minute is idempotent, so restarting with some overlap is safe
+    after = datetime.now(timezone.utc) - timedelta(hours=args.since)
+    try:
+        while True:
+            until = datetime.now(timezone.utc) - timedelta(seconds=args.settle)
+            until = until.replace(second=0, microsecond=0)
+            if until > after:
+                try:
+                    start = time.perf_counter()
+                    rebuilt = apply_pass(endpoints, after, until, lookback)
+                    print(f"[INFO] {after:%H:%M} .. {until:%H:%M}: {rebuilt} minute(s) corrected "
+                          f"({time.perf_counter() - start:.1f}s)")
+                    after = until
+                except Exception as e:
+                    # The window is retried on the next pass
+                    print(f"[ERROR] {e}")
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\nStopping correction applier...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Cold-Partition Archival Script
+
+Exports closed monthly partitions of 'ticks_local' to zstd-compressed Parquet
+(MinIO via s3(), or the server's user_files via file()), records them in
+'ticks_archive_manifest', and optionally drops them from ClickHouse.
+The API reads dropped partitions back from the archive when a backtest range needs them.
+
+'ticks_local' is a per-shard table, so every shard is archived separately.
+
+Usage:
+    python archive_partitions.py                  # export partitions older than 30 days
+    python archive_partitions.py --drop           # ...and drop them after verifying the export
+    python archive_partitions.py --dry-run        # only list what would be archived
+"""
+
+import argparse
+import os
+import sys
+from clickhouse_driver import Client
+
+# Where ClickHouse reaches the archive, shared with the API (api/archive.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+from archive import ARCHIVE_BACKEND, table_function  # noqa: E402
+
+# Configuration
+# One native-protocol endpoint per shard (docker-compose maps clickhouse-02 to 9001)
+CLICKHOUSE_HOSTS = os.environ.get("CLICKHOUSE_HOSTS", "localhost:9000,localhost:9001")
+CLICKHOUSE_DB = "default"
+
+TABLE = "ticks_local"
+
+# Whole partitions whose newest tick is older than the cutoff
+CLOSED_PARTITIONS_QUERY = """
+SELECT
+    partition_id,
+    sum(rows) AS rows
+FROM system.parts
+WHERE database = 'default'
+    AND table = 'ticks_local'
+    AND active
+GROUP BY partition_id
+HAVING max(max_time) < now() - INTERVAL {days:UInt32} DAY
+ORDER BY partition_id
+"""
+
+PARTITION_BOUNDS_QUERY = """
+SELECT count(), min(event_time), max(event_time)
+FROM default.ticks_local
+WHERE _partition_id = {partition_id:String}
+"""
+
+# Enums are written as strings so the files stay readable by any Parquet tool
+EXPORT_SELECT = """
+SELECT
+    exchange,
+    symbol,
+    event_time,
+    seq_id,
+    toString(event_type) AS event_type,
+    price,
+    size,
+    toString(side) AS side,
+    source_version
+FROM default.ticks_local
+WHERE _partition_id = {partition_id:String}
+ORDER BY symbol, event_time
+"""
+
+
+def connect(endpoint: str) -> Client:
+    host, _, port = endpoint.partition(":")
+    return Client(host=host, port=int(port or 9000), database=CLICKHOUSE_DB, user='default', password='')
+
+
+def record(client: Client, partition_id: str, shard: str, path: str, rows: int, min_time, max_time, dropped: int):
+    """Writes (or replaces) the manifest entry for one partition."""
+    client.execute(
+        "INSERT INTO default.ticks_archive_manifest "
+        "(table, partition_id, shard, path, rows, min_time, max_time, dropped) VALUES",
+        [(TABLE, partition_id, shard, path, rows, min_time, max_time, dropped)]
+    )
+
+
+def archive_partition(client: Client, shard: str, partition_id: str, drop: bool) -> bool:
+    """Exports one partition, verifies the row count, records it and optionally drops it."""
+    path = f"{TABLE}/{partition_id}_shard{shard}.parquet"
+    params = {'partition_id': partition_id}
+
+    (rows, min_time, max_time), = client.execute(PARTITION_BOUNDS_QUERY, params)
+    print(f"  [INFO] {partition_id}: {rows:,} rows -> {path}")
+
+    truncate = "s3_truncate_on_insert" if ARCHIVE_BACKEND == "s3" else "engine_file_truncate_on_insert"
+    client.execute(
+        f"INSERT INTO FUNCTION {table_function(path)} {EXPORT_SELECT}",
+        params,
+        settings={
+            'output_format_parquet_compression_method': 'zstd',
+            truncate: 1,
+        }
+    )
+
+    # Never drop data we cannot read back
+    (exported,), = client.execute(f"SELECT count() FROM {table_function(path)}")
+    if exported != rows:
+        print(f"  [FAILED] {partition_id}: exported {exported:,} rows, expected {rows:,}")
+        return False
+
+    record(client, partition_id, shard, path, rows, min_time, max_time, dropped=0)
+
+    if drop:
+        # partition_id comes from system.parts (e.g. '202409'); DDL takes it as a literal
+        if not partition_id.isalnum():
+            raise ValueError(f"Unexpected partition id: {partition_id!r}")
+        client.execute(f"ALTER TABLE default.{TABLE} DROP PARTITION ID '{partition_id}'")
+        record(client, partition_id, shard, path, rows, min_time, max_time, dropped=1)
+        print(f"  [OK] {partition_id}: archived and dropped")
+    else:
+        print(f"  [OK] {partition_id}: archived (still served from ClickHouse)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed ticks_local partitions to Parquet.")
+    parser.add_argument("--older-than-days", type=int, default=30,
+                        help="Only partitions whose newest tick is older than this (default: 30)")
+    parser.add_argument("--drop", action="store_true", help="Drop partitions after a verified export")
+    parser.add_argument("--dry-run", action="store_true", help="List partitions without exporting")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Cold-Partition Archival ({ARCHIVE_BACKEND})")
+    print("=" * 60)
+
+    failed = 0
+    for endpoint in CLICKHOUSE_HOSTS.split(","):
+        try:
+            client = connect(endpoint.strip())
+            (shard,), = client.execute("SELECT getMacro('shard')")
+        except Exception as e:
+            print(f"[ERROR] Could not connect to {endpoint}: {e}")
+            failed += 1
+            continue
+
+        partitions = client.execute(CLOSED_PARTITIONS_QUERY, {'days': args.older_than_days})
+        print(f"\n[INFO] {endpoint} (shard {shard}): {len(partitions)} closed partition(s)")
+
+        for partition_id, rows in partitions:
+            if args.dry_run:
+                print(f"  [DRY-RUN] {partition_id}: {rows:,} rows")
+                continue
+            try:
+                if not archive_partition(client, shard, partition_id, args.drop):
+                    failed += 1
+            except Exception as e:
+                print(f"  [FAILED] {partition_id}: {e}")
+                failed += 1
+
+    if failed:
+        print(f"\n[ERROR] {failed} failure(s)")
+        sys.exit(1)
+    print("\n[SUCCESS] Archival complete")
+
+
+if __name__ == "__main__":
+    main()
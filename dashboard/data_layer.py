@@ -0,0 +1,174 @@
+"""
+Dashboard data layer.
+
+Every Streamlit rerun re-executes the whole script, so anything fetched or parsed
+here is cached:
+
+- One keep-alive requests.Session per dashboard process (st.cache_resource).
+- Successful GET responses cached for a short TTL (st.cache_data), keyed on endpoint
+  + params; errors are returned but not cached.
+- Bars are requested with format=columnar and turned into a DataFrame straight
+  from the column lists, instead of one dict per row plus pd.to_numeric per column.
+- The benchmark CSV is re-read only when its modification time changes.
+- Live charts keep their bars in st.session_state and only ask for minutes from
+  the last bar shown onwards.
+"""
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_BASE_URL = "http://localhost:8000"
+
+# For read-only endpoints whose results change slowly (e.g. /stats/compression)
+API_CACHE_TTL_SECONDS = 30
+
+BAR_DTYPES = {
+    "open": "float64",
+    "high": "float64",
+    "low": "float64",
+    "close": "float64",
+    "volume": "uint64",
+    "vwap": "float64",
+}
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Pooled keep-alive connections to the API, shared by all reruns and users."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+
+def fetch_api_data(endpoint: str, params: dict = None, timeout: int = 60):
+    """Calls the API and returns the JSON response (or an error dict)."""
+    try:
+        response = get_session().get(f"{API_BASE_URL}{endpoint}", params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.ConnectionError:
+        return {"error": "ConnectionError", "detail": "Could not connect to the API. Is it running?"}
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e), "detail": f"API request failed: {e}"}
+
+
+def post_api_data(endpoint: str, payload: dict, timeout: int = 60):
+    """POST counterpart of fetch_api_data (never cached)."""
+    try:
+        response = get_session().post(f"{API_BASE_URL}{endpoint}", json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.ConnectionError:
+        return {"error": "ConnectionError", "detail": "Could not connect to the API. Is it running?"}
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e), "detail": f"API request failed: {e}"}
+
+
+class _FetchFailed(Exception):
+    """Carries an error dict out of _fetch_successful, so st.cache_data does not keep it."""
+
+
+@st.cache_data(ttl=API_CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_successful(endpoint: str, params: tuple):
+    result = fetch_api_data(endpoint, dict(params))
+    if "error" in result:
+        raise _FetchFailed(result)
+    return result
+
+
+def fetch_cached(endpoint: str, params: tuple):
+    """
+    fetch_api_data behind a TTL cache; 'params' is a sorted tuple so it can be hashed.
+    Only successful responses are cached, so the next rerun retries a failed call.
+    """
+    try:
+        return _fetch_successful(endpoint, params)
+    except _FetchFailed as e:
+        return e.args[0]
+
+
+def bars_frame(result: dict) -> pd.DataFrame:
+    """
+    DataFrame from a format=columnar bar response, oldest bar first.
+    'minute' arrives as unix seconds (/bars/cached) or ISO strings (/backtest/fast).
+    """
+    columns = result.get("columns") or {}
+    if not columns or not columns.get("minute"):
+        return pd.DataFrame(columns=["minute", *BAR_DTYPES])
+
+    df = pd.DataFrame(columns)
+    if pd.api.types.is_integer_dtype(df["minute"]):
+        df["minute"] = pd.to_datetime(df["minute"], unit="s", utc=True)
+    else:
+        df["minute"] = pd.to_datetime(df["minute"], utc=True)
+    df = df.astype({name: dtype for name, dtype in BAR_DTYPES.items() if name in df.columns})
+    return df.sort_values("minute", ignore_index=True)
+
+
+def rows_frame(data: list) -> pd.DataFrame:
+    """DataFrame from a row-dict response ('data'), for endpoints without format=columnar."""
+    df = pd.DataFrame(data)
+    if "minute" in df.columns:
+        df["minute"] = pd.to_datetime(df["minute"], utc=True)
+        df = df.sort_values("minute", ignore_index=True)
+    return df
+
+
+def refresh_bars(key: str, symbol: str, window_minutes: int, max_points: int = None):
+    """
+    Returns (bars, error) for a live chart, keeping the bars in st.session_state[key].
+    The first call loads the whole window; later calls request only minutes from the
+    last bar shown onwards. That last bar may still be forming, so it is replaced.
+    With 'max_points' the API re-buckets the candles; the bucket depends only on the
+    window, so incremental refreshes line up with the bars already shown.
+    """
+    settings = (symbol, window_minutes, max_points)
+    state = st.session_state.get(key)
+    if state is None or state["settings"] != settings:
+        state = {"settings": settings, "bars": None}
+
+    old = state["bars"]
+    params = {"symbol": symbol, "limit": window_minutes, "format": "columnar"}
+    if max_points:
+        params["max_points"] = max_points
+    if old is not None and len(old):
+        params["start"] = old["minute"].iloc[-1].isoformat()
+
+    result = fetch_api_data("/bars/cached", params)
+    if "error" in result:
+        return old, result["detail"]
+
+    new = bars_frame(result)
+    if "start" not in params:
+        bars = new
+    elif len(new):
+        bars = pd.concat([old[old["minute"] < new["minute"].iloc[0]], new], ignore_index=True)
+    else:
+        bars = old
+
+    if len(bars):
+        bars = bars[bars["minute"] > bars["minute"].iloc[-1] - timedelta(minutes=window_minutes)]
+        bars = bars.reset_index(drop=True)
+    state["bars"] = bars
+    st.session_state[key] = state
+    return bars, None
+
+
+@st.cache_data(show_spinner=False)
+def _read_benchmark_csv(path: str, mtime: float) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+def load_benchmark_history(path: Path) -> pd.DataFrame:
+    """Benchmark CSV, parsed once per file modification."""
+    if not path.exists():
+        return pd.DataFrame()
+    try:
+        # st.cache_data hands out a copy, so callers may add columns
+        return _read_benchmark_csv(str(path), path.stat().st_mtime)
+    except Exception:
+        return pd.DataFrame()
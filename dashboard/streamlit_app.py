@@ -1,5 +1,4 @@
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.graph_objects as go
 import time
@@ -7,6 +6,10 @@ import os
 from datetime import datetime
 from pathlib import Path
 import csv
+from data_layer import (
+    fetch_api_data, fetch_cached, post_api_data,
+    bars_frame, rows_frame, refresh_bars, load_benchmark_history,
+)
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -15,15 +18,15 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- API Configuration ---
-API_BASE_URL = "http://localhost:8000"
-
 # --- Results Directory ---
 RESULTS_DIR = Path("../results")
 RESULTS_DIR.mkdir(exist_ok=True)
 BENCHMARK_CSV = RESULTS_DIR / "benchmark.csv"
 COMPRESSION_TXT = RESULTS_DIR / "compression_stats.txt"
 
+# Candles per chart; wider ranges are re-bucketed by the API (max_points)
+CHART_MAX_POINTS = 500
+
 # --- Helper Functions ---
 
 def save_benchmark_result(query_type: str, symbol: str, query_time_ms: float, rows_returned: int = 0, total_rows: int = 0):
@@ -45,39 +48,11 @@ def save_benchmark_result(query_type: str, symbol: str, query_time_ms: float, ro
             ''  # speedup calculated later
         ])
 
-def load_benchmark_history():
-    """Load benchmark history from CSV."""
-    if BENCHMARK_CSV.exists():
-        try:
-            df = pd.read_csv(BENCHMARK_CSV)
-            return df
-        except:
-            return pd.DataFrame()
-    return pd.DataFrame()
-
-def fetch_api_data(endpoint: str, params: dict):
-    """Helper function to call our FastAPI and return the JSON response."""
-    try:
-        response = requests.get(f"{API_BASE_URL}{endpoint}", params=params, timeout=60)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.ConnectionError:
-        return {"error": "ConnectionError", "detail": "Could not connect to the API. Is it running?"}
-    except requests.exceptions.RequestException as e:
-        return {"error": str(e), "detail": f"API request failed: {e}"}
-
-def create_candlestick_chart(data: list):
-    """Creates a Plotly Candlestick chart from our API data."""
-    if not data:
+def create_candlestick_chart(df: pd.DataFrame):
+    """Creates a Plotly Candlestick chart from a bar DataFrame (see data_layer)."""
+    if df.empty:
         return go.Figure()
 
-    df = pd.DataFrame(data)
-    df['minute'] = pd.to_datetime(df['minute'])
-    df['open'] = pd.to_numeric(df['open'])
-    df['high'] = pd.to_numeric(df['high'])
-    df['low'] = pd.to_numeric(df['low'])
-    df['close'] = pd.to_numeric(df['close'])
-    
     fig = go.Figure(data=[go.Candlestick(
         x=df['minute'],
         open=df['open'],
@@ -104,7 +79,7 @@ st.subheader("Powered by ClickHouse, Kafka, and FastAPI")
 st.sidebar.title("Navigation")
 page = st.sidebar.radio(
     "Choose a page:",
-    ["Benchmarks", "Query Tester", "History", "Compression Stats"]
+    ["Benchmarks", "Live Chart", "Query Tester", "History", "Compression Stats"]
 )
 
 if page == "Benchmarks":
@@ -146,14 +121,14 @@ if page == "Benchmarks":
                 st.success("✅ Result saved to benchmark.csv")
                 
                 with st.expander("Show Chart"):
-                    fig = create_candlestick_chart(slow_result.get('data', []))
+                    fig = create_candlestick_chart(rows_frame(slow_result.get('data', [])))
                     st.plotly_chart(fig, use_container_width=True)
     
     # --- Run Fast Query ---
     with col_fast:
         if st.button("Run FAST Query (Rollup)", type="primary", use_container_width=True):
             with st.spinner(f"Running fast query for {symbol}..."):
-                params = {"symbol": symbol, "limit": limit}
+                params = {"symbol": symbol, "limit": limit, "format": "columnar"}
                 fast_result = fetch_api_data("/backtest/fast", params)
                 
             if "error" in fast_result:
@@ -167,7 +142,14 @@ if page == "Benchmarks":
                 st.success("✅ Result saved to benchmark.csv")
                 
                 with st.expander("Show Chart"):
-                    fig = create_candlestick_chart(fast_result.get('data', []))
+                    # Timed result above is full resolution; the chart asks for at most CHART_MAX_POINTS candles
+                    chart_result = fast_result
+                    if limit > CHART_MAX_POINTS:
+                        chart_result = fetch_cached("/backtest/fast", (
+                            ("format", "columnar"), ("limit", limit),
+                            ("max_points", CHART_MAX_POINTS), ("symbol", symbol),
+                        ))
+                    fig = create_candlestick_chart(bars_frame(chart_result))
                     st.plotly_chart(fig, use_container_width=True)
     
     # --- Compare Results ---
@@ -227,6 +209,41 @@ if page == "Benchmarks":
             save_benchmark_result("dedup_raw", dedup_symbol, result_raw['query_time_ms'], 0, result_raw['count'])
             save_benchmark_result("dedup_final", dedup_symbol, result_final['query_time_ms'], 0, result_final['count'])
 
+elif page == "Live Chart":
+    st.header("📡 Live 1-Minute Chart")
+    st.write("Bars from `/bars/cached`. Each refresh only fetches minutes from the last bar shown onwards.")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        live_symbol = st.text_input("Enter Symbol:", "AAPL", key="live_symbol").upper()
+    with col2:
+        window = st.number_input("Window (minutes):", 30, 10080, 1440, key="live_window")
+    with col3:
+        max_points = st.number_input("Max candles:", 50, 2000, 500, key="live_max_points")
+    with col4:
+        refresh_seconds = st.number_input("Refresh every (seconds):", 2, 300, 10, key="live_refresh")
+
+    # Only this fragment reruns on the timer, not the whole page
+    @st.fragment(run_every=refresh_seconds)
+    def live_chart():
+        start_time = time.perf_counter()
+        bars, error = refresh_bars("live_bars", live_symbol, int(window), int(max_points))
+        elapsed = (time.perf_counter() - start_time) * 1000
+
+        if error:
+            st.error(f"Error: {error}")
+        if bars is None or bars.empty:
+            st.info("No bars yet for this symbol.")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Bars", f"{len(bars):,}")
+        col2.metric("Last Close", f"{bars['close'].iloc[-1]:.2f}")
+        col3.metric("Refresh Time", f"{elapsed:.1f} ms")
+        st.plotly_chart(create_candlestick_chart(bars), use_container_width=True)
+
+    live_chart()
+
 elif page == "Query Tester":
     st.header("🔍 Custom Query Tester")
     st.write("Test any ClickHouse query and see results. Results are automatically saved.")
@@ -274,13 +291,7 @@ ORDER BY total_volume DESC
                 start_time = time.perf_counter()
                 try:
                     # Call API with custom query
-                    response = requests.post(
-                        f"{API_BASE_URL}/query/custom",
-                        json={"query": query},
-                        timeout=60
-                    )
-                    response.raise_for_status()
-                    result = response.json()
+                    result = post_api_data("/query/custom", {"query": query})
                     elapsed = (time.perf_counter() - start_time) * 1000
                     
                     if "error" in result:
@@ -307,8 +318,6 @@ ORDER BY total_volume DESC
                         else:
                             st.info("Query executed successfully but returned no data.")
                             
-                except requests.exceptions.ConnectionError:
-                    st.error("Could not connect to API. Make sure it's running on http://localhost:8000")
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
 
@@ -316,7 +325,7 @@ elif page == "History":
     st.header("📈 Benchmark History")
     st.write("View all saved benchmark results")
     
-    df = load_benchmark_history()
+    df = load_benchmark_history(BENCHMARK_CSV)
     
     if df.empty:
         st.info("No benchmark results yet. Run some queries to see history here.")
@@ -386,9 +395,7 @@ elif page == "Compression Stats":
     if st.button("Fetch Compression Stats"):
         with st.spinner("Fetching compression statistics..."):
             try:
-                response = requests.get(f"{API_BASE_URL}/stats/compression", timeout=30)
-                response.raise_for_status()
-                result = response.json()
+                result = fetch_cached("/stats/compression", ())
                 
                 if "error" in result:
                     st.error(f"Error: {result['detail']}")
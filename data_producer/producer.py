@@ -73,7 +73,10 @@ def main():
             if seq_id % 1000 == 0:
                 print(f"Sent {seq_id} ticks...")
 
-            seq_id += 1
+            # Corrections reuse an old seq_id, so only original ticks advance the
+            # sequence. Any gap downstream then means a lost tick (GET /quality/sequence).
+            if tick["source_version"] == 1:
+                seq_id += 1
             time.sleep(0.0005)  # ~2000 ticks per second
     except KeyboardInterrupt:
         print("\n\nStopping producer...")
@@ -227,3 +227,49 @@ WHERE event_type = 'trade'
 GROUP BY symbol
 ORDER BY total_volume DESC;
 
+-- ============================================================
+-- 11. TCA - ALIGN TRADES WITH THE PREVAILING QUOTE (ASOF JOIN)
+-- ============================================================
+-- Quotes are one-sided: side = 'buy' is the bid, side = 'sell' is the ask.
+-- Both subqueries filter on (symbol, event_time), the prefix of the sort key.
+
+SELECT
+    t.event_time AS trade_time,
+    t.price AS price,
+    b.price AS bid,
+    a.price AS ask,
+    a.price - b.price AS spread
+FROM
+(
+    SELECT symbol, event_time, price FROM default.ticks_all
+    WHERE symbol = 'AAPL' AND event_type = 'trade' AND event_time >= now() - INTERVAL 1 HOUR
+) AS t
+ASOF LEFT JOIN
+(
+    SELECT symbol, event_time, price FROM default.ticks_all
+    WHERE symbol = 'AAPL' AND event_type = 'quote' AND side = 'buy' AND event_time >= now() - INTERVAL 65 MINUTE
+) AS b ON t.symbol = b.symbol AND t.event_time >= b.event_time
+ASOF LEFT JOIN
+(
+    SELECT symbol, event_time, price FROM default.ticks_all
+    WHERE symbol = 'AAPL' AND event_type = 'quote' AND side = 'sell' AND event_time >= now() - INTERVAL 65 MINUTE
+) AS a ON t.symbol = a.symbol AND t.event_time >= a.event_time
+ORDER BY trade_time
+LIMIT 100
+SETTINGS join_use_nulls = 1;
+
+-- ============================================================
+-- 12. QUOTE ACTIVITY (from quotes_1m_agg rollup - FAST)
+-- ============================================================
+
+SELECT
+    minute,
+    exchange,
+    sumMerge(quote_count) AS quotes,
+    avgIfMerge(twap_mid) AS twap_mid,
+    argMaxMerge(last_ask) - argMaxMerge(last_bid) AS last_spread
+FROM default.quotes_1m_agg
+WHERE symbol = 'AAPL'
+GROUP BY symbol, minute, exchange
+ORDER BY minute DESC, exchange
+LIMIT 100;
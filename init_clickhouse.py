@@ -31,6 +31,18 @@ SQL_FILES = [
     "sql_schema/07_trades_1m_agg.sql",
     "sql_schema/08_trades_1m_mv.sql",
     "sql_schema/09_local_to_dedup_mv.sql",
+    "sql_schema/10_quotes_1m_agg.sql",
+    "sql_schema/11_quotes_1m_mv.sql",
+    "sql_schema/12_trades_1m_venue_agg.sql",
+    "sql_schema/13_trades_1m_venue_mv.sql",
+    "sql_schema/14_ticks_sketch_1m_agg.sql",
+    "sql_schema/15_ticks_sketch_1m_mv.sql",
+    "sql_schema/16_ticks_local_tiered_storage.sql",
+    "sql_schema/17_ticks_seq_1m_agg.sql",
+    "sql_schema/18_ticks_seq_1m_mv.sql",
+    "sql_schema/19_trades_profile_1m_agg.sql",
+    "sql_schema/20_trades_profile_1m_mv.sql",
+    "sql_schema/21_rollup_rewrites.sql",
 ]
 
 
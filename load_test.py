@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+API Load Test
+
+test_queries.py sends one request at a time. This script drives the FastAPI service
+with many concurrent virtual users, to see how it behaves with 100+ dashboard and
+backtest users sharing its single ClickHouse client.
+
+- Every virtual user loops: pick an endpoint from the mix, send it, sleep a think time.
+- The number of active users follows a ramp profile, e.g. "0:0,30:100,90:100,100:0"
+  (seconds:users, linear in between).
+- Every --report seconds it prints throughput, latency percentiles and error rate.
+  All intervals plus a per-endpoint summary go to results/load_test_<timestamp>.csv.
+
+Runs are reproducible: --seed fixes the request mix and think times, and --load-data
+ingests a deterministic tick set (symbols LT0..LTn) through POST /ingest/ticks, so
+every run queries the same data. The set starts at 14:30 UTC on --date (pinned by
+default; it has to stay inside the rollups' 2-year TTL), so the same seed and date give
+the same rows. Loading is idempotent: if the set is already there it is skipped, and
+if other rows occupy its slot (an interrupted load, another seed) the load stops rather
+than count ticks twice in the rollups.
+
+Only the standard library is used (asyncio streams, HTTP/1.1 keep-alive), so the
+client machine needs nothing installed.
+
+Usage:
+    python load_test.py --load-data                       # seeds the dataset; no-op once loaded
+    python load_test.py --ramp 0:0,30:100,120:100 --mix fast=6,slow=1,dedup=2,custom=1
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+API_BASE_URL = "http://localhost:8000"
+RESULTS_DIR = Path("results")
+
+# Seeded dataset: fixed symbols and a pinned day, so every run sees the same rows
+DATASET_SYMBOLS = [f"LT{i}" for i in range(8)]
+DATASET_DATE = "2026-10-12"
+DATASET_SEQ_BASE = 10**12  # far from the live producer's seq_ids
+# Under the API's INGEST_MAX_BATCH; only the last batch waits for ack=committed
+DATASET_BATCH = 50_000
+
+DEFAULT_MIX = "fast=6,slow=1,dedup=2,custom=1"
+
+
+def build_request(kind: str, rng: random.Random):
+    """(method, path, params, body) for one request of the given kind."""
+    symbol = rng.choice(DATASET_SYMBOLS)
+    if kind == "fast":
+        return "GET", "/backtest/fast", {"symbol": symbol, "limit": rng.choice([100, 500, 1000])}, None
+    if kind == "slow":
+        return "GET", "/backtest/slow", {"symbol": symbol, "limit": 100}, None
+    if kind == "dedup":
+        endpoint = rng.choice(["/dedup/raw_count", "/dedup/final_count"])
+        return "GET", endpoint, {"symbol": symbol}, None
+    if kind == "custom":
+        query = (
+            "SELECT symbol, count() AS trades, sum(size) AS volume FROM default.ticks_all "
+            f"WHERE symbol = '{symbol}' AND event_type = 'trade' GROUP BY symbol"
+        )
+        return "POST", "/query/custom", None, {"query": query}
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+def parse_mix(text: str) -> list:
+    mix = []
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        build_request(kind.strip(), random.Random(0))  # validates the kind
+        mix.append((kind.strip(), float(weight or 1)))
+    return mix
+
+
+def parse_ramp(text: str) -> list:
+    points = sorted((float(t), int(u)) for t, u in (p.split(":") for p in text.split(",")))
+    if not points or points[0][0] != 0:
+        points.insert(0, (0.0, 0))
+    return points
+
+
+def users_at(ramp: list, elapsed: float) -> int:
+    """Target active users at 'elapsed' seconds (linear between ramp points)."""
+    for (t0, u0), (t1, u1) in zip(ramp, ramp[1:]):
+        if t0 <= elapsed < t1:
+            return round(u0 + (u1 - u0) * (elapsed - t0) / (t1 - t0))
+    return ramp[-1][1]
+
+
+def percentile(sorted_values: list, p: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# --- Minimal HTTP/1.1 client (one keep-alive connection per virtual user) ---
+
+class Connection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, params: dict = None, body: dict = None):
+        """Returns (status, response bytes). Reconnects once if the server closed the socket."""
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout
+                )
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, params, body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt:
+                    raise
+
+    async def _exchange(self, method, path, params, body):
+        target = path + ("?" + urlencode(params) if params else "")
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (
+            f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+        )
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            self.close()
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+# --- Load test ---
+
+class Recorder:
+    """Collects (finish time, endpoint, latency ms, ok) per request."""
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, endpoint: str, latency_ms: float, ok: bool):
+        self.samples.append((time.monotonic(), endpoint, latency_ms, ok))
+
+
+async def virtual_user(user_id: int, args, mix: list, recorder: Recorder, stop: asyncio.Event):
+    rng = random.Random(f"{args.seed}-{user_id}")
+    kinds, weights = zip(*mix)
+    base = urlsplit(args.url)
+    connection = Connection(base.hostname, base.port or 80, args.timeout)
+    try:
+        while not stop.is_set():
+            kind = rng.choices(kinds, weights)[0]
+            method, path, params, body = build_request(kind, rng)
+            start = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path, params, body)
+                ok = 200 <= status < 300
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                connection.close()
+                ok = False
+            recorder.add(path, (time.perf_counter() - start) * 1000, ok)
+
+            # Exponential think time, cut short when the user is ramped down
+            think = rng.expovariate(1 / args.think) if args.think > 0 else 0
+            try:
+                await asyncio.wait_for(stop.wait(), think)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        connection.close()
+
+
+def interval_row(samples: list, t: float, users: int, seconds: float) -> dict:
+    latencies = sorted(s[2] for s in samples)
+    errors = sum(1 for s in samples if not s[3])
+    return {
+        "t": round(t, 1),
+        "users": users,
+        "requests": len(samples),
+        "rps": round(len(samples) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p90_ms": round(percentile(latencies, 90), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+    }
+
+
+async def run_load(args, mix: list, ramp: list) -> tuple:
+    recorder = Recorder()
+    users = []  # (task, stop event), newest last
+    retired = []  # ramped-down users still finishing their last request
+    duration = args.duration or ramp[-1][0]
+    started = time.monotonic()
+    next_report, reported = started + args.report, 0
+    intervals = []
+
+    print(f"{'t(s)':>6} {'users':>6} {'req/s':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'errors':>7}")
+    while (now := time.monotonic()) - started < duration:
+        target = users_at(ramp, now - started)
+        while len(users) < target:
+            stop = asyncio.Event()
+            users.append((asyncio.create_task(virtual_user(len(users), args, mix, recorder, stop)), stop))
+        while len(users) > target:
+            task, stop = users.pop()
+            stop.set()
+            retired.append(task)
+
+        if now >= next_report:
+            window = recorder.samples[reported:]
+            reported = len(recorder.samples)
+            row = interval_row(window, now - started, len(users), args.report)
+            intervals.append(row)
+            print(f"{row['t']:>6} {row['users']:>6} {row['rps']:>8} {row['p50_ms'] or '-':>8} "
+                  f"{row['p90_ms'] or '-':>8} {row['p99_ms'] or '-':>8} {row['error_rate'] * 100:>6.1f}%")
+            next_report += args.report
+        await asyncio.sleep(0.1)
+
+    for task, stop in users:
+        stop.set()
+    await asyncio.gather(*(task for task, _ in users), *retired, return_exceptions=True)
+    return recorder.samples, intervals
+
+
+def summarise(samples: list, elapsed: float) -> list:
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample[1], []).append(sample)
+    rows = []
+    for endpoint, endpoint_samples in sorted(by_endpoint.items()) + [("ALL", samples)]:
+        row = interval_row(endpoint_samples, elapsed, 0, elapsed)
+        rows.append({"endpoint": endpoint, **{k: row[k] for k in row if k not in ("t", "users")}})
+    return rows
+
+
+# --- Seeded dataset ---
+
+DATASET_CHECK_QUERY = """
+SELECT count() AS ticks, sum(size) AS size
+FROM default.ticks_all
+WHERE symbol IN ({symbols})
+    AND event_time >= '{start:%Y-%m-%d %H:%M:%S.%f}' AND event_time < '{end:%Y-%m-%d %H:%M:%S.%f}'
+    AND seq_id > {seq_base}
+"""
+
+
+def dataset_start(day: str = DATASET_DATE) -> datetime:
+    """14:30 UTC on 'day' (YYYY-MM-DD)."""
+    return datetime.combine(date.fromisoformat(day), dt_time(14, 30), timezone.utc)
+
+
+def dataset_batches(seed: int, ticks: int, start: datetime):
+    """Deterministic ticks for DATASET_SYMBOLS, ~1% corrections, in ingest-sized batches."""
+    rng = random.Random(seed)
+    prices = {symbol: 100 + 20 * i for i, symbol in enumerate(DATASET_SYMBOLS)}
+    batch, recent = [], []
+    for seq_id in range(1, ticks + 1):
+        symbol = rng.choice(DATASET_SYMBOLS)
+        prices[symbol] = max(1.0, prices[symbol] * (1 + rng.gauss(0, 0.0005)))
+        tick = {
+            "exchange": rng.choice(["NASDAQ", "NYSE"]),
+            "symbol": symbol,
+            "event_time": (start + timedelta(milliseconds=seq_id * 50)).isoformat(),
+            "seq_id": DATASET_SEQ_BASE + seq_id,
+            "event_type": rng.choices(["trade", "quote", "book"], [8, 1, 1])[0],
+            "price": round(prices[symbol], 2),
+            "size": rng.randint(1, 500),
+            "side": rng.choice(["buy", "sell"]),
+            "source_version": 1,
+        }
+        if recent and rng.random() < 0.01:
+            tick = dict(rng.choice(recent), price=tick["price"], source_version=rng.randint(2, 100))
+        else:
+            recent = (recent + [tick])[-100:]
+        batch.append(tick)
+        if len(batch) == DATASET_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def loaded_rows(connection: Connection, start: datetime, ticks: int) -> tuple:
+    """(ticks, total size) already stored in the dataset's slot, read through /query/custom."""
+    # Ticks are 50ms apart, so the set ends within this window
+    end = start + timedelta(milliseconds=(ticks + 1) * 50)
+    query = DATASET_CHECK_QUERY.format(symbols=", ".join(f"'{s}'" for s in DATASET_SYMBOLS),
+                                       start=start, end=end, seq_base=DATASET_SEQ_BASE)
+    status, data = await connection.request("POST", "/query/custom", None, {"query": query})
+    if status != 200:
+        raise RuntimeError(f"dataset check failed with HTTP {status}: {data[:200]!r}")
+    [row] = json.loads(data)["data"]
+    return int(row["ticks"]), int(row["size"])
+
+
+async def load_dataset(args):
+    """
+    Skips the load when the same set is already stored (same tick count and total size).
+    Batches go in with ack=buffered, so the API coalesces them into full blocks.
+    The buffer flushes in order, so a committed last batch means every batch is in.
+    """
+    base = urlsplit(args.url)
+    connection = Connection(base.hostname, base.port or 80, 300)
+    start = dataset_start(args.date)
+    batches = math.ceil(args.ticks / DATASET_BATCH)
+    sent = 0
+    try:
+        stored = await loaded_rows(connection, start, args.ticks)
+        if stored != (0, 0):
+            expected = (args.ticks, sum(t["size"] for b in dataset_batches(args.seed, args.ticks, start) for t in b))
+            if stored == expected:
+                print(f"  [OK] dataset already loaded ({stored[0]:,} ticks), nothing to do")
+                return
+            raise RuntimeError(
+                f"{stored[0]:,} other ticks of {', '.join(DATASET_SYMBOLS)} are already stored at {start:%Y-%m-%d}. "
+                f"Pick another --date, or delete them from the ticks and rollup tables first"
+            )
+        for index, batch in enumerate(dataset_batches(args.seed, args.ticks, start)):
+            ack = "committed" if index == batches - 1 else "buffered"
+            while True:
+                status, data = await connection.request("POST", "/ingest/ticks", {"ack": ack}, {"ticks": batch})
+                if status != 429:
+                    break
+                await asyncio.sleep(1)  # buffer full: wait for the flusher to catch up
+            if status != 200:
+                raise RuntimeError(f"ingest failed with HTTP {status}: {data[:200]!r}")
+            sent += len(batch)
+            print(f"  [OK] {sent:,} / {args.ticks:,} ticks ({ack})")
+    finally:
+        connection.close()
+
+
+def write_csv(path: Path, intervals: list, summary: list):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["section", "key", "users", "requests", "rps", "p50_ms", "p90_ms", "p99_ms", "error_rate"])
+        for row in intervals:
+            writer.writerow(["interval", row["t"], row["users"], row["requests"], row["rps"],
+                             row["p50_ms"], row["p90_ms"], row["p99_ms"], row["error_rate"]])
+        for row in summary:
+            writer.writerow(["summary", row["endpoint"], "", row["requests"], row["rps"],
+                             row["p50_ms"], row["p90_ms"], row["p99_ms"], row["error_rate"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the analytics API.")
+    parser.add_argument("--url", default=API_BASE_URL, help=f"API base URL (default: {API_BASE_URL})")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--ramp", default="0:0,30:100,90:100,100:0", help="seconds:users points")
+    parser.add_argument("--duration", type=float, help="Seconds to run (default: last ramp point)")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean think time in seconds (default: 1.0)")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--report", type=float, default=5, help="Seconds per report interval")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the request mix and dataset")
+    parser.add_argument("--load-data", action="store_true", help="Ingest the seeded dataset and exit")
+    parser.add_argument("--ticks", type=int, default=500_000, help="Ticks in the seeded dataset")
+    parser.add_argument("--date", default=DATASET_DATE,
+                        help=f"UTC day of the seeded dataset, YYYY-MM-DD (default: {DATASET_DATE})")
+    args = parser.parse_args()
+
+    try:
+        dataset_start(args.date)
+    except ValueError:
+        parser.error("--date must be YYYY-MM-DD")
+
+    if args.load_data:
+        print(f"[INFO] Loading seeded dataset ({args.ticks:,} ticks, seed {args.seed}, from {dataset_start(args.date):%Y-%m-%d %H:%M} UTC)...")
+        asyncio.run(load_dataset(args))
+        return
+
+    mix, ramp = parse_mix(args.mix), parse_ramp(args.ramp)
+    print("=" * 70)
+    print(f"API LOAD TEST  {args.url}  mix {args.mix}  ramp {args.ramp}  seed {args.seed}")
+    print("=" * 70)
+
+    started = time.monotonic()
+    samples, intervals = asyncio.run(run_load(args, mix, ramp))
+    summary = summarise(samples, time.monotonic() - started)
+
+    print("\n" + "=" * 70)
+    print(f"{'endpoint':<22} {'requests':>9} {'req/s':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'errors':>7}")
+    for row in summary:
+        print(f"{row['endpoint']:<22} {row['requests']:>9} {row['rps']:>8} {row['p50_ms'] or '-':>8} "
+              f"{row['p90_ms'] or '-':>8} {row['p99_ms'] or '-':>8} {row['error_rate'] * 100:>6.1f}%")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    write_csv(path, intervals, summary)
+    print(f"\nResults saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
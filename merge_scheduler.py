@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Background Merge Scheduler
+
+'ticks_dedup' and the rollup tables rely on background merges. Until a partition's parts
+are merged, reads pay for it: 'FINAL' has to collapse rows across parts, and '...Merge'
+GROUP BYs combine many partial states. That is why the dedup_final timings in
+results/benchmark.csv swing between ~43 and ~113 ms.
+
+This service watches active part counts in system.parts for every partitioned
+Aggregating/Replacing/Summing/CollapsingMergeTree table and, during an off-peak window,
+issues 'OPTIMIZE TABLE ... PARTITION ID ... FINAL' for closed partitions (not the current
+month, which is still receiving inserts) that have more than one part. The most
+fragmented partitions go first. At most --concurrency OPTIMIZEs run per shard at a time,
+and partitions that already have a merge running are skipped.
+
+Usage:
+    python merge_scheduler.py                          # run forever, off-peak 22:00-06:00 UTC
+    python merge_scheduler.py --once --ignore-window   # single pass now (e.g. from cron)
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from clickhouse_driver import Client
+
+# Configuration
+# One native-protocol endpoint per shard (docker-compose maps clickhouse-02 to 9001)
+CLICKHOUSE_HOSTS = os.environ.get("CLICKHOUSE_HOSTS", "localhost:9000,localhost:9001")
+CLICKHOUSE_DB = "default"
+
+# Tables read with FINAL or '...Merge' functions, found by engine so new rollups are
+# watched without being listed here. Plain MergeTree tables (ticks_local) are not, and
+# neither are unpartitioned ones (ticks_archive_manifest), which have no closed partitions.
+WATCHED_ENGINES = r"(Aggregating|Replacing|Summing|Collapsing)MergeTree$"
+
+# Closed partitions with more than one active part, worst first.
+# Partitions with a merge in flight are left alone.
+FRAGMENTED_PARTITIONS_QUERY = """
+SELECT
+    table,
+    partition_id,
+    count() AS parts,
+    sum(bytes_on_disk) AS bytes
+FROM system.parts
+WHERE database = 'default'
+    AND active
+    AND table IN (
+        SELECT name FROM system.tables WHERE database = 'default' AND match(engine, {engines:String})
+            AND partition_key != ''
+    )
+    AND partition_id != toString(toYYYYMM(now()))
+    AND (table, partition_id) NOT IN (
+        SELECT table, partition_id FROM system.merges WHERE database = 'default'
+    )
+GROUP BY table, partition_id
+HAVING parts > {min_parts:UInt32}
+ORDER BY parts DESC, bytes ASC
+LIMIT {limit:UInt32}
+"""
+
+
+def connect(endpoint: str) -> Client:
+    host, _, port = endpoint.partition(":")
+    # OPTIMIZE ... FINAL on a large partition can take a while
+    return Client(host=host, port=int(port or 9000), database=CLICKHOUSE_DB, user='default', password='',
+                  send_receive_timeout=3600)
+
+
+def in_window(now: datetime, start_hour: int, end_hour: int) -> bool:
+    """Off-peak window in UTC hours; wraps midnight when start > end (e.g. 22 -> 6)."""
+    if start_hour <= end_hour:
+        return start_hour <= now.hour < end_hour
+    return now.hour >= start_hour or now.hour < end_hour
+
+
+def optimize(endpoint: str, table: str, partition_id: str, parts: int) -> str:
+    """Runs one OPTIMIZE on its own connection (clients are not thread-safe)."""
+    # partition_id comes from system.parts (e.g. '202409'); DDL takes it as a literal
+    if not partition_id.isalnum():
+        raise ValueError(f"Unexpected partition id: {partition_id!r}")
+    client = connect(endpoint)
+    start = time.perf_counter()
+    client.execute(f"OPTIMIZE TABLE default.{table} PARTITION ID '{partition_id}' FINAL")
+    return f"  [OK] {endpoint} {table} {partition_id}: {parts} parts -> 1 ({time.perf_counter() - start:.1f}s)"
+
+
+def run_pass(endpoints: list, concurrency: int, min_parts: int, batch: int) -> int:
+    """One scheduling pass over every shard. Returns the number of OPTIMIZEs issued."""
+    issued = 0
+    for endpoint in endpoints:
+        try:
+            candidates = connect(endpoint).execute(
+                FRAGMENTED_PARTITIONS_QUERY,
+                {'engines': WATCHED_ENGINES, 'min_parts': min_parts, 'limit': batch}
+            )
+        except Exception as e:
+            print(f"[ERROR] {endpoint}: {e}")
+            continue
+
+        if not candidates:
+            continue
+        print(f"[INFO] {endpoint}: optimizing {len(candidates)} partition(s)")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(optimize, endpoint, table, partition_id, parts)
+                for table, partition_id, parts, _ in candidates
+            ]
+            for future in futures:
+                try:
+                    print(future.result())
+                    issued += 1
+                except Exception as e:
+                    print(f"  [FAILED] {endpoint}: {e}")
+    return issued
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule OPTIMIZE ... FINAL for fragmented closed partitions.")
+    parser.add_argument("--window", default="22-6", help="Off-peak UTC hours, START-END (default: 22-6)")
+    parser.add_argument("--ignore-window", action="store_true", help="Run regardless of the time of day")
+    parser.add_argument("--concurrency", type=int, default=2, help="Parallel OPTIMIZEs per shard (default: 2)")
+    parser.add_argument("--min-parts", type=int, default=1, help="Optimize partitions with more parts than this")
+    parser.add_argument("--batch", type=int, default=20, help="Max partitions per shard per pass")
+    parser.add_argument("--interval", type=int, default=300, help="Seconds between passes (default: 300)")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    args = parser.parse_args()
+
+    start_hour, end_hour = (int(h) for h in args.window.split("-"))
+    endpoints = [e.strip() for e in CLICKHOUSE_HOSTS.split(",") if e.strip()]
+
+    print("=" * 60)
+    print(f"Merge Scheduler (window {start_hour:02d}:00-{end_hour:02d}:00 UTC, concurrency {args.concurrency})")
+    print("=" * 60)
+
+    try:
+        while True:
+            if args.ignore_window or in_window(datetime.now(timezone.utc), start_hour, end_hour):
+                issued = run_pass(endpoints, args.concurrency, args.min_parts, args.batch)
+                print(f"[INFO] Pass complete: {issued} OPTIMIZE(s)")
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\nStopping merge scheduler...")
+
+
+if __name__ == "__main__":
+    main()
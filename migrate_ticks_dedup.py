@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Online ticks_dedup Migration Script
+
+Converts an existing 'ticks_dedup' to the storage-optimised schema in
+sql_schema/06_ticks_dedup.sql (LowCardinality exchange, ticks_local codecs)
+without stopping ingestion:
+
+  1. Create 'ticks_dedup_new' with the new schema.
+  2. Attach a temporary MV so new ticks land in both tables from now on.
+  3. Backfill 'ticks_dedup_new' from 'ticks_dedup', partition by partition, on every shard.
+     Rows seen by both the MV and the backfill collapse, since the key is (symbol, seq_id).
+  4. EXCHANGE TABLES, so 'ticks_dedup' is the new table.
+  5. Point 'local_to_dedup_mv' at it and drop the temporary MV.
+  6. Drop the old table (unless --keep-old).
+
+With --price-ticks the price is stored as UInt32 cents ('price_ticks') and 'price'
+becomes an ALIAS column, so existing queries keep working.
+
+Usage:
+    python migrate_ticks_dedup.py
+    python migrate_ticks_dedup.py --price-ticks --keep-old
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from clickhouse_driver import Client
+from init_clickhouse import read_sql_file, execute_sql
+
+# Configuration
+# One native-protocol endpoint per shard; DDL runs ON CLUSTER through the first one
+CLICKHOUSE_HOSTS = os.environ.get("CLICKHOUSE_HOSTS", "localhost:9000,localhost:9001")
+CLICKHOUSE_DB = "default"
+
+PROJECT_ROOT = Path(__file__).parent
+DEDUP_SQL = PROJECT_ROOT / "sql_schema/06_ticks_dedup.sql"
+DEDUP_MV_SQL = PROJECT_ROOT / "sql_schema/09_local_to_dedup_mv.sql"
+
+# The producer rounds prices to cents
+PRICE_TICKS_PER_UNIT = 100
+
+# Rollup bucket timestamps are sorted within each symbol
+ROLLUP_CODEC_ALTERS = [
+    f"ALTER TABLE default.{table} ON CLUSTER analytics_cluster "
+    f"MODIFY COLUMN minute DateTime('UTC') CODEC(DoubleDelta, ZSTD)"
+    for table in ("trades_1m_agg", "quotes_1m_agg", "trades_1m_venue_agg", "ticks_sketch_1m_agg")
+]
+
+SIZE_QUERY = """
+SELECT table, sum(data_compressed_bytes), sum(data_uncompressed_bytes)
+FROM system.parts
+WHERE database = 'default' AND active AND table IN ('ticks_dedup', 'ticks_dedup_new')
+GROUP BY table
+"""
+
+
+def replace_once(sql: str, old: str, new: str) -> str:
+    """Substitutes exactly one occurrence, so schema edits fail loudly here instead of silently."""
+    if sql.count(old) != 1:
+        raise ValueError(f"Expected exactly one {old!r} in schema file")
+    return sql.replace(old, new)
+
+
+def new_table_sql(keeper_suffix: str, price_ticks: bool) -> str:
+    sql = read_sql_file(DEDUP_SQL)
+    sql = replace_once(sql, "default.ticks_dedup ", "default.ticks_dedup_new ")
+    sql = replace_once(sql, "'/clickhouse/tables/{shard}/ticks_dedup'",
+                       f"'/clickhouse/tables/{{shard}}/ticks_dedup_{keeper_suffix}'")
+    if price_ticks:
+        sql = replace_once(
+            sql,
+            "`price` Float64 CODEC(Gorilla, ZSTD),",
+            f"`price_ticks` UInt32 CODEC(T64, ZSTD), `price` Float64 ALIAS price_ticks / {PRICE_TICKS_PER_UNIT},"
+        )
+    return sql
+
+
+def mv_sql(name: str, target: str, price_ticks: bool) -> str:
+    sql = read_sql_file(DEDUP_MV_SQL)
+    sql = replace_once(sql, "default.local_to_dedup_mv ", f"default.{name} ")
+    sql = replace_once(sql, "TO default.ticks_dedup ", f"TO default.{target} ")
+    if price_ticks:
+        sql = replace_once(sql, "    price,\n",
+                           f"    toUInt32(round(price * {PRICE_TICKS_PER_UNIT})) AS price_ticks,\n")
+    return sql
+
+
+def backfill_select(price_ticks: bool) -> str:
+    price = f"toUInt32(round(price * {PRICE_TICKS_PER_UNIT})) AS price_ticks" if price_ticks else "price"
+    return f"""
+    SELECT exchange, symbol, event_time, seq_id, event_type, {price}, size, side, source_version
+    FROM default.ticks_dedup
+    WHERE _partition_id = {{partition_id:String}}
+    """
+
+
+def connect(endpoint: str) -> Client:
+    host, _, port = endpoint.partition(":")
+    return Client(host=host, port=int(port or 9000), database=CLICKHOUSE_DB, user='default', password='')
+
+
+def backfill(client: Client, endpoint: str, price_ticks: bool):
+    """Copies every partition of this shard's ticks_dedup into ticks_dedup_new."""
+    partitions = client.execute(
+        "SELECT DISTINCT partition_id FROM system.parts "
+        "WHERE database = 'default' AND table = 'ticks_dedup' AND active ORDER BY partition_id"
+    )
+    columns = "exchange, symbol, event_time, seq_id, event_type, " \
+              f"{'price_ticks' if price_ticks else 'price'}, size, side, source_version"
+    for (partition_id,) in partitions:
+        start = time.perf_counter()
+        client.execute(
+            f"INSERT INTO default.ticks_dedup_new ({columns}) {backfill_select(price_ticks)}",
+            {'partition_id': partition_id}
+        )
+        print(f"  [OK] {endpoint} partition {partition_id} ({time.perf_counter() - start:.1f}s)")
+
+
+def report_sizes(clients: dict):
+    totals = {}
+    for client in clients.values():
+        for table, compressed, uncompressed in client.execute(SIZE_QUERY):
+            c, u = totals.get(table, (0, 0))
+            totals[table] = (c + compressed, u + uncompressed)
+    for table, (compressed, uncompressed) in sorted(totals.items()):
+        print(f"  {table:<16} {compressed / 2**20:10.2f} MiB compressed / {uncompressed / 2**20:10.2f} MiB raw")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online migration of ticks_dedup to the compact schema.")
+    parser.add_argument("--price-ticks", action="store_true",
+                        help="Store price as UInt32 cents with a Float64 ALIAS column")
+    parser.add_argument("--keep-old", action="store_true",
+                        help="Keep the old table as ticks_dedup_new after the swap")
+    parser.add_argument("--keeper-suffix", default=time.strftime("%Y%m%d%H%M%S"),
+                        help="Suffix for the new table's Keeper path")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ticks_dedup Online Migration")
+    print("=" * 60)
+
+    endpoints = [e.strip() for e in CLICKHOUSE_HOSTS.split(",") if e.strip()]
+    try:
+        clients = {endpoint: connect(endpoint) for endpoint in endpoints}
+        ddl = clients[endpoints[0]]
+        ddl.execute("SELECT 1")
+    except Exception as e:
+        print(f"[ERROR] Failed to connect to ClickHouse: {e}")
+        sys.exit(1)
+
+    steps_ok = (
+        execute_sql(ddl, new_table_sql(args.keeper_suffix, args.price_ticks), "Creating ticks_dedup_new")
+        and execute_sql(ddl, mv_sql("dedup_migration_mv", "ticks_dedup_new", args.price_ticks),
+                        "Mirroring new ticks into ticks_dedup_new")
+    )
+    if not steps_ok:
+        sys.exit(1)
+
+    print("\n[INFO] Backfilling ticks_dedup_new...")
+    try:
+        for endpoint, client in clients.items():
+            backfill(client, endpoint, args.price_ticks)
+    except Exception as e:
+        print(f"  [FAILED] Backfill - {e}")
+        print("  ticks_dedup is untouched; drop ticks_dedup_new and dedup_migration_mv to retry.")
+        sys.exit(1)
+
+    print("\n[INFO] Sizes before the swap:")
+    report_sizes(clients)
+
+    # From here on 'ticks_dedup' is the new table. The fresh MV is created before the old
+    # ones are dropped, so there is no moment where new ticks reach neither table.
+    steps_ok = (
+        execute_sql(ddl, "EXCHANGE TABLES default.ticks_dedup AND default.ticks_dedup_new "
+                         "ON CLUSTER analytics_cluster", "Swapping tables")
+        and execute_sql(ddl, mv_sql("local_to_dedup_mv_v2", "ticks_dedup", args.price_ticks),
+                        "Creating MV for the new ticks_dedup")
+        and execute_sql(ddl, "DROP VIEW IF EXISTS default.local_to_dedup_mv ON CLUSTER analytics_cluster; "
+                             "DROP VIEW IF EXISTS default.dedup_migration_mv ON CLUSTER analytics_cluster; "
+                             "RENAME TABLE default.local_to_dedup_mv_v2 TO default.local_to_dedup_mv "
+                             "ON CLUSTER analytics_cluster", "Replacing local_to_dedup_mv")
+    )
+    if not steps_ok:
+        sys.exit(1)
+
+    if not args.keep_old:
+        execute_sql(ddl, "DROP TABLE IF EXISTS default.ticks_dedup_new ON CLUSTER analytics_cluster SYNC",
+                    "Dropping the old table")
+
+    for statement in ROLLUP_CODEC_ALTERS:
+        execute_sql(ddl, statement, "Updating rollup minute codec")
+
+    print("\n[SUCCESS] ticks_dedup now uses the compact schema")
+
+
+if __name__ == "__main__":
+    main()
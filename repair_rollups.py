@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Incremental Rollup Backfill & Repair Script
+
+The rollup MVs only see rows inserted after they exist. Ticks loaded earlier, or lost
+while an MV was failing, never reach the rollups. This script finds and fixes those gaps
+without re-aggregating everything:
+
+  1. Per partition, compare trade volume and notional (sum(price * size)) between
+     'ticks_local' and each rollup.
+  2. For partitions that differ, compare per minute to find the affected minutes.
+  3. Rebuild each bad partition in a staging table: good minutes are copied as-is,
+     bad minutes are recomputed from 'ticks_local' with the '...State' functions.
+  4. Swap it in with 'ALTER TABLE ... REPLACE PARTITION ... FROM staging'.
+
+Partitions are repaired in parallel, one connection per worker. 'ticks_local' and the
+rollups are per-shard tables, so every shard is checked separately.
+
+Trade counts are not stored in the rollups, so volume and notional are the fingerprint.
+Minutes with no raw ticks left (aged out or archived) are never touched. Versions that
+were superseded by a correction are not counted (see apply_corrections.py).
+
+Every repaired day is logged in 'rollup_rewrites', so API bar stores re-fetch it.
+
+Usage:
+    python repair_rollups.py --dry-run            # report gaps only
+    python repair_rollups.py                      # repair closed partitions
+    python repair_rollups.py --include-current    # also the partition still receiving ticks
+"""
+
+import argparse
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from clickhouse_driver import Client
+
+# Configuration
+# One native-protocol endpoint per shard (docker-compose maps clickhouse-02 to 9001)
+CLICKHOUSE_HOSTS = os.environ.get("CLICKHOUSE_HOSTS", "localhost:9000,localhost:9001")
+CLICKHOUSE_DB = "default"
+
+# Rollups fed from trades in 'ticks_local', with their GROUP BY keys.
+# The state columns are the same for both (see 08_trades_1m_mv.sql / 13_trades_1m_venue_mv.sql).
+ROLLUPS = {
+    "trades_1m_agg": "symbol, minute",
+    "trades_1m_venue_agg": "symbol, minute, exchange, side",
+}
+
+STATE_COLUMNS = "open, high, low, close, volume, vwap_pv"
+STATE_SELECT = """
+    argMinState(price, event_time) AS open,
+    maxState(price) AS high,
+    minState(price) AS low,
+    argMaxState(price, event_time) AS close,
+    sumState(size) AS volume,
+    sumState(price * size) AS vwap_pv
+"""
+
+# Notional is a Float64 sum, so summation order makes tiny differences
+RELATIVE_TOLERANCE = 1e-9
+
+REWRITES_INSERT = "INSERT INTO default.rollup_rewrites (symbol, day, source) VALUES"
+
+
+def not_superseded(scope: str) -> str:
+    """
+    Condition on ticks_local rows: drops every version of a (symbol, seq_id) older than
+    its latest one, looked up across all shards. This is how apply_corrections.py
+    counts trades, so repairs do not bring corrected-away versions back.
+    'scope' bounds the lookup (fixed SQL, e.g. an event_time range).
+    """
+    return f"""(symbol, seq_id, source_version) GLOBAL NOT IN (
+        SELECT symbol, seq_id, version
+        FROM (
+            SELECT symbol, seq_id, groupUniqArray(source_version) AS versions
+            FROM default.ticks_all
+            WHERE {scope}
+            GROUP BY symbol, seq_id
+            HAVING length(versions) > 1
+        )
+        ARRAY JOIN arrayFilter(v -> v < arrayMax(versions), versions) AS version
+    )"""
+
+
+RAW_BY_PARTITION = f"""
+SELECT toYYYYMM(event_time) AS partition, sum(size) AS volume, sum(price * size) AS notional
+FROM default.ticks_local
+WHERE event_type = 'trade' AND {not_superseded("1")}
+GROUP BY partition
+"""
+
+RAW_BY_MINUTE = f"""
+SELECT toStartOfMinute(event_time) AS minute, sum(size) AS volume, sum(price * size) AS notional
+FROM default.ticks_local
+WHERE event_type = 'trade' AND toYYYYMM(event_time) = {{partition:UInt32}} AND {not_superseded("1")}
+GROUP BY minute
+"""
+
+
+def rollup_by_partition(table: str) -> str:
+    return f"""
+    SELECT toYYYYMM(minute) AS partition, sumMerge({table}.volume) AS volume, sumMerge({table}.vwap_pv) AS notional
+    FROM default.{table}
+    GROUP BY partition
+    """
+
+
+def rollup_by_minute(table: str) -> str:
+    return f"""
+    SELECT minute, sumMerge({table}.volume) AS volume, sumMerge({table}.vwap_pv) AS notional
+    FROM default.{table}
+    WHERE toYYYYMM(minute) = {{partition:UInt32}}
+    GROUP BY minute
+    """
+
+
+def record_rewrites(client: Client, symbol_minutes, source: str):
+    """
+    Logs the days of rewritten (symbol, minute) pairs in 'rollup_rewrites' (symbol ''
+    for every symbol). Call it after the rollup rows are rewritten.
+    """
+    days = sorted({(symbol, minute.date()) for symbol, minute in symbol_minutes})
+    if days:
+        client.execute(REWRITES_INSERT, [(symbol, day, source) for symbol, day in days])
+
+
+def connect(endpoint: str) -> Client:
+    host, _, port = endpoint.partition(":")
+    return Client(host=host, port=int(port or 9000), database=CLICKHOUSE_DB, user='default', password='')
+
+
+def differs(raw, rolled) -> bool:
+    """True when (volume, notional) from the raw side does not match the rollup."""
+    if rolled is None:
+        return True
+    raw_volume, raw_notional = raw
+    rolled_volume, rolled_notional = rolled
+    return raw_volume != rolled_volume or not math.isclose(
+        raw_notional, rolled_notional, rel_tol=RELATIVE_TOLERANCE
+    )
+
+
+def find_bad_partitions(client: Client, table: str, include_current: bool) -> list:
+    raw = {p: (v, n) for p, v, n in client.execute(RAW_BY_PARTITION)}
+    rolled = {p: (v, n) for p, v, n in client.execute(rollup_by_partition(table))}
+    (current,), = client.execute("SELECT toYYYYMM(now())")
+
+    return sorted(
+        p for p in raw
+        if differs(raw[p], rolled.get(p)) and (include_current or p != current)
+    )
+
+
+def find_bad_minutes(client: Client, table: str, partition: int) -> list:
+    params = {'partition': partition}
+    raw = {m: (v, n) for m, v, n in client.execute(RAW_BY_MINUTE, params)}
+    rolled = {m: (v, n) for m, v, n in client.execute(rollup_by_minute(table), params)}
+    # Only minutes that still have raw ticks can be rebuilt
+    return sorted(m for m in raw if differs(raw[m], rolled.get(m)))
+
+
+def as_ranges(minutes: list) -> list:
+    """Collapses sorted minutes into (first, last) runs, for readable output."""
+    ranges = []
+    for minute in minutes:
+        if ranges and (minute - ranges[-1][1]).total_seconds() == 60:
+            ranges[-1][1] = minute
+        else:
+            ranges.append([minute, minute])
+    return ranges
+
+
+def repair_partition(endpoint: str, table: str, partition: int, bad_minutes: list) -> int:
+    """Rebuilds one partition in staging and swaps it in. Returns the number of rebuilt minutes."""
+    client = connect(endpoint)
+    keys = ROLLUPS[table]
+    staging = f"default.{table}_repair_{partition}"
+    params = {'partition': partition, 'bad': bad_minutes}
+
+    # Same structure, partition key and sort key as the rollup, so REPLACE PARTITION accepts it
+    client.execute(f"DROP TABLE IF EXISTS {staging}")
+    client.execute(
+        f"CREATE TABLE {staging} AS default.{table} "
+        f"ENGINE = AggregatingMergeTree PARTITION BY toYYYYMM(minute) ORDER BY ({keys})"
+    )
+    try:
+        # Good minutes: keep the existing states
+        client.execute(
+            f"""
+            INSERT INTO {staging}
+            SELECT * FROM default.{table}
+            WHERE toYYYYMM(minute) = {{partition:UInt32}}
+                AND NOT has({{bad:Array(DateTime('UTC'))}}, minute)
+            """,
+            params
+        )
+        # Bad minutes: recompute from raw ticks
+        client.execute(
+            f"""
+            INSERT INTO {staging} ({keys}, {STATE_COLUMNS})
+            SELECT
+                {keys.replace('minute', 'toStartOfMinute(event_time) AS minute')},
+                {STATE_SELECT}
+            FROM default.ticks_local
+            WHERE event_type = 'trade'
+                AND toYYYYMM(event_time) = {{partition:UInt32}}
+                AND has({{bad:Array(DateTime('UTC'))}}, toStartOfMinute(event_time))
+                AND {not_superseded("1")}
+            GROUP BY {keys}
+            """,
+            params
+        )
+        client.execute(f"ALTER TABLE default.{table} REPLACE PARTITION {int(partition)} FROM {staging}")
+    finally:
+        client.execute(f"DROP TABLE IF EXISTS {staging}")
+    # The minutes were compared over all symbols, so every symbol of the day is affected
+    record_rewrites(client, [("", minute) for minute in bad_minutes], "repair_rollups")
+    return len(bad_minutes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and repair gaps in the trade rollups.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report gaps")
+    parser.add_argument("--include-current", action="store_true",
+                        help="Also repair the current month (ticks arriving during the swap can be lost)")
+    parser.add_argument("--workers", type=int, default=4, help="Partitions repaired in parallel per shard")
+    parser.add_argument("--table", choices=list(ROLLUPS), action="append",
+                        help="Rollup(s) to check (default: all)")
+    args = parser.parse_args()
+    tables = args.table or list(ROLLUPS)
+
+    print("=" * 60)
+    print("Rollup Gap Detection & Repair")
+    print("=" * 60)
+
+    failed = 0
+    for endpoint in [e.strip() for e in CLICKHOUSE_HOSTS.split(",") if e.strip()]:
+        try:
+            client = connect(endpoint)
+            client.execute("SELECT 1")
+        except Exception as e:
+            print(f"[ERROR] Could not connect to {endpoint}: {e}")
+            failed += 1
+            continue
+
+        for table in tables:
+            bad_partitions = find_bad_partitions(client, table, args.include_current)
+            print(f"\n[INFO] {endpoint} {table}: {len(bad_partitions)} partition(s) out of sync")
+
+            jobs = {}
+            for partition in bad_partitions:
+                bad_minutes = find_bad_minutes(client, table, partition)
+                for first, last in as_ranges(bad_minutes):
+                    print(f"  [GAP] {partition}: {first} .. {last}")
+                if bad_minutes and not args.dry_run:
+                    jobs[partition] = bad_minutes
+
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                futures = {
+                    pool.submit(repair_partition, endpoint, table, partition, minutes): partition
+                    for partition, minutes in jobs.items()
+                }
+                for future in as_completed(futures):
+                    partition = futures[future]
+                    try:
+                        print(f"  [OK] {table} {partition}: rebuilt {future.result()} minute(s)")
+                    except Exception as e:
+                        print(f"  [FAILED] {table} {partition}: {e}")
+                        failed += 1
+
+    if failed:
+        print(f"\n[ERROR] {failed} failure(s)")
+        sys.exit(1)
+    print("\n[SUCCESS] Rollups are in sync" if not args.dry_run else "\n[INFO] Dry run complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Historical Tick Replay
+
+Streams stored ticks back into the Kafka 'ticks' topic, in global event-time order,
+at 1x, Nx or maximum speed. Useful for testing strategies and the pipeline on real data.
+
+Sources:
+  --source ticks     'ticks_local' on every shard
+  --source archive   Parquet partitions exported by archive_partitions.py (read through ClickHouse)
+
+Every shard (or, for the archive, every shard's file of one partition) is one
+execute_iter() stream of all the selected symbols ordered by event_time, so the number of
+open connections and queries is the number of shards, however many symbols are replayed.
+ClickHouse sorts each stream (spilling to disk past STREAM_SORT_BYTES). A heap merges the
+streams by event_time; archived partitions are monthly, so they are replayed one after the
+other. Ticks are encoded as the producer's JSON and sent in batches; the rate controller
+sleeps only when the replay is ahead of schedule.
+
+Replayed ticks keep their seq_id/source_version, so 'ticks_dedup' collapses them with the
+originals while the rollups count them again. Use --shift-to-now and --seq-offset to replay
+into a live pipeline as new data (--shift-to-now stamps the range start as now and compresses
+event time by the speed factor, so paced replays never run into the future; it needs a
+numeric --speed, since at max speed the stamps would run ahead of the clock).
+
+Usage:
+    python replay_ticks.py --start 2024-09-02 --end 2024-09-03 --speed 10
+    python replay_ticks.py --start 2024-09-02T14:30 --end 2024-09-02T15:00 --speed 60 --shift-to-now
+    python replay_ticks.py --source archive --start 2024-06-01 --end 2024-07-01 --symbols AAPL,MSFT
+"""
+
+import argparse
+import heapq
+import json
+import os
+import time
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+from kafka import KafkaProducer
+from archive_partitions import table_function
+from repair_rollups import CLICKHOUSE_HOSTS, connect
+
+BROKER = os.environ.get("KAFKA_BROKER", "localhost:29092")
+TOPIC = "ticks"
+
+# Rows per block fetched by execute_iter
+STREAM_BLOCK_SIZE = 65536
+# Memory a stream's ORDER BY may use before ClickHouse sorts on disk
+STREAM_SORT_BYTES = 1 << 30
+# Most ticks sent between two pacing checks
+DEFAULT_BATCH = 5000
+REPORT_SECONDS = 5
+
+COLUMNS = "exchange, symbol, event_time, seq_id, toString(event_type), price, size, toString(side), source_version"
+RANGE = "event_time >= {start:DateTime64(6, 'UTC')} AND event_time < {end:DateTime64(6, 'UTC')}"
+SYMBOL_FILTER = " AND symbol IN {symbols:Array(String)}"
+
+
+ARCHIVE_PATHS_QUERY = """
+SELECT partition_id, path
+FROM default.ticks_archive_manifest FINAL
+WHERE table = 'ticks_local'
+    AND max_time >= {start:DateTime64(6, 'UTC')}
+    AND min_time < {end:DateTime64(6, 'UTC')}
+ORDER BY partition_id, shard
+"""
+
+EVENT_TIME = itemgetter(2)
+
+
+def parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+
+def stream_query(source: str, symbol_filter: str) -> str:
+    """One stream of 'source': ticks_local, or an archive file (which stores the enums as strings)."""
+    return f"SELECT {COLUMNS} FROM {source} WHERE {RANGE}{symbol_filter} ORDER BY event_time, symbol, seq_id"
+
+
+def stream(endpoint: str, query: str, params: dict):
+    """Rows of one query, block by block. Each stream needs its own connection."""
+    client = connect(endpoint)
+    settings = {'max_block_size': STREAM_BLOCK_SIZE, 'max_bytes_before_external_sort': STREAM_SORT_BYTES}
+    try:
+        yield from client.execute_iter(query, params, settings=settings)
+    finally:
+        client.disconnect()
+
+
+def open_streams(args, start: datetime, end: datetime) -> list:
+    """
+    Event-time ordered ticks, one iterator per shard. Streams are lazy: a query starts
+    when its first row is needed, so at most one query per shard runs at a time.
+    """
+    endpoints = [e.strip() for e in CLICKHOUSE_HOSTS.split(",") if e.strip()]
+    params = {'start': start, 'end': end}
+    symbol_filter = ""
+    if args.symbols:
+        params['symbols'] = [s.strip() for s in args.symbols.split(",") if s.strip()]
+        symbol_filter = SYMBOL_FILTER
+
+    if args.source == "ticks":
+        query = stream_query("default.ticks_local", symbol_filter)
+        print(f"[INFO] {len(endpoints)} shard stream(s)")
+        return [stream(endpoint, query, params) for endpoint in endpoints]
+
+    # Any node can read the archive. The files of one partition (one per shard) are merged
+    # like shards; partitions are months, so they follow each other in event time.
+    control = connect(endpoints[0])
+    rows = control.execute(ARCHIVE_PATHS_QUERY, params)
+    control.disconnect()
+    partitions = [[path for _, path in group] for _, group in groupby(rows, key=itemgetter(0))]
+
+    def archive_stream():
+        for paths in partitions:
+            files = [
+                stream(endpoints[0], stream_query(table_function(p), symbol_filter), params)
+                for p in paths
+            ]
+            try:
+                yield from heapq.merge(*files, key=EVENT_TIME)
+            finally:
+                for f in files:
+                    f.close()
+
+    widest = max((len(paths) for paths in partitions), default=0)
+    print(f"[INFO] {len(partitions)} archived partition(s), at most {widest} stream(s) at a time")
+    return [archive_stream()]
+
+
+class RateController:
+    """
+    Maps event time to wall time: a tick is due at wall_start + (event_time - first) / speed.
+    speed=None sends as fast as possible. Falling behind is not compensated by skipping;
+    the replay just catches up.
+    """
+
+    def __init__(self, speed: float = None):
+        self.speed = speed
+        self.first = None
+        self.wall_start = None
+
+    def delay(self, event_time: datetime) -> float:
+        """Seconds until this tick is due (negative when behind)."""
+        if self.speed is None:
+            return 0.0
+        if self.first is None:
+            self.first, self.wall_start = event_time, time.monotonic()
+        due = self.wall_start + (event_time - self.first).total_seconds() / self.speed
+        return due - time.monotonic()
+
+
+def retimer(start: datetime, speed: float):
+    """
+    --shift-to-now: the range start becomes now, and event time advances at the replay speed.
+    The rate controller keeps each tick from being sent before its stamp, so speed must not be max.
+    """
+    origin, wall_origin, factor = start.timestamp(), time.time(), speed
+
+    def retime(event_time: datetime) -> datetime:
+        if event_time.tzinfo is None:
+            event_time = event_time.replace(tzinfo=timezone.utc)
+        return datetime.fromtimestamp(wall_origin + (event_time.timestamp() - origin) / factor, timezone.utc)
+    return retime
+
+
+def encoder(retime=None, seq_offset: int = 0):
+    """Row -> producer-format JSON bytes. Strings go through json.dumps; the rest is formatted directly."""
+    dumps = json.dumps
+
+    def encode(row) -> bytes:
+        exchange, symbol, event_time, seq_id, event_type, price, size, side, source_version = row
+        if retime is not None:
+            event_time = retime(event_time)
+        return (
+            f'{{"exchange": {dumps(exchange)}, "symbol": {dumps(symbol)}, '
+            f'"event_time": "{event_time:%Y-%m-%dT%H:%M:%S.%f}Z", "seq_id": {seq_id + seq_offset}, '
+            f'"event_type": "{event_type}", "price": {price!r}, "size": {size}, '
+            f'"side": "{side}", "source_version": {source_version}}}'
+        ).encode()
+    return encode
+
+
+def replay(producer, ticks, controller: RateController, encode, batch_size: int) -> int:
+    sent = 0
+    batch = []
+    last_report = time.monotonic()
+    reported = 0
+
+    def flush():
+        for message in map(encode, batch):
+            producer.send(TOPIC, message)
+        batch.clear()
+
+    try:
+        for row in ticks:
+            wait = controller.delay(EVENT_TIME(row))
+            if wait > 0:
+                # Ahead of schedule: send what is due, then sleep until this tick is due
+                flush()
+                time.sleep(wait)
+            batch.append(row)
+            sent += 1
+            if len(batch) >= batch_size:
+                flush()
+
+            now = time.monotonic()
+            if now - last_report >= REPORT_SECONDS:
+                lag = -controller.delay(EVENT_TIME(row)) if controller.speed else 0.0
+                print(f"[INFO] {sent:,} ticks sent, {(sent - reported) / (now - last_report):,.0f} ticks/s, "
+                      f"at {EVENT_TIME(row):%Y-%m-%d %H:%M:%S}, behind schedule {max(lag, 0):.1f}s")
+                last_report, reported = now, sent
+    except KeyboardInterrupt:
+        print("\nStopping replay...")
+    flush()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored ticks into Kafka.")
+    parser.add_argument("--start", required=True, help="First event_time (ISO 8601, UTC)")
+    parser.add_argument("--end", required=True, help="End of the range, exclusive (ISO 8601, UTC)")
+    parser.add_argument("--source", choices=("ticks", "archive"), default="ticks")
+    parser.add_argument("--symbols", default="", help="Comma-separated symbols (default: all in range)")
+    parser.add_argument("--speed", default="1", help="Replay speed factor, e.g. 1, 10, or 'max' (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH,
+                        help=f"Most ticks sent between pacing checks (default: {DEFAULT_BATCH})")
+    parser.add_argument("--shift-to-now", action="store_true",
+                        help="Shift event_time so the first tick is stamped with the current time (needs a numeric --speed)")
+    parser.add_argument("--seq-offset", type=int, default=0, help="Added to every seq_id")
+    args = parser.parse_args()
+
+    start, end = parse_time(args.start), parse_time(args.end)
+    if end <= start:
+        parser.error("--end must be after --start")
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+    if args.shift_to_now and speed is None:
+        parser.error("--shift-to-now needs a numeric --speed: at max speed shifted times would run ahead of the clock")
+
+    print("=" * 60)
+    print(f"Tick Replay: {start:%Y-%m-%d %H:%M} .. {end:%Y-%m-%d %H:%M} from {args.source} "
+          f"at {'max' if speed is None else f'{speed:g}x'} speed")
+    print("=" * 60)
+
+    streams = open_streams(args, start, end)
+    ticks = heapq.merge(*streams, key=EVENT_TIME)
+
+    # Large batches and a short linger keep the producer well above one request per tick
+    producer = KafkaProducer(
+        bootstrap_servers=[BROKER],
+        linger_ms=20,
+        batch_size=1 << 20,
+        buffer_memory=256 << 20,
+        compression_type="gzip",
+    )
+
+    encode = encoder(retimer(start, speed) if args.shift_to_now else None, args.seq_offset)
+
+    started = time.monotonic()
+    try:
+        sent = replay(producer, ticks, RateController(speed), encode, args.batch_size)
+    finally:
+        producer.flush()
+        producer.close()
+        for s in streams:
+            s.close()
+
+    elapsed = time.monotonic() - started
+    print(f"[OK] {sent:,} ticks in {elapsed:.1f}s ({sent / max(elapsed, 1e-9):,.0f} ticks/s)")
+
+
+if __name__ == "__main__":
+    main()
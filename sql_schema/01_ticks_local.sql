@@ -21,6 +21,8 @@ CREATE TABLE IF NOT EXISTS default.ticks_local ON CLUSTER analytics_cluster
 
 -- === Table Settings ===
 PARTITION BY toYYYYMM(event_time)           -- Group data into monthly partitions on disk. Good balance for TTL and query speed.
-ORDER BY (symbol, event_time, seq_id)      -- CRITICAL FOR BACKTESTING: Data is physically sorted by symbol, then time. Makes symbol+time range queries instant.
-TTL toDateTime(event_time) + INTERVAL 30 DAY           -- Automatically delete data older than 30 days.
-SETTINGS index_granularity = 8192;         -- Default index granularity, good starting point.
\ No newline at end of file
+ORDER BY (symbol, event_time, seq_id, cityHash64(seq_id)) -- CRITICAL FOR BACKTESTING: Data is physically sorted by symbol, then time. Makes symbol+time range queries instant.
+SAMPLE BY cityHash64(seq_id)                -- Enables 'SAMPLE 0.1' for approximate queries. Hashing seq_id keeps every version of a tick in or out together.
+TTL toDateTime(event_time) + INTERVAL 30 DAY TO VOLUME 'cold' -- Move data older than 30 days to the cold volume (kept, not deleted).
+SETTINGS index_granularity = 8192,         -- Default index granularity, good starting point.
+    storage_policy = 'tiered';             -- Hot/cold volumes from config/clickhouse/storage.xml.
\ No newline at end of file
@@ -1,16 +1,17 @@
 -- This table uses ReplicatedReplacingMergeTree to automatically handle duplicates.
 -- It stores the *clean* version of our data, keeping only the row with the
 -- highest 'source_version' for any given (symbol, seq_id) pair.
+-- Existing (uncompressed) tables are converted online by migrate_ticks_dedup.py.
 CREATE TABLE IF NOT EXISTS default.ticks_dedup ON CLUSTER analytics_cluster
 (
-    -- The schema is identical to ticks_local
-    `exchange` String,
+    -- Same columns as ticks_local, typed and compressed for storage
+    `exchange` LowCardinality(String),                           -- Only a handful of venues
     `symbol` LowCardinality(String),
-    `event_time` DateTime64(6, 'UTC'),
-    `seq_id` UInt64,
+    `event_time` DateTime64(6, 'UTC') CODEC(DoubleDelta, ZSTD),  -- Same codec as ticks_local
+    `seq_id` UInt64 CODEC(Delta, ZSTD),                          -- Sorted within each symbol, so deltas are tiny
     `event_type` Enum8('trade' = 1, 'quote' = 2, 'book' = 3),
-    `price` Float64,
-    `size` UInt32,
+    `price` Float64 CODEC(Gorilla, ZSTD),                        -- Same codec as ticks_local
+    `size` UInt32 CODEC(T64, ZSTD),                              -- Small integers: T64 drops the unused high bits
     `side` Enum8('buy' = 1, 'sell' = 2),
     `source_version` UInt64 -- This column is the "version"
 )
@@ -22,4 +23,4 @@ ENGINE = ReplicatedReplacingMergeTree(
 PARTITION BY toYYYYMM(event_time)
 ORDER BY (symbol, seq_id); -- This is the deduplication key
 -- Any rows with the same (symbol, seq_id) will be collapsed
--- to the one with the max(source_version).
\ No newline at end of file
+-- to the one with the max(source_version).
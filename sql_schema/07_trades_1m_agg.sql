@@ -3,7 +3,7 @@
 CREATE TABLE IF NOT EXISTS default.trades_1m_agg ON CLUSTER analytics_cluster
 (
     `symbol` LowCardinality(String),
-    `minute` DateTime('UTC'), -- The 1-minute bucket timestamp
+    `minute` DateTime('UTC') CODEC(DoubleDelta, ZSTD), -- The 1-minute bucket timestamp (sorted within each symbol)
 
     -- We use special AggregateFunction data types to store the intermediate states.
     -- This is the "magic" of AggregatingMergeTree.
@@ -0,0 +1,37 @@
+-- This table uses AggregatingMergeTree to summarise quote activity per minute.
+-- Quotes are one-sided rows in 'ticks_local': side = 'buy' is the bid, side = 'sell' is the ask.
+-- Spread, quote-count and mid-price analysis can read these states instead of raw ticks.
+CREATE TABLE IF NOT EXISTS default.quotes_1m_agg ON CLUSTER analytics_cluster
+(
+    `symbol` LowCardinality(String),
+    `exchange` LowCardinality(String),
+    `minute` DateTime('UTC') CODEC(DoubleDelta, ZSTD), -- The 1-minute bucket timestamp (sorted within each symbol)
+
+    -- Number of quote events in the minute
+    `quote_count` AggregateFunction(sum, UInt64),
+
+    -- Mid price averaged over the seconds that had both a bid and an ask.
+    -- Every second weighs the same, so a burst of quotes does not dominate the mid.
+    `twap_mid` AggregateFunction(avgIf, Float64, UInt8),
+
+    -- Lowest and highest quoted price (either side)
+    `low` AggregateFunction(min, Float64),
+    `high` AggregateFunction(max, Float64),
+
+    -- Last bid / ask of the minute: price (arg) at the latest event_time (Max)
+    `last_bid` AggregateFunction(argMax, Float64, DateTime64(6, 'UTC')),
+    `last_ask` AggregateFunction(argMax, Float64, DateTime64(6, 'UTC')),
+
+    -- Quote counts and quoted size per side, used for buy/sell imbalance
+    `bid_count` AggregateFunction(sum, UInt64),
+    `ask_count` AggregateFunction(sum, UInt64),
+    `bid_size` AggregateFunction(sum, UInt64),
+    `ask_size` AggregateFunction(sum, UInt64)
+)
+ENGINE = ReplicatedAggregatingMergeTree(
+    '/clickhouse/tables/{shard}/quotes_1m_agg', -- Keeper path
+    '{replica}'                                  -- Replica name macro
+)
+PARTITION BY toYYYYMM(minute)
+ORDER BY (symbol, minute, exchange) -- symbol + time range reads stay cheap; exchange only splits the bucket
+TTL minute + INTERVAL 2 YEAR; -- Same retention as trades_1m_agg
@@ -0,0 +1,53 @@
+-- This Materialized View is the "robot arm" for our quote rollups.
+-- It watches the 'ticks_local' table...
+CREATE MATERIALIZED VIEW IF NOT EXISTS default.quotes_1m_mv ON CLUSTER analytics_cluster
+TO default.quotes_1m_agg -- ...and inserts the calculated rollups INTO 'quotes_1m_agg'.
+AS SELECT
+    symbol,
+    exchange,
+    toStartOfMinute(second) AS minute,
+
+    sumState(quotes) AS quote_count,
+
+    -- Only seconds that saw both sides have a defined mid
+    avgIfState(mid, isFinite(mid)) AS twap_mid,
+
+    minState(low) AS low,
+    maxState(high) AS high,
+
+    argMaxState(last_bid, last_bid_time) AS last_bid,
+    argMaxState(last_ask, last_ask_time) AS last_ask,
+
+    sumState(bids) AS bid_count,
+    sumState(asks) AS ask_count,
+    sumState(bid_size) AS bid_size,
+    sumState(ask_size) AS ask_size
+
+-- First collapse the inserted block to one row per second,
+-- which is what makes the mid time-weighted.
+FROM
+(
+    SELECT
+        symbol,
+        exchange,
+        toStartOfSecond(event_time) AS second,
+        count() AS quotes,
+        min(price) AS low,
+        max(price) AS high,
+        countIf(side = 'buy') AS bids,
+        countIf(side = 'sell') AS asks,
+        sumIf(size, side = 'buy') AS bid_size,
+        sumIf(size, side = 'sell') AS ask_size,
+        argMaxIf(price, event_time, side = 'buy') AS last_bid,
+        maxIf(event_time, side = 'buy') AS last_bid_time,
+        argMaxIf(price, event_time, side = 'sell') AS last_ask,
+        maxIf(event_time, side = 'sell') AS last_ask_time,
+        (avgIf(price, side = 'buy') + avgIf(price, side = 'sell')) / 2 AS mid
+    FROM default.ticks_local
+
+    -- Only quotes; trades feed trades_1m_agg
+    WHERE event_type = 'quote'
+    GROUP BY symbol, exchange, second
+)
+
+GROUP BY symbol, exchange, minute;
@@ -0,0 +1,27 @@
+-- Same OHLCV/VWAP states as 'trades_1m_agg', split by exchange and aggressor side.
+-- Venue- or side-split analysis reads this rollup instead of scanning 'ticks_all'.
+-- Symbol-only reads keep using 'trades_1m_agg', which has one row per (symbol, minute).
+CREATE TABLE IF NOT EXISTS default.trades_1m_venue_agg ON CLUSTER analytics_cluster
+(
+    `symbol` LowCardinality(String),
+    `minute` DateTime('UTC') CODEC(DoubleDelta, ZSTD), -- The 1-minute bucket timestamp (sorted within each symbol)
+    `exchange` LowCardinality(String),
+    `side` Enum8('buy' = 1, 'sell' = 2),
+
+    -- Identical state columns to trades_1m_agg
+    `open` AggregateFunction(argMin, Float64, DateTime64(6, 'UTC')),
+    `high` AggregateFunction(max, Float64),
+    `low` AggregateFunction(min, Float64),
+    `close` AggregateFunction(argMax, Float64, DateTime64(6, 'UTC')),
+    `volume` AggregateFunction(sum, UInt32),
+    `vwap_pv` AggregateFunction(sum, Float64)
+)
+ENGINE = ReplicatedAggregatingMergeTree(
+    '/clickhouse/tables/{shard}/trades_1m_venue_agg', -- Keeper path
+    '{replica}'                                        -- Replica name macro
+)
+PARTITION BY toYYYYMM(minute)
+-- symbol + minute stay the key prefix, so a symbol/time range still prunes the same granules;
+-- exchange and side only split each minute into at most (exchanges x 2) rows.
+ORDER BY (symbol, minute, exchange, side)
+TTL minute + INTERVAL 2 YEAR; -- Same retention as trades_1m_agg
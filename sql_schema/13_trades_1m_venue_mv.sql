@@ -0,0 +1,24 @@
+-- This Materialized View feeds the exchange/side-split rollups.
+-- It watches the 'ticks_local' table...
+CREATE MATERIALIZED VIEW IF NOT EXISTS default.trades_1m_venue_mv ON CLUSTER analytics_cluster
+TO default.trades_1m_venue_agg -- ...and inserts the calculated rollups INTO 'trades_1m_venue_agg'.
+AS SELECT
+    symbol,
+    toStartOfMinute(event_time) AS minute,
+    exchange,
+    side,
+
+    -- Same '...State' functions as trades_1m_mv
+    argMinState(price, event_time) AS open,
+    maxState(price) AS high,
+    minState(price) AS low,
+    argMaxState(price, event_time) AS close,
+    sumState(size) AS volume,
+    sumState(price * size) AS vwap_pv
+
+FROM default.ticks_local
+
+-- Only trades, like trades_1m_mv
+WHERE event_type = 'trade'
+
+GROUP BY symbol, minute, exchange, side;
@@ -0,0 +1,37 @@
+-- This table stores mergeable sketch "states" per symbol and minute.
+-- Approximate questions (distinct seq_ids, price quantiles, trade size distribution)
+-- merge these small states instead of scanning every raw tick.
+CREATE TABLE IF NOT EXISTS default.ticks_sketch_1m_agg ON CLUSTER analytics_cluster
+(
+    `symbol` LowCardinality(String),
+    `minute` DateTime('UTC') CODEC(DoubleDelta, ZSTD), -- The 1-minute bucket timestamp (sorted within each symbol)
+
+    -- uniqState: adaptive-sampling distinct count of seq_id over all event types
+    `seq_ids` AggregateFunction(uniq, UInt64),
+
+    -- Trade count and volume are plain sums, so they stay exact
+    `trades` AggregateFunction(countIf, UInt8),
+    `volume` AggregateFunction(sumIf, UInt32, UInt8),
+
+    -- t-digest sketches over trades only.
+    -- The levels must match QUANTILE_LEVELS in api/approx.py.
+    `price_quantiles` AggregateFunction(quantilesTDigestIf(0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99), Float64, UInt8),
+    `size_quantiles` AggregateFunction(quantilesTDigestIf(0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99), UInt32, UInt8)
+)
+ENGINE = ReplicatedAggregatingMergeTree(
+    '/clickhouse/tables/{shard}/ticks_sketch_1m_agg', -- Keeper path
+    '{replica}'                                        -- Replica name macro
+)
+PARTITION BY toYYYYMM(minute)
+ORDER BY (symbol, minute)
+TTL minute + INTERVAL 2 YEAR; -- Same retention as trades_1m_agg
+
+-- Ticks of one symbol land on both shards (rand() sharding), so sketches are merged
+-- across the cluster.
+CREATE TABLE IF NOT EXISTS default.ticks_sketch_1m_all ON CLUSTER analytics_cluster
+AS default.ticks_sketch_1m_agg
+ENGINE = Distributed(
+    analytics_cluster,
+    'default',
+    'ticks_sketch_1m_agg'
+);
@@ -0,0 +1,20 @@
+-- This Materialized View feeds the sketch rollups.
+-- It watches the 'ticks_local' table...
+CREATE MATERIALIZED VIEW IF NOT EXISTS default.ticks_sketch_1m_mv ON CLUSTER analytics_cluster
+TO default.ticks_sketch_1m_agg -- ...and inserts the sketch states INTO 'ticks_sketch_1m_agg'.
+AS SELECT
+    symbol,
+    toStartOfMinute(event_time) AS minute,
+
+    -- Every event carries a seq_id, so distinct counts cover all event types
+    uniqState(seq_id) AS seq_ids,
+
+    -- The rest only describe trades
+    countIfState(event_type = 'trade') AS trades,
+    sumIfState(size, event_type = 'trade') AS volume,
+    quantilesTDigestIfState(0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)(price, event_type = 'trade') AS price_quantiles,
+    quantilesTDigestIfState(0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)(size, event_type = 'trade') AS size_quantiles
+
+FROM default.ticks_local
+
+GROUP BY symbol, minute;
@@ -0,0 +1,31 @@
+-- Moves an existing 'ticks_local' onto tiered storage.
+-- Tables created from the current 01_ticks_local.sql already have this; re-running it is a no-op.
+-- The 'tiered' policy contains the 'default' disk, so existing parts stay where they are.
+ALTER TABLE default.ticks_local ON CLUSTER analytics_cluster
+    MODIFY SETTING storage_policy = 'tiered';
+
+-- Replace the 30-day DELETE with a move to the cold volume.
+-- Partitions are exported to Parquet and dropped by archive_partitions.py instead.
+ALTER TABLE default.ticks_local ON CLUSTER analytics_cluster
+    MODIFY TTL toDateTime(event_time) + INTERVAL 30 DAY TO VOLUME 'cold';
+
+-- Records which partitions were exported to Parquet and where,
+-- so the API can read them back when a range predates the hot tier.
+CREATE TABLE IF NOT EXISTS default.ticks_archive_manifest ON CLUSTER analytics_cluster
+(
+    `table` LowCardinality(String),            -- Source table (ticks_local)
+    `partition_id` String,                     -- e.g. 202409
+    `shard` LowCardinality(String),            -- Shard macro of the node the partition came from
+    `path` String,                             -- Object key / file path relative to the archive root
+    `rows` UInt64,
+    `min_time` DateTime64(6, 'UTC'),
+    `max_time` DateTime64(6, 'UTC'),
+    `dropped` UInt8 DEFAULT 0,                 -- 1 once the partition was dropped from ClickHouse after export
+    `archived_at` DateTime('UTC') DEFAULT now()
+)
+ENGINE = ReplicatedReplacingMergeTree(
+    '/clickhouse/tables/ticks_archive_manifest', -- One manifest for the whole cluster (no {shard})
+    '{replica}',
+    archived_at
+)
+ORDER BY (table, partition_id, shard); -- The latest entry per partition wins (e.g. dropped = 1 after the drop)
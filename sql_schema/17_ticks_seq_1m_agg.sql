@@ -0,0 +1,39 @@
+-- This table keeps a bitmap of the seq_ids seen per symbol and minute.
+-- Completeness questions (gaps, duplicates, out-of-order and late ticks) merge these
+-- compressed bitmaps instead of scanning every raw tick.
+CREATE TABLE IF NOT EXISTS default.ticks_seq_1m_agg ON CLUSTER analytics_cluster
+(
+    `symbol` LowCardinality(String),
+    `minute` DateTime('UTC') CODEC(DoubleDelta, ZSTD), -- The 1-minute bucket timestamp (sorted within each symbol)
+
+    -- Roaring bitmap of the seq_ids of original ticks (source_version = 1).
+    -- Corrections reuse an existing seq_id, so they are counted separately.
+    `seq_ids` AggregateFunction(groupBitmap, UInt64),
+    `min_seq` AggregateFunction(min, UInt64),
+    `max_seq` AggregateFunction(max, UInt64),
+
+    -- Original ticks received; more than the bitmap cardinality means re-delivered duplicates
+    `originals` SimpleAggregateFunction(sum, UInt64),
+    `corrections` SimpleAggregateFunction(sum, UInt64),
+
+    -- Ticks written more than 120s of event time behind a tick written before them
+    -- in the same insert block (see 18_ticks_seq_1m_mv.sql)
+    `late` SimpleAggregateFunction(sum, UInt64),
+    `max_lag_seconds` SimpleAggregateFunction(max, Int64)
+)
+ENGINE = ReplicatedAggregatingMergeTree(
+    '/clickhouse/tables/{shard}/ticks_seq_1m_agg', -- Keeper path
+    '{replica}'                                     -- Replica name macro
+)
+PARTITION BY toYYYYMM(minute)
+ORDER BY (symbol, minute)
+TTL minute + INTERVAL 2 YEAR; -- Same retention as trades_1m_agg
+
+-- A seq_id can land on either shard, so bitmaps are merged across the cluster.
+CREATE TABLE IF NOT EXISTS default.ticks_seq_1m_all ON CLUSTER analytics_cluster
+AS default.ticks_seq_1m_agg
+ENGINE = Distributed(
+    analytics_cluster,
+    'default',
+    'ticks_seq_1m_agg'
+);
@@ -0,0 +1,34 @@
+-- This table stores a volume-at-price histogram per symbol and minute.
+-- Volume profiles and VWAP bands over any window merge these small maps,
+-- so the cost follows the number of minutes, not the number of trades.
+CREATE TABLE IF NOT EXISTS default.trades_profile_1m_agg ON CLUSTER analytics_cluster
+(
+    `symbol` LowCardinality(String),
+    `minute` DateTime('UTC') CODEC(DoubleDelta, ZSTD), -- The 1-minute bucket timestamp (sorted within each symbol)
+
+    -- sumMap state: price in cents -> traded size at that price.
+    -- The API groups the cents into wider buckets when it merges.
+    `profile` AggregateFunction(sumMap, Array(UInt32), Array(UInt64)),
+
+    -- Volume-weighted moments of the price: VWAP = pv / volume,
+    -- variance = pv2 / volume - VWAP^2
+    `volume` SimpleAggregateFunction(sum, UInt64),
+    `pv` SimpleAggregateFunction(sum, Float64),
+    `pv2` SimpleAggregateFunction(sum, Float64)
+)
+ENGINE = ReplicatedAggregatingMergeTree(
+    '/clickhouse/tables/{shard}/trades_profile_1m_agg', -- Keeper path
+    '{replica}'                                          -- Replica name macro
+)
+PARTITION BY toYYYYMM(minute)
+ORDER BY (symbol, minute)
+TTL minute + INTERVAL 2 YEAR; -- Same retention as trades_1m_agg
+
+-- Trades land on either shard, so profiles and moments are merged across the cluster.
+CREATE TABLE IF NOT EXISTS default.trades_profile_1m_all ON CLUSTER analytics_cluster
+AS default.trades_profile_1m_agg
+ENGINE = Distributed(
+    analytics_cluster,
+    'default',
+    'trades_profile_1m_agg'
+);
@@ -0,0 +1,20 @@
+-- This Materialized View fills the volume-at-price histograms.
+CREATE MATERIALIZED VIEW IF NOT EXISTS default.trades_profile_1m_mv ON CLUSTER analytics_cluster
+TO default.trades_profile_1m_agg
+AS SELECT
+    symbol,
+    toStartOfMinute(event_time) AS minute,
+
+    -- One (price in cents, size) pair per trade; sumMap adds up equal prices
+    sumMapState([toUInt32(round(price * 100))], [toUInt64(size)]) AS profile,
+
+    sum(toUInt64(size)) AS volume,
+    sum(price * size) AS pv,
+    sum(price * price * size) AS pv2
+
+FROM default.ticks_local
+
+-- Same trades as trades_1m_agg, so the VWAP matches /backtest/fast
+WHERE event_type = 'trade'
+
+GROUP BY symbol, minute;
@@ -0,0 +1,26 @@
+-- This table logs the days whose trade rollup minutes were rewritten after the fact
+-- (repair_rollups.py, apply_corrections.py). The API bar store stores finalised bars
+-- on its host and re-fetches the logged days, so repaired history reaches it too.
+CREATE TABLE IF NOT EXISTS default.rollup_rewrites ON CLUSTER analytics_cluster
+(
+    `symbol` LowCardinality(String),             -- '' when every symbol of the day was rewritten
+    `day` Date,
+    `source` LowCardinality(String),             -- The tool that rewrote the minutes
+    `rewritten_at` DateTime64(6, 'UTC') DEFAULT now64(6, 'UTC')
+)
+ENGINE = ReplicatedMergeTree(
+    '/clickhouse/tables/{shard}/rollup_rewrites', -- Keeper path
+    '{replica}'                                    -- Replica name macro
+)
+PARTITION BY toYYYYMM(rewritten_at)
+ORDER BY rewritten_at
+TTL toDateTime(rewritten_at) + INTERVAL 30 DAY; -- Bar stores check every few seconds
+
+-- A tool records a rewrite on the shard it rebuilt, so readers merge both shards.
+CREATE TABLE IF NOT EXISTS default.rollup_rewrites_all ON CLUSTER analytics_cluster
+AS default.rollup_rewrites
+ENGINE = Distributed(
+    analytics_cluster,
+    'default',
+    'rollup_rewrites'
+);
@@ -8,3 +8,15 @@
 \include 07_trades_1m_agg.sql
 \include 08_trades_1m_mv.sql
 \include 09_local_to_dedup_mv.sql
+\include 10_quotes_1m_agg.sql
+\include 11_quotes_1m_mv.sql
+\include 12_trades_1m_venue_agg.sql
+\include 13_trades_1m_venue_mv.sql
+\include 14_ticks_sketch_1m_agg.sql
+\include 15_ticks_sketch_1m_mv.sql
+\include 16_ticks_local_tiered_storage.sql
+\include 17_ticks_seq_1m_agg.sql
+\include 18_ticks_seq_1m_mv.sql
+\include 19_trades_profile_1m_agg.sql
+\include 20_trades_profile_1m_mv.sql
+\include 21_rollup_rewrites.sql
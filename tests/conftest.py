@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The API modules import each other by bare name (they run from api/)
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+
+@pytest.fixture(scope="session")
+def local_client(tmp_path_factory):
+    """Embedded ClickHouse with the sql_schema tables and no data (skipped without chDB)."""
+    pytest.importorskip("chdb")
+    from local_backend import LocalClient, create_schema
+
+    client = LocalClient(str(tmp_path_factory.mktemp("local_db")))
+    create_schema(client)
+    return client
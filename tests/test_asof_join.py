@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from asof_join import (
+    ASOF_COLUMNS, ASOF_JOIN_QUERY, QUOTES_WINDOW_QUERY, TRADES_WINDOW_QUERY,
+    align_trades, aligned_rows, split_quotes,
+)
+from ingest import INSERT_QUERY
+
+SYMBOL = "ASOF"
+START = datetime(2031, 3, 4, 10, 0, tzinfo=timezone.utc)
+STALENESS_SECONDS = 60
+
+
+def tick(second, event_type, side, price):
+    return ("NASDAQ", SYMBOL, START + timedelta(seconds=second), 0, event_type, price, 100, side, 1)
+
+
+@pytest.fixture(scope="module")
+def params(local_client):
+    local_client.execute(INSERT_QUERY, [
+        tick(-90, "quote", "buy", 99.0),      # before the window and too old for the first trade
+        tick(-30, "quote", "sell", 101.0),    # before the window, fresh enough
+        tick(5, "trade", "buy", 100.5),
+        tick(10, "quote", "buy", 99.5),
+        tick(20, "trade", "sell", 99.75),
+        tick(200, "trade", "buy", 100.0),     # both quotes are stale by now
+    ])
+    end = START + timedelta(minutes=5)
+    return {
+        'symbol': SYMBOL, 'start': START, 'end': end, 'limit': 100,
+        'quote_start': START - timedelta(seconds=STALENESS_SECONDS),
+        'max_staleness_us': STALENESS_SECONDS * 1_000_000,
+    }
+
+
+def server_rows(local_client, params):
+    data, columns = local_client.execute(ASOF_JOIN_QUERY, params, with_column_types=True)
+    assert tuple(c[0] for c in columns) == ASOF_COLUMNS
+    return [dict(zip(ASOF_COLUMNS, row)) for row in data]
+
+
+def client_rows(local_client, params):
+    trade_ts, price, size, is_buy = local_client.execute(TRADES_WINDOW_QUERY, params, columnar=True)
+    quotes = split_quotes(*local_client.execute(QUOTES_WINDOW_QUERY, params, columnar=True))
+    return aligned_rows(trade_ts, price, size, is_buy, align_trades(trade_ts, quotes, params['max_staleness_us']))
+
+
+def micros(second):
+    return int((START + timedelta(seconds=second)).timestamp()) * 1_000_000
+
+
+def test_modes_return_the_same_rows(local_client, params):
+    assert server_rows(local_client, params) == client_rows(local_client, params) == [
+        {"trade_time_us": micros(5), "price": 100.5, "size": 100, "side": "buy",
+         "bid": None, "bid_time_us": None, "ask": 101.0, "ask_time_us": micros(-30), "mid": None, "spread": None},
+        {"trade_time_us": micros(20), "price": 99.75, "size": 100, "side": "sell",
+         "bid": 99.5, "bid_time_us": micros(10), "ask": 101.0, "ask_time_us": micros(-30),
+         "mid": 100.25, "spread": 1.5},
+        {"trade_time_us": micros(200), "price": 100.0, "size": 100, "side": "buy",
+         "bid": None, "bid_time_us": None, "ask": None, "ask_time_us": None, "mid": None, "spread": None},
+    ]
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from bar_store import BarStore, SECONDS_PER_DAY
+from ingest import INSERT_QUERY
+
+SYMBOL = "BSTORE"
+
+
+def trade(at, seq_id, price, size=100):
+    return ("NASDAQ", SYMBOL, at, seq_id, "trade", price, size, "buy", 1)
+
+
+@pytest.fixture(scope="module")
+def day_start(local_client):
+    """One trade a minute from 10:00 to 10:29, two days ago."""
+    midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_start = midnight - timedelta(days=2)
+    local_client.execute(INSERT_QUERY, [
+        trade(day_start + timedelta(hours=10, minutes=m, seconds=5), m, 100.0 + m) for m in range(30)
+    ])
+    return day_start
+
+
+@pytest.fixture
+def store(tmp_path, local_client, day_start):
+    store = BarStore(tmp_path)
+    assert store.sync(local_client, SYMBOL) == 30
+    return store
+
+
+def window(day_start):
+    start = int(day_start.timestamp())
+    return start, start + SECONDS_PER_DAY
+
+
+def test_stored_bars_are_copies(store, local_client, day_start):
+    bars = store.stored(SYMBOL, *window(day_start))
+    assert len(bars) == 30
+    assert bars["close"].tolist() == [100.0 + m for m in range(30)]
+    assert not np.shares_memory(bars, store._day(SYMBOL, int(day_start.timestamp()) // SECONDS_PER_DAY))
+
+
+def test_stored_copies_only_the_requested_minutes(store, day_start):
+    ten = int(day_start.timestamp()) + 10 * 3600
+    bars = store.stored(SYMBOL, ten + 5 * 60, ten + 8 * 60)
+    assert bars["close"].tolist() == [105.0, 106.0, 107.0]
+    # Ranges over several days skip the ones that are not stored
+    start, end = window(day_start)
+    assert len(store.stored(SYMBOL, start - SECONDS_PER_DAY, end + SECONDS_PER_DAY)) == 30
+    assert len(store.stored(SYMBOL, ten + 40 * 60, end)) == 0
+
+
+def test_rewritten_days_are_refetched(store, local_client, day_start):
+    minute = day_start + timedelta(hours=10, minutes=3)
+    # A late trade lands in a stored minute; the store keeps serving the old bar
+    local_client.execute(INSERT_QUERY, [trade(minute + timedelta(seconds=30), 1000, 150.0, 500)])
+    assert store.apply_rewrites(local_client, force=True) == 0
+    assert store.stored(SYMBOL, *window(day_start))["volume"][3] == 100
+
+    local_client.execute("INSERT INTO default.rollup_rewrites (symbol, day, source) VALUES",
+                         [(SYMBOL, minute.date(), "test")])
+    assert store.apply_rewrites(local_client, force=True) == 1
+    bars = store.stored(SYMBOL, *window(day_start))
+    assert len(bars) == 30
+    assert (bars["volume"][3], bars["high"][3], bars["close"][3]) == (600, 150.0, 150.0)
+
+    # Entries are applied once; a restart only re-applies the ones within the overlap
+    assert store.apply_rewrites(local_client, force=True) == 0
+    restarted = BarStore(store.root)
+    assert restarted.apply_rewrites(local_client, force=True) == 1
+    assert restarted.stored(SYMBOL, *window(day_start)).tolist() == bars.tolist()
+
+
+def test_rewrites_for_every_symbol(store, local_client, day_start):
+    store.apply_rewrites(local_client, force=True)   # entries of earlier tests
+    local_client.execute("INSERT INTO default.rollup_rewrites (symbol, day, source) VALUES",
+                         [("", day_start.date(), "test"), ("", (day_start - timedelta(days=60)).date(), "test")])
+    # Only the stored day is re-fetched
+    assert store.apply_rewrites(local_client, force=True) == 1
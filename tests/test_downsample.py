@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from bar_store import BAR_DTYPE
+from downsample import NICE_BUCKETS, bucket_minutes, build_bucketed_query, ohlc_buckets
+from ingest import INSERT_QUERY
+from query_templates import QUERIES
+
+START = datetime(2030, 1, 2, 14, 30, tzinfo=timezone.utc)
+MINUTES = 60
+# The same trades three minutes later, so the window is not aligned to any bucket
+OFFSET_SYMBOL, OFFSET = "DSMPO", timedelta(minutes=3)
+
+
+@pytest.fixture(scope="module")
+def trades(local_client):
+    """
+    Four trades a minute for one hour, on both exchanges, at known prices (and a copy
+    of them for OFFSET_SYMBOL, OFFSET later).
+    """
+    rng = np.random.default_rng(7)
+    rows = []
+    for minute in range(MINUTES):
+        for i in range(4):
+            rows.append((
+                ("NASDAQ", "NYSE")[i % 2], "DSMP", START + timedelta(minutes=minute, seconds=10 * i + 1),
+                minute * 4 + i, "trade", float(round(100 + rng.normal(), 2)), int(rng.integers(1, 500)),
+                ("buy", "sell")[i // 2], 1,
+            ))
+    local_client.execute(INSERT_QUERY, rows)
+    local_client.execute(INSERT_QUERY, [(r[0], OFFSET_SYMBOL, r[2] + OFFSET, *r[3:]) for r in rows])
+    return rows
+
+
+def minute_bars(local_client, symbol="DSMP"):
+    data, columns = QUERIES.execute(local_client.execute, "ohlcv_1m_rollup", {"symbol": symbol, "limit": 1000},
+                                    with_column_types=True)
+    names = [c[0] for c in columns]
+    bars = np.zeros(len(data), dtype=BAR_DTYPE)
+    for field in BAR_DTYPE.names:
+        values = [row[names.index(field)] for row in data]
+        bars[field] = [v.timestamp() for v in values] if field == "minute" else values
+    return bars[::-1]
+
+
+def test_rollup_matches_raw_trades(local_client, trades):
+    bars = minute_bars(local_client)
+    assert len(bars) == MINUTES
+    first = [r for r in trades if r[2] < START + timedelta(minutes=1)]
+    assert bars["open"][0] == first[0][5]
+    assert bars["volume"][0] == sum(r[6] for r in first)
+    assert bars["vwap"][0] == pytest.approx(sum(r[5] * r[6] for r in first) / bars["volume"][0])
+
+
+@pytest.mark.parametrize("symbol", ["DSMP", OFFSET_SYMBOL])
+@pytest.mark.parametrize("limit, max_points", [(60, 12), (60, 4), (30, 10), (57, 12)])
+def test_bucketed_query_matches_rebucketed_minutes(local_client, trades, symbol, limit, max_points):
+    bucket = bucket_minutes(limit, max_points)
+    query = build_bucketed_query("trades_1m_agg", ["symbol = {symbol:String}"])
+    rows = local_client.execute(query, {"symbol": symbol, "limit": limit, "bucket": bucket})
+
+    expected = ohlc_buckets(minute_bars(local_client, symbol)[-limit:], bucket)
+    assert len(rows) == len(expected) <= max_points
+    rows = rows[::-1]
+    assert [r[0].timestamp() for r in rows] == expected["minute"].tolist()
+    for column, field in ((2, "open"), (3, "high"), (4, "low"), (5, "close"), (6, "volume")):
+        assert [r[column] for r in rows] == expected[field].tolist()
+    assert [r[7] for r in rows] == pytest.approx(expected["vwap"].tolist())
+
+
+@pytest.mark.parametrize("span", [1, 2, 30, 57, 60, 390, 1441, 10080, 100_000])
+@pytest.mark.parametrize("max_points", [2, 3, 12, 100, 500])
+def test_bucket_fits_wherever_the_window_starts(span, max_points):
+    bucket = bucket_minutes(span, max_points)
+    touched = max((offset + span - 1) // bucket + 1 for offset in range(bucket))
+    assert touched <= max_points
+    # ...and the next smaller nice bucket would not fit
+    smaller = [b for b in NICE_BUCKETS if b < bucket]
+    if smaller and bucket in NICE_BUCKETS:
+        assert (span + smaller[-1] - 2) // smaller[-1] + 1 > max_points
+
+
+def test_bucketed_query_filters_by_venue(local_client, trades):
+    query = build_bucketed_query("trades_1m_venue_agg", ["symbol = {symbol:String}", "exchange = {exchange:String}"])
+    rows = local_client.execute(query, {"symbol": "DSMP", "exchange": "NYSE", "limit": MINUTES, "bucket": 15})
+    assert len(rows) == 4
+    assert sum(r[6] for r in rows) == sum(r[6] for r in trades if r[0] == "NYSE")
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from ingest import BufferFull, INSERT_QUERY, IngestBuffer, validate_batch
+
+
+class RecordingClient:
+    def __init__(self):
+        self.blocks = []
+        self.lock = threading.Lock()
+
+    def execute(self, query, rows, settings=None):
+        assert query == INSERT_QUERY
+        with self.lock:
+            self.blocks.append(list(rows))
+
+
+def tick(seq_id, **overrides):
+    return dict({
+        "exchange": "NASDAQ", "symbol": "AAPL", "event_time": "2024-01-02T14:30:00Z",
+        "seq_id": seq_id, "event_type": "trade", "price": 190.5, "size": 100,
+        "side": "buy", "source_version": 1,
+    }, **overrides)
+
+
+@pytest.fixture
+def recording():
+    return RecordingClient()
+
+
+@pytest.fixture
+def buffer(recording):
+    buffer = IngestBuffer(lambda: recording, capacity=1000, flush_rows=500, flush_seconds=0.2)
+    yield buffer
+    buffer.close()
+
+
+def test_small_sequential_batches_commit_within_flush_seconds(buffer, recording):
+    for batch in range(2):
+        rows, errors = validate_batch([tick(batch * 10 + i) for i in range(10)])
+        assert not errors
+        started = time.monotonic()
+        seq = buffer.submit(rows)
+        assert buffer.wait_committed(seq, timeout=2)
+        assert time.monotonic() - started < 1
+    assert [len(block) for block in recording.blocks] == [10, 10]
+    assert buffer.depth() == 0
+
+
+def test_full_block_flushes_without_waiting(recording):
+    buffer = IngestBuffer(lambda: recording, capacity=1000, flush_rows=50, flush_seconds=60)
+    try:
+        rows, _ = validate_batch([tick(i) for i in range(100)])
+        seq = buffer.submit(rows)
+        assert buffer.wait_committed(seq, timeout=2)
+        assert [len(block) for block in recording.blocks] == [50, 50]
+    finally:
+        buffer.close()
+
+
+def test_capacity_is_enforced(recording):
+    buffer = IngestBuffer(lambda: recording, capacity=1000, flush_rows=1000, flush_seconds=60)
+    try:
+        rows, _ = validate_batch([tick(i) for i in range(600)])
+        buffer.submit(rows)
+        with pytest.raises(BufferFull):
+            buffer.submit(rows)
+        assert buffer.depth() == 600
+    finally:
+        buffer.close()
+
+
+def test_failed_flush_keeps_rows(recording):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("down")
+        return recording
+
+    buffer = IngestBuffer(factory, capacity=100, flush_rows=100, flush_seconds=0.05)
+    try:
+        rows, _ = validate_batch([tick(i) for i in range(5)])
+        seq = buffer.submit(rows)
+        assert not buffer.wait_committed(seq, timeout=0.5)
+        assert buffer.stats["flush_errors"] == 1
+        assert buffer.wait_committed(seq, timeout=3)
+        assert recording.blocks == [rows]
+    finally:
+        buffer.close()
+
+
+def test_validation_reports_every_rejected_tick():
+    rows, errors = validate_batch([tick(0), tick(1, price=-1), tick(2, side="both"), {"symbol": "AAPL"}])
+    assert len(rows) == 1
+    assert [e["index"] for e in errors] == [1, 2, 3]
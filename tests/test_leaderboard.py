@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from leaderboard import METRICS, IndexedHeap, Leaderboard
+
+T0 = 1_900_000_000  # a multiple of the bucket size
+
+
+def test_indexed_heap_matches_a_sorted_dict():
+    rng = random.Random(7)
+    heap, expected = IndexedHeap(), {}
+    for _ in range(2000):
+        item = rng.randrange(50)
+        if rng.random() < 0.3:
+            heap.remove(item)
+            expected.pop(item, None)
+        else:
+            key = rng.randint(-100, 100)
+            heap.update(item, key)
+            expected[item] = key
+        assert len(heap) == len(expected)
+    assert all(item in heap for item in expected)
+    keys = sorted(expected.values(), reverse=True)
+    for k in (1, 5, len(expected), len(expected) + 10):
+        assert [key for _, key in heap.top(k)] == keys[:k]
+        assert all(expected[item] == key for item, key in heap.top(k))
+
+
+def test_indexed_heap_remove_edge_cases():
+    heap = IndexedHeap()
+    heap.remove("missing")
+    heap.update("a", 1)
+    heap.remove("a")
+    assert len(heap) == 0 and heap.top(3) == []
+    for item, key in (("a", 5), ("b", 3), ("c", 4), ("d", 1)):
+        heap.update(item, key)
+    heap.remove("d")   # the last slot
+    heap.remove("a")   # the root
+    assert heap.top(5) == [("c", 4), ("b", 3)]
+
+
+@pytest.fixture
+def board():
+    """One 1-minute window in 5s buckets: A trades at 0s, B at 30s."""
+    board = Leaderboard(windows=(1,), bucket_seconds=5)
+    board.observe("A", T0, 10.0, 100)
+    board.observe("B", T0 + 30, 20.0, 50)
+    return board
+
+
+def symbols(board, metric):
+    return [row["symbol"] for row in board.top(metric, 1, 10)]
+
+
+def test_expired_symbols_leave_the_window(board):
+    assert symbols(board, "volume") == ["A", "B"]
+
+    board.observe("C", T0 + 61, 5.0, 10)   # A's bucket leaves the window
+    window = board.windows[1]
+    assert symbols(board, "volume") == ["B", "C"]
+    assert all("A" not in window.heaps[metric] for metric in METRICS)
+    assert "A" not in window.volume and "A" not in window.notional
+    assert all("A" not in symbols(board, metric) for metric in METRICS)
+
+    # Back in the window, its move is measured from the last price before it
+    board.observe("A", T0 + 70, 11.0, 5)
+    [row] = [r for r in board.top("gainers", 1, 10) if r["symbol"] == "A"]
+    assert (row["volume"], row["change_pct"]) == (5, pytest.approx(10.0))
+
+
+def test_zero_size_trades_do_not_break_expiry(board):
+    board.observe("A", T0 + 40, 10.5, 0)
+    board.observe("C", T0 + 61, 5.0, 10)   # A's volume drops to 0 with its first bucket
+    assert symbols(board, "volume") == ["B", "C"]
+    board.observe("C", T0 + 120, 5.0, 10)  # the zero-size bucket expires too
+    assert symbols(board, "volume") == ["C"]
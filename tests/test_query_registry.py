@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ingest import INSERT_QUERY
+from query_registry import QueryRegistry, QueryTemplate, check_pruning, convert, full_scans
+from query_templates import QUERIES
+
+# EXPLAIN indexes = 1 output (trimmed) for a read pruned by symbol and one that is not
+PRUNED = """\
+└──ReadFromMergeTree (default.ticks_local)
+      Indexes:
+        Min-Max
+          Condition: true
+        Partition
+          Condition: true
+        PrimaryKey
+          Keys:
+            symbol
+          Condition: (symbol in ['A', 'A'])
+          Parts: 1/1
+""".splitlines()
+FULL_SCAN = """\
+   └──ReadFromMergeTree (default.trades_1m_agg)
+         Indexes:
+           Min-Max
+             Condition: (minute in [1, +Inf))
+           PrimaryKey
+             Condition: true
+             Parts: 1/1
+""".splitlines()
+# Tables without a primary key have no PrimaryKey index at all
+NO_KEY = """\
+└──ReadFromMergeTree (default.no_key)
+      Indexes:
+        Partition
+          Condition: (day in [1, 1])
+""".splitlines()
+
+
+@pytest.mark.parametrize("type_name, value, expected", [
+    ("String", "AAPL", "AAPL"),
+    ("UInt32", "42", 42),
+    ("UInt32", 7.0, 7),
+    ("Int8", -128, -128),
+    ("UInt64", 2 ** 64 - 1, 2 ** 64 - 1),
+    ("Float64", "1.5", 1.5),
+    ("Float32", 2, 2.0),
+    ("DateTime64(6, 'UTC')", "2024-01-02T03:04:05Z", datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)),
+    ("DateTime", datetime(2024, 1, 2, 3, 4, 5), datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)),
+    ("DateTime", "2024-01-02T05:04:05+02:00", datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)),
+    ("Array(String)", ("A", "B"), ["A", "B"]),
+    ("Array(UInt8)", ["1", 2], [1, 2]),
+])
+def test_convert(type_name, value, expected):
+    assert convert(type_name, value) == expected
+
+
+@pytest.mark.parametrize("type_name, value, message", [
+    ("String", 1, "must be a string"),
+    ("UInt32", True, "must be an integer"),
+    ("UInt32", 1.5, "must be an integer"),
+    ("UInt32", "x", "must be an integer"),
+    ("UInt8", 256, "between 0 and 255"),
+    ("UInt32", -1, "between 0 and"),
+    ("Int8", -129, "between -128 and 127"),
+    ("Float64", False, "must be a number"),
+    ("Float64", "x", "must be a number"),
+    ("DateTime", "yesterday", "ISO 8601"),
+    ("DateTime", 1700000000, "must be a timestamp"),
+    ("Array(String)", "A", "must be a list"),
+    ("Array(UInt8)", [1, 300], r"value\[1\] must be between"),
+    ("Decimal(9, 2)", 1, "Unsupported parameter type"),
+])
+def test_convert_rejects(type_name, value, message):
+    with pytest.raises(ValueError, match=message):
+        convert(type_name, value)
+
+
+def test_template_reads_parameter_types():
+    template = QueryTemplate("t", "SELECT 1 WHERE a = {a:UInt32} AND b IN {b:Array(String)} AND a > {a:UInt32}", "raw")
+    assert template.params == {"a": "UInt32", "b": "Array(String)"}
+    assert template.bind({"a": "3", "b": ("x",)}) == {"a": 3, "b": ["x"]}
+    with pytest.raises(ValueError, match="missing parameter"):
+        template.bind({"a": 3})
+    with pytest.raises(ValueError, match="unknown parameter"):
+        template.bind({"a": 3, "b": [], "c": 1})
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("SELECT %(a)s", "server-side"),
+    ("SELECT {a:UInt32} + {a:UInt64}", "declared as UInt32 and UInt64"),
+    ("SELECT {a:Decimal(9, 2)}", "Unsupported parameter type"),
+])
+def test_template_rejects(sql, message):
+    with pytest.raises(ValueError, match=message):
+        QueryTemplate("t", sql, "raw")
+
+
+def test_route_and_versions():
+    registry = QueryRegistry()
+    registry.register(QueryTemplate("count_raw", "SELECT 1", "raw", group="count", provides=("exact",)))
+    registry.register(QueryTemplate("count_rollup", "SELECT 2", "rollup", group="count"))
+    registry.register(QueryTemplate("count_rollup", "SELECT 3", "rollup", version=2, group="count"))
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register(QueryTemplate("count_rollup", "SELECT 4", "rollup", group="count"))
+
+    assert registry.get("count_rollup").sql == "SELECT 3"
+    assert registry.get("count_rollup", 1).sql == "SELECT 2"
+    assert registry.route("count").key == "count_rollup@v2"
+    assert registry.route("count", needs=("exact",)).key == "count_raw@v1"
+    with pytest.raises(KeyError):
+        registry.route("count", needs=("deduplicated",))
+
+
+def test_execute_records_latency_and_errors():
+    registry = QueryRegistry()
+    registry.register(QueryTemplate("t", "SELECT {n:UInt8}", "raw"))
+    sent = []
+    assert registry.execute(lambda sql, params: sent.append(params) or "ok", "t", {"n": "5"}) == "ok"
+    assert sent == [{"n": 5}]
+
+    def failing(sql, params):
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        registry.execute(failing, "t", {"n": 1})
+    with pytest.raises(ValueError):
+        registry.execute(failing, "t", {"n": 256})   # rejected before the query is sent
+    stats = registry.stats()["t@v1"]
+    assert (stats["calls"], stats["errors"]) == (2, 1)
+    assert stats["max_ms"] >= stats["p95_ms"] >= stats["p50_ms"] >= 0
+
+
+def test_full_scans():
+    assert full_scans(PRUNED) == []
+    assert full_scans(FULL_SCAN) == ["default.trades_1m_agg"]
+    assert full_scans(NO_KEY) == ["default.no_key"]
+    assert full_scans(PRUNED + FULL_SCAN + PRUNED) == ["default.trades_1m_agg"]
+    assert full_scans([]) == []
+
+
+def test_registered_templates_prune(local_client):
+    # Empty tables are not read at all, so give every rollup one recent row
+    at = datetime.now(timezone.utc) - timedelta(hours=1)
+    local_client.execute(INSERT_QUERY, [("NASDAQ", "AAPL", at, 0, "trade", 100.0, 100, "buy", 1)])
+
+    unpruned = QueryTemplate("unpruned", "SELECT sum(size) FROM default.ticks_all WHERE size > {n:UInt32}", "raw",
+                             sample_params={"n": 0})
+    assert check_pruning(local_client.execute, unpruned) == ["default.ticks_local"]
+
+    scans = {t.key: check_pruning(local_client.execute, t) for t in QUERIES.templates() if t.check_pruning}
+    assert {key: tables for key, tables in scans.items() if tables} == {}
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ingest import INSERT_QUERY
+from query_templates import QUERIES
+from sequence_quality import build_queries, summarise
+
+SYMBOL = "SEQQ"
+START = datetime(2031, 1, 2, 10, 0, tzinfo=timezone.utc)
+WINDOW = {"start": START, "end": START + timedelta(minutes=3)}
+
+
+def tick(second, seq_id, version=1):
+    return ("NASDAQ", SYMBOL, START + timedelta(seconds=second), seq_id, "trade", 100.0, 100, "buy", version)
+
+
+@pytest.fixture(scope="module")
+def ticks(local_client):
+    """
+    One insert over three minutes:
+      10:00  0 1 2 4 5 5 ... 7 (written last, 129s behind 10:02:59)
+      10:01  3 6 (both out of order) 9; 8 never arrives
+      10:02  10 11, plus a correction of 10
+    """
+    local_client.execute(INSERT_QUERY, [
+        tick(1, 0), tick(2, 1), tick(3, 2), tick(4, 4), tick(5, 5), tick(6, 5),
+        tick(61, 3), tick(62, 6), tick(63, 9),
+        tick(121, 10), tick(122, 11), tick(179, 10, version=2),
+        tick(50, 7),
+    ])
+
+
+def run(local_client, name, params):
+    data, columns = QUERIES.execute(local_client.execute, name, params, with_column_types=True)
+    return [dict(zip([c[0] for c in columns], row)) for row in data]
+
+
+def test_feed_totals(local_client, ticks):
+    [row] = run(local_client, "sequence_totals_feed", WINDOW)
+    assert summarise(row) == {
+        "first_seq": 0, "last_seq": 11, "expected": 12, "received": 11, "missing": 1,
+        "completeness": 11 / 12, "duplicates": 1, "out_of_order": 2, "corrections": 1,
+        "late": 1, "max_lag_seconds": 129,
+    }
+
+
+def test_feed_issues(local_client, ticks):
+    rows = run(local_client, "sequence_issues_ids_feed", dict(WINDOW, limit=10))
+    assert [(r["minute"].minute, r["gaps"], r["duplicates"], r["out_of_order"], r["late"], r["gap_ids"])
+            for r in rows] == [(0, 2, 1, 0, 1, [3, 6]), (1, 1, 0, 2, 0, [8])]
+    # Gaps add up to the missing ids plus the ones that arrived in a later minute
+    assert sum(r["gaps"] for r in rows) == 1 + 2
+
+    without_ids = run(local_client, "sequence_issues_feed", dict(WINDOW, limit=10))
+    assert [{k: v for k, v in r.items() if k != "gap_ids"} for r in rows] == without_ids
+
+
+def test_symbol_scope_with_global_numbering(local_client, ticks):
+    [row] = run(local_client, "sequence_totals_symbol", dict(WINDOW, symbol=SYMBOL))
+    summary = summarise(row, gaps=False)
+    assert (summary["expected"], summary["missing"], summary["completeness"]) == (None, None, None)
+    assert (summary["received"], summary["duplicates"], summary["out_of_order"]) == (11, 1, 2)
+
+    rows = run(local_client, "sequence_issues_symbol", dict(WINDOW, symbol=SYMBOL, limit=10))
+    assert [r["minute"].minute for r in rows] == [0, 1]
+    assert "gaps" not in rows[0]
+
+
+def test_gap_ids_are_capped(local_client):
+    # A jump of a billion ids (e.g. a replay with --seq-offset) lists only the first few
+    start = START + timedelta(hours=1)
+    local_client.execute(INSERT_QUERY, [tick(3600, 0), tick(3601, 1_000_000_000)])
+    _, issues = build_queries(gap_ids=True)
+    data = local_client.execute(issues, {"start": start, "end": start + timedelta(minutes=1), "limit": 10})
+    [(_, _, gaps, *_, gap_ids)] = data
+    assert gaps == 999_999_999
+    assert gap_ids == list(range(1, 11))
+
+
+def test_empty_range():
+    summary = summarise({"minutes": 0})
+    assert (summary["expected"], summary["missing"], summary["completeness"]) == (0, 0, None)
+    assert summarise({"minutes": 0}, gaps=False)["missing"] is None